@@ -0,0 +1,193 @@
+# admission.py
+
+import asyncio
+import os
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from starlette.datastructures import Headers
+
+from tools import get_write_generation
+
+# Agent runs (LLM calls plus their tool queries) allowed at the same time
+AGENT_MAX_CONCURRENT = int(os.getenv("AGENT_MAX_CONCURRENT", "4"))
+# Runs allowed to wait for a slot; beyond that requests are turned away with 503
+AGENT_MAX_QUEUE = int(os.getenv("AGENT_MAX_QUEUE", "32"))
+# Runs one client may have waiting; beyond that its requests get 429
+AGENT_MAX_QUEUE_PER_CLIENT = int(os.getenv("AGENT_MAX_QUEUE_PER_CLIENT", "4"))
+# Longest wait for a slot before giving up with 503
+AGENT_QUEUE_TIMEOUT_SECONDS = float(os.getenv("AGENT_QUEUE_TIMEOUT_SECONDS", "30"))
+# GET endpoints whose identical concurrent requests share one execution
+COALESCE_PATHS = frozenset(filter(None, os.getenv(
+    "COALESCE_PATHS",
+    "/current-stays,/vacant-rooms,/occupancy-stats,/arrivals,/departures,/hotel-statistics,/revenue,"
+    "/revenue-series",
+).split(",")))
+
+class AdmissionRejected(Exception):
+    """Raised when a request can't be admitted; carries the HTTP status to answer with."""
+
+    def __init__(self, status_code: int, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+def client_id(headers: Headers, client: Optional[Tuple[str, int]]) -> str:
+    """Identify the caller for fairness: X-Client-ID if sent, else the remote address."""
+    return headers.get("x-client-id") or (client[0] if client else "unknown")
+
+class AgentGovernor:
+    """Caps concurrent agent runs, with a bounded queue served round-robin by client.
+
+    A client that sends a burst only gets its turn after every other waiting
+    client had one, so one busy tab can't starve the rest. Runs on the event
+    loop only, so it needs no locks.
+    """
+
+    def __init__(self, max_concurrent: int = AGENT_MAX_CONCURRENT, max_queue: int = AGENT_MAX_QUEUE,
+                 max_queue_per_client: int = AGENT_MAX_QUEUE_PER_CLIENT,
+                 queue_timeout: float = AGENT_QUEUE_TIMEOUT_SECONDS):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_queue_per_client = max_queue_per_client
+        self.queue_timeout = queue_timeout
+        self._active = 0
+        self._queued = 0
+        # Waiting runs per client; the first client is served next, then moves to the back
+        self._waiting: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self.stats = {"admitted": 0, "queued": 0, "rejected_busy": 0, "rejected_client": 0, "timed_out": 0}
+
+    @asynccontextmanager
+    async def slot(self, client: str) -> AsyncIterator[None]:
+        """Hold one agent slot for the block.
+
+        Raises:
+            AdmissionRejected: 503 when the queue is full or the wait timed out,
+                429 when this client already has too many runs waiting
+        """
+        await self._acquire(client)
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self, client: str) -> None:
+        if self._active < self.max_concurrent and not self._queued:
+            self._active += 1
+            self.stats["admitted"] += 1
+            return
+        if self._queued >= self.max_queue:
+            self.stats["rejected_busy"] += 1
+            raise AdmissionRejected(503, "The assistant is busy; try again shortly", retry_after=5)
+        waiting = self._waiting.setdefault(client, deque())
+        if len(waiting) >= self.max_queue_per_client:
+            self.stats["rejected_client"] += 1
+            raise AdmissionRejected(
+                429, f"Too many assistant requests waiting for this client (limit {self.max_queue_per_client})")
+        granted = asyncio.get_running_loop().create_future()
+        waiting.append(granted)
+        self._queued += 1
+        self.stats["queued"] += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(granted), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if granted.done():
+                # The slot was handed over just as we gave up; pass it on
+                self._release()
+            else:
+                granted.cancel()
+                self._forget(client, granted)
+            if isinstance(e, asyncio.TimeoutError):
+                self.stats["timed_out"] += 1
+                raise AdmissionRejected(503, "Timed out waiting for the assistant; try again shortly", retry_after=5)
+            raise
+        self.stats["admitted"] += 1
+
+    def _forget(self, client: str, granted: asyncio.Future) -> None:
+        waiting = self._waiting.get(client)
+        if waiting is not None and granted in waiting:
+            waiting.remove(granted)
+            self._queued -= 1
+            if not waiting:
+                del self._waiting[client]
+
+    def _release(self) -> None:
+        """Hand the freed slot to the next client in turn, or free it."""
+        while self._waiting:
+            client, waiting = next(iter(self._waiting.items()))
+            granted = waiting.popleft()
+            self._queued -= 1
+            if waiting:
+                self._waiting.move_to_end(client)
+            else:
+                del self._waiting[client]
+            if not granted.done():
+                granted.set_result(None)
+                return
+        self._active -= 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self.stats, active=self._active, waiting=self._queued, clients_waiting=len(self._waiting),
+                    max_concurrent=self.max_concurrent)
+
+# Shared by every CoalescingMiddleware instance; Starlette builds them out of reach
+coalescing_stats = {"executions": 0, "coalesced": 0}
+
+class CoalescingMiddleware:
+    """Let identical concurrent GET requests to COALESCE_PATHS share one execution.
+
+    The first request runs; requests with the same path, query, property and
+    conditional headers that arrive while it is in flight wait for it and get a
+    copy of its response. The key includes the write generation, so a request
+    made after a write commits never receives a response computed before it.
+    """
+
+    def __init__(self, app, paths: Optional[frozenset] = None):
+        self.app = app
+        # None follows COALESCE_PATHS, so it can be changed at runtime
+        self.paths = paths
+        self._in_flight: Dict[tuple, asyncio.Future] = {}
+        self.stats = coalescing_stats
+
+    async def __call__(self, scope, receive, send):
+        paths = COALESCE_PATHS if self.paths is None else self.paths
+        if scope["type"] != "http" or scope["method"] != "GET" or scope["path"] not in paths:
+            return await self.app(scope, receive, send)
+        headers = Headers(scope=scope)
+        key = (scope["path"], scope["query_string"], headers.get("x-property"), headers.get("if-none-match"),
+               get_write_generation())
+        leader = self._in_flight.get(key)
+        if leader is not None:
+            try:
+                messages = await asyncio.shield(leader)
+            except asyncio.CancelledError:
+                if not leader.cancelled():
+                    raise
+                # The shared execution failed; run this request on its own
+                return await self.app(scope, receive, send)
+            self.stats["coalesced"] += 1
+            for message in messages:
+                await send(message)
+            return
+
+        leader = self._in_flight[key] = asyncio.get_running_loop().create_future()
+        self.stats["executions"] += 1
+        messages: List[Dict[str, Any]] = []
+
+        async def capture(message):
+            messages.append(message)
+
+        # The response is buffered rather than streamed, so a client that goes
+        # away mid-send can't fail the requests sharing it
+        try:
+            await self.app(scope, receive, capture)
+            leader.set_result(messages)
+        finally:
+            if not leader.done():
+                leader.cancel()
+            del self._in_flight[key]
+        for message in messages:
+            await send(message)
+
+agent_governor = AgentGovernor()
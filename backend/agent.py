@@ -1,8 +1,10 @@
 from langgraph.prebuilt import create_react_agent
 from langchain_core.runnables import Runnable
 from langchain_openai import ChatOpenAI
-from langchain_core.messages import BaseMessage, AIMessage, ToolMessage, HumanMessage
+from langchain_core.messages import BaseMessage, AIMessage, ToolMessage, HumanMessage, SystemMessage
 from tools import *
+from tool_executor import build_tool_node, get_tool_cache_stats
+from schema_catalog import catalog
 import os
 import datetime
 from dotenv import load_dotenv
@@ -24,17 +26,14 @@ You are a hotel management assistant. You interact with a SQLite database to ans
 Today is {today}. You can access the database to retrieve information but cannot modify it directly. Your goal is to assist users in managing hotel operations efficiently.
 
 Instructions:
-- Use describe_table to understand schema before querying.
+- The schema below is current; only call describe_table if you need details it does not show.
 - Use read_records or custom_query for data access.
 - Never modify data (no insert, update, delete).
 - Always limit results unless the user asks otherwise.
 - Suggest useful queries when appropriate.
 
-Tables and Relations:
-- Rooms(RoomID PK, isVacant, currentStay FK → Bookings.BookingsID, type, price)
-- Bookings(BookingsID PK, customerID FK, bookedDate, arrivalDate, departureDay, paymentID FK)
-- Customers(CustomerID PK, FirstName, LastName, DOB, IdentityType, IdentityString)
-- Pricing(PaymentID PK, PaymentType, isDone, price, discount)
+Tables and Relations (current schema):
+{schema}
 
 Specialized Tools Available:
 - get_vacant_rooms: Find all vacant rooms, optionally filtered by type
@@ -44,12 +43,18 @@ Specialized Tools Available:
 - get_room_occupancy_stats: Get occupancy statistics by room type
 - get_current_stays: View all current guests with room and payment details
 - get_revenue_by_room_type: Analyze revenue by room type within a date range
+- get_revenue_time_series: Daily, weekly or monthly revenue, ADR and RevPAR per room type, with stays split across their nights
 - get_customer_bookings: Get all bookings for a specific customer
 - add_customer: Add a new customer to the system with personal and identity details
 - add_payment: Create a new payment record with price, type, and optional discount
 - book_room: Book a room for a customer and update room availability
 - check_in_guest: Mark a room as occupied for a given booking
 - checkout_guest: Mark a room as vacant and clear the current stay assignment
+- group_check_in: Check in many guests at once, from (room, booking) pairs or everyone arriving on a date, optionally one floor or room type
+- group_checkout: Check out many rooms at once, from a list of rooms or everyone departing on a date, optionally one floor or room type
+- assign_rooms: Give rooms to bookings that don't have one (arriving in the next days, or listed), packing stays without overlaps; dry_run previews the plan
+- recalculate_room_rates: Recompute recommended nightly rates per room type from occupancy and booking pace
+- get_room_rates: Get the recommended nightly rates per room type for a date range
 - update_customer_info: Update specific fields in an existing customer's record
 - cancel_booking: Delete a booking and free up the associated room
 - apply_discount: Apply or update a discount for a given payment record
@@ -83,12 +88,18 @@ tools = [
     get_room_occupancy_stats,
     get_current_stays,
     get_revenue_by_room_type,
+    get_revenue_time_series,
     get_customer_bookings,
     add_customer,
     add_payment,
     book_room,
     check_in_guest,
     checkout_guest,
+    group_check_in,
+    group_checkout,
+    assign_rooms,
+    recalculate_room_rates,
+    get_room_rates,
     update_customer_info,
     cancel_booking,
     apply_discount,
@@ -111,10 +122,15 @@ tools = [
     get_all_payments
 ]
 
+def build_prompt(state):
+    """Prepend the system prompt with today's date and the cached schema."""
+    content = system_prompt.format(today=datetime.date.today(), schema=catalog.prompt_block(current_db_path()))
+    return [SystemMessage(content=content)] + state["messages"]
+
 agent: Runnable = create_react_agent(
     model=llm,
-    tools=tools,
-    prompt=system_prompt, checkpointer=InMemorySaver(),
+    tools=build_tool_node(tools),
+    prompt=build_prompt, checkpointer=InMemorySaver(),
 )
 
 def parse_ai_and_tools_messages(messages):
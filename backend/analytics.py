@@ -0,0 +1,394 @@
+# analytics.py
+
+import bisect
+import contextvars
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import tools
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; only needed with ANALYTICS_BACKEND=numpy
+    np = None
+
+# A snapshot older than this is reloaded in the background once the database
+# has changed; reports are answered from the previous snapshot meanwhile
+ANALYTICS_REFRESH_SECONDS = float(os.getenv("ANALYTICS_REFRESH_SECONDS", "30"))
+# Rows fetched per cursor batch while loading a snapshot
+_LOAD_BATCH = 100000
+
+def _sql_order(value: Any) -> tuple:
+    """Sort key matching SQLite's ordering of NULL, numeric, text and blob values."""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    return (3, value)
+
+class _Codes:
+    """Dictionary encoding of a column whose codes sort like the values do in SQLite.
+
+    Range filters on the column become integer comparisons on the codes.
+    """
+
+    def __init__(self):
+        self._index: Dict[Any, int] = {}
+        self.values: List[Any] = []
+
+    def encode(self, column: Iterable[Any]) -> "np.ndarray":
+        index = self._index
+        setdefault = index.setdefault
+        return np.fromiter((setdefault(value, len(index)) for value in column), dtype=np.int32)
+
+    def sort(self, *arrays: "np.ndarray") -> None:
+        """Renumber the codes in value order; the arrays are updated in place."""
+        first_seen = list(self._index)
+        order = sorted(range(len(first_seen)), key=lambda code: _sql_order(first_seen[code]))
+        rank = np.empty(len(first_seen), dtype=np.int32)
+        rank[order] = np.arange(len(first_seen), dtype=np.int32)
+        for array in arrays:
+            array[:] = rank[array]
+        self.values = [first_seen[code] for code in order]
+        self._keys = [_sql_order(value) for value in self.values]
+        self._index = {}
+
+    def first_at_least(self, value: Any) -> int:
+        return bisect.bisect_left(self._keys, _sql_order(value))
+
+    def first_above(self, value: Any) -> int:
+        return bisect.bisect_right(self._keys, _sql_order(value))
+
+def _lookup(sorted_ids: "np.ndarray", ids: "np.ndarray") -> "np.ndarray":
+    """Positions of ids in sorted_ids, -1 where an id is missing (the inner-join miss)."""
+    if not len(sorted_ids):
+        return np.full(len(ids), -1, dtype=np.int64)
+    positions = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+    return np.where(sorted_ids[positions] == ids, positions, -1)
+
+# Column types of a _BookingPart, in the order of _MAIN_BOOKINGS
+_PART_DTYPES = ("int64", "int64", "int64", "bool", "int64", "int32", "int32", "int32",
+                "bool", "int32", "int64", "float64", "float64")
+
+class _BookingPart:
+    """Booking rows of one schema with their payment columns attached."""
+
+    def __init__(self, conn: sqlite3.Connection, query: str, dates: _Codes, payment_types: _Codes):
+        # Each batch is converted to arrays right away; Python lists of every
+        # value would take several times the memory of the finished snapshot
+        chunks: List[List["np.ndarray"]] = [[] for _ in _PART_DTYPES]
+        cursor = conn.execute(query)
+        while True:
+            rows = cursor.fetchmany(_LOAD_BATCH)
+            if not rows:
+                break
+            (ids, customers, payments, has_room, rooms, arrivals, departures, booked,
+             has_payment, types, done, prices, discounts) = zip(*rows)
+            del rows
+            for chunk, array in zip(chunks, (
+                    np.array(ids, dtype=np.int64), np.array(customers, dtype=np.int64),
+                    np.array(payments, dtype=np.int64), np.array(has_room, dtype=bool),
+                    np.array(rooms, dtype=np.int64), dates.encode(arrivals), dates.encode(departures),
+                    dates.encode(booked),
+                    np.array(has_payment, dtype=bool), payment_types.encode(types),
+                    np.array(done, dtype=np.int64),
+                    # NULLs become NaN
+                    np.array(prices, dtype=np.float64), np.array(discounts, dtype=np.float64))):
+                chunk.append(array)
+        (self.ids, self.customer_ids, self.payment_ids, self.has_room, self.room_ids, self.arrival,
+         self.departure, self.booked, self.has_payment, self.payment_type, self.is_done, self.price, self.discount) = (
+            np.concatenate(chunk) if chunk else np.empty(0, dtype=dtype)
+            for chunk, dtype in zip(chunks, _PART_DTYPES))
+        # Same expression and operation order as the SQL reports
+        self.amount = self.price * (1 - self.discount / 100.0)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+_MAIN_BOOKINGS = """
+SELECT b.BookingsID, b.customerID, b.paymentID, b.RoomID IS NOT NULL, IFNULL(b.RoomID, 0),
+       b.arrivalDate, b.departureDay, b.bookedDate,
+       p.PaymentID IS NOT NULL, p.PaymentType, IFNULL(p.isDone, 0), p.price, p.discount
+FROM main.Bookings b LEFT JOIN main.Pricing p ON p.PaymentID = b.paymentID
+ORDER BY b.BookingsID
+"""
+
+class Snapshot:
+    """Columnar copy of the booking, payment, room and customer tables.
+
+    Loaded from one read transaction. Text columns are dictionary encoded, and
+    the SQL expression functions the reports use (julianday, date) are evaluated
+    by SQLite once per distinct value, so results match the SQL tools.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, generation: str):
+        self.generation = generation
+        self.loaded_at = time.monotonic()
+        conn.execute("BEGIN")
+        try:
+            self._load(conn)
+        finally:
+            conn.rollback()
+
+    def _load(self, conn: sqlite3.Connection) -> None:
+        dates, payment_types, room_types = _Codes(), _Codes(), _Codes()
+
+        rooms = conn.execute("SELECT RoomID, isVacant, currentStay, type FROM Rooms ORDER BY RoomID").fetchall()
+        self.room_ids = np.array([row[0] for row in rooms], dtype=np.int64)
+        self.room_vacant = [row[1] for row in rooms]
+        self.room_stay = [row[2] for row in rooms]
+        self.room_type = room_types.encode(row[3] for row in rooms)
+
+        customers = conn.execute("SELECT CustomerID, FirstName, LastName FROM Customers ORDER BY CustomerID").fetchall()
+        self.customer_ids = np.array([row[0] for row in customers], dtype=np.int64)
+        self.customer_names = [(row[1], row[2]) for row in customers]
+
+        self.live = _BookingPart(conn, _MAIN_BOOKINGS, dates, payment_types)
+        archived = conn.execute(
+            "SELECT COUNT(*) FROM pragma_database_list WHERE name = 'archive'").fetchone()[0]
+        self.archive = None
+        if archived and conn.execute(
+                "SELECT COUNT(*) FROM archive.sqlite_master WHERE type = 'table' AND name IN ('Bookings', 'Pricing')"
+        ).fetchone()[0] == 2:
+            self.archive = _BookingPart(conn, _MAIN_BOOKINGS.replace("main.", "archive.").replace(
+                "LEFT JOIN", "JOIN"), dates, payment_types)
+
+        parts = self.parts(history=True)
+        dates.sort(*[array for part in parts for array in (part.arrival, part.departure, part.booked)])
+        payment_types.sort(*[part.payment_type for part in parts])
+        room_types.sort(self.room_type)
+        self.dates, self.payment_types, self.room_types = dates, payment_types, room_types
+
+        self.julianday = np.array(
+            [conn.execute("SELECT julianday(?)", (value,)).fetchone()[0] for value in dates.values],
+            dtype=np.float64)
+        self.date = [conn.execute("SELECT date(?)", (value,)).fetchone()[0] for value in dates.values]
+
+        for part in parts:
+            part.room = _lookup(self.room_ids, part.room_ids)
+            part.room[~part.has_room] = -1
+            part.customer = _lookup(self.customer_ids, part.customer_ids)
+
+    def parts(self, history: bool) -> List[_BookingPart]:
+        """The live bookings, plus the archived ones for historical reports."""
+        return [self.live, self.archive] if history and self.archive is not None else [self.live]
+
+    @property
+    def size(self) -> int:
+        return sum(len(part) for part in self.parts(history=True))
+
+def _require_numpy() -> None:
+    if np is None:
+        raise ValueError("ANALYTICS_BACKEND=numpy requires numpy (pip install numpy)")
+
+_snapshots: Dict[str, Snapshot] = {}
+_refreshing: Dict[str, threading.Thread] = {}
+_snapshot_lock = threading.Lock()
+
+def _load_snapshot(db_path: str) -> Snapshot:
+    # Read the token first so writes made during the load trigger another refresh
+    try:
+        generation = tools.get_db_generation()
+        conn = tools.acquire_read_connection()
+        try:
+            snapshot = Snapshot(conn, generation)
+        finally:
+            tools.release_read_connection(conn)
+        with _snapshot_lock:
+            _snapshots[db_path] = snapshot
+        return snapshot
+    finally:
+        with _snapshot_lock:
+            _refreshing.pop(db_path, None)
+
+def get_snapshot(max_age: Optional[float] = None) -> Snapshot:
+    """Return the snapshot of the current database.
+
+    The first call loads it. Later calls return it while it is current; once the
+    database has changed and the snapshot is older than max_age seconds
+    (default ANALYTICS_REFRESH_SECONDS), a background reload starts and the old
+    snapshot keeps answering until it finishes. max_age=0 waits for a fresh one.
+    """
+    _require_numpy()
+    max_age = ANALYTICS_REFRESH_SECONDS if max_age is None else max_age
+    db_path = tools.current_db_path()
+    snapshot = _snapshots.get(db_path)
+    if snapshot is None or (max_age <= 0 and snapshot.generation != tools.get_db_generation()):
+        return _load_snapshot(db_path)
+    if snapshot.generation != tools.get_db_generation() and time.monotonic() - snapshot.loaded_at > max_age:
+        with _snapshot_lock:
+            if db_path not in _refreshing:
+                # The copied context keeps the reload on the caller's property
+                thread = threading.Thread(target=contextvars.copy_context().run, args=(_load_snapshot, db_path),
+                                          daemon=True)
+                _refreshing[db_path] = thread
+                thread.start()
+    return snapshot
+
+def _sql_round(value: Optional[float], digits: int) -> Optional[float]:
+    """ROUND() exactly as SQLite does it."""
+    if value is None:
+        return None
+    with sqlite3.connect(":memory:") as conn:
+        return conn.execute("SELECT ROUND(?, ?)", (value, digits)).fetchone()[0]
+
+def _sum(values: "np.ndarray") -> Optional[float]:
+    """SUM() over a float column with NULLs as NaN."""
+    present = values[~np.isnan(values)]
+    return float(present.sum()) if len(present) else None
+
+def _avg(values: "np.ndarray") -> Optional[float]:
+    """AVG() over a float column with NULLs as NaN."""
+    present = values[~np.isnan(values)]
+    return float(present.sum() / len(present)) if len(present) else None
+
+def _case_sum(amount: "np.ndarray", selected: "np.ndarray") -> Optional[float]:
+    """SUM(CASE WHEN <selected> THEN amount ELSE 0 END)."""
+    if not len(amount):
+        return None
+    chosen = amount[selected]
+    present = chosen[~np.isnan(chosen)]
+    if len(present):
+        return float(present.sum())
+    # Only the integer 0s of the ELSE branch were added, or nothing at all
+    return 0 if len(chosen) < len(amount) else None
+
+def revenue_by_room_type(start_date: str = "", end_date: str = "",
+                         snapshot: Optional[Snapshot] = None) -> List[Dict[str, Any]]:
+    """get_revenue_by_room_type on the snapshot."""
+    snapshot = snapshot or get_snapshot()
+    lower = snapshot.dates.first_at_least(start_date) if start_date else None
+    upper = snapshot.dates.first_above(end_date) if end_date else None
+    groups = len(snapshot.room_types.values)
+    counts = np.zeros(groups, dtype=np.int64)
+    present = np.zeros(groups, dtype=np.int64)
+    totals: List[List[np.ndarray]] = [[] for _ in range(groups)]
+    for part in snapshot.parts(history=True):
+        mask = part.has_payment & (part.room >= 0)
+        if lower is not None:
+            mask &= part.arrival >= lower
+        if upper is not None:
+            mask &= part.arrival < upper
+        types = snapshot.room_type[part.room[mask]]
+        amounts = part.amount[mask]
+        counts += np.bincount(types, minlength=groups)
+        known = ~np.isnan(amounts)
+        present += np.bincount(types[known], minlength=groups)
+        for group in np.unique(types[known]):
+            totals[group].append(amounts[known][types[known] == group])
+    rows = []
+    for group in range(groups):
+        if not counts[group]:
+            continue
+        total = float(np.concatenate(totals[group]).sum()) if present[group] else None
+        rows.append({
+            "type": snapshot.room_types.values[group],
+            "booking_count": int(counts[group]),
+            "total_revenue": total,
+            "avg_revenue_per_booking": total / int(present[group]) if present[group] else None,
+        })
+    return rows
+
+def bookings_by_date_range(start_date: str, end_date: str,
+                           snapshot: Optional[Snapshot] = None) -> List[Dict[str, Any]]:
+    """list_bookings_by_date_range on the snapshot; rows arriving the same day are ordered by id."""
+    snapshot = snapshot or get_snapshot()
+    dates = snapshot.dates
+    start_low, start_high = dates.first_at_least(start_date), dates.first_above(start_date)
+    end_low, end_high = dates.first_at_least(end_date), dates.first_above(end_date)
+    selected = []
+    for part in snapshot.parts(history=True):
+        arrival, departure = part.arrival, part.departure
+        overlaps = (((arrival >= start_low) & (arrival < end_high)) |
+                    ((departure >= start_low) & (departure < end_high)) |
+                    ((arrival < start_high) & (departure >= end_low)))
+        rows = np.flatnonzero(overlaps & part.has_payment & (part.customer >= 0))
+        selected.extend((part, row) for row in rows.tolist())
+    selected.sort(key=lambda item: (int(item[0].arrival[item[1]]), int(item[0].ids[item[1]])))
+
+    values, julianday = dates.values, snapshot.julianday
+    results = []
+    for part, row in selected:
+        arrival, departure = part.arrival[row], part.departure[row]
+        room = part.room[row]
+        first_name, last_name = snapshot.customer_names[part.customer[row]]
+        stay = julianday[departure] - julianday[arrival]
+        discount = part.discount[row]
+        results.append({
+            "BookingsID": int(part.ids[row]),
+            "arrivalDate": values[arrival],
+            "departureDay": values[departure],
+            "FirstName": first_name,
+            "LastName": last_name,
+            "RoomID": int(snapshot.room_ids[room]) if room >= 0 else None,
+            "room_type": snapshot.room_types.values[snapshot.room_type[room]] if room >= 0 else None,
+            "price": float(part.price[row]),
+            "discount": None if np.isnan(discount) else float(discount),
+            "PaymentType": snapshot.payment_types.values[part.payment_type[row]],
+            "payment_completed": int(part.is_done[row]),
+            "stay_duration": None if np.isnan(stay) else float(stay),
+        })
+    return results
+
+def hotel_statistics(snapshot: Optional[Snapshot] = None) -> Dict[str, Dict[str, Any]]:
+    """get_hotel_statistics on the snapshot (live bookings only, like the SQL tool)."""
+    snapshot = snapshot or get_snapshot()
+    live = snapshot.live
+    results: Dict[str, Dict[str, Any]] = {}
+
+    total_rooms = len(snapshot.room_ids)
+    vacant = sum(1 for value in snapshot.room_vacant if value == 1) if total_rooms else None
+    occupied = sum(1 for value in snapshot.room_vacant if value == 0) if total_rooms else None
+    results["occupancy"] = {
+        "total_rooms": total_rooms,
+        "vacant_rooms": vacant,
+        "occupied_rooms": occupied,
+        "occupancy_rate": _sql_round(occupied * 100.0 / total_rooms, 2) if total_rooms else None,
+    }
+
+    paid = live.amount[live.has_payment]
+    done = live.is_done[live.has_payment]
+    results["revenue"] = {
+        "total_revenue": _sum(paid),
+        "avg_revenue_per_booking": _avg(paid),
+        "realized_revenue": _case_sum(paid, done == 1),
+        "pending_revenue": _case_sum(paid, done == 0),
+    }
+
+    with sqlite3.connect(":memory:") as conn:
+        today = conn.execute("SELECT date('now')").fetchone()[0]
+    upcoming_dates = np.array([value is not None and value >= today for value in snapshot.date], dtype=bool)
+    # Live booking (row) that each room's currentStay points at, -1 if none
+    stays = np.array([-1 if stay is None else stay for stay in snapshot.room_stay], dtype=np.int64)
+    stay_rows = _lookup(live.ids, stays)
+    stay_rows[stays == -1] = -1
+    vacant = np.array([value == 0 for value in snapshot.room_vacant], dtype=bool)
+    results["bookings"] = {
+        "total_bookings": len(live),
+        "unique_customers": int(len(np.unique(live.customer_ids))),
+        "avg_stay_duration": _avg(snapshot.julianday[live.departure] - snapshot.julianday[live.arrival]),
+        "upcoming_bookings": int(upcoming_dates[live.arrival].sum()) if len(live) else 0,
+        "active_bookings": int(((stay_rows >= 0) & vacant).sum()),
+    }
+
+    # A booking counts for a room of its own RoomID, and for a room whose current stay it is
+    groups = len(snapshot.room_types.values)
+    counts = np.bincount(snapshot.room_type[live.room[live.room >= 0]], minlength=groups)
+    for room in np.flatnonzero(stay_rows >= 0):
+        row = stay_rows[room]
+        if not live.has_room[row] or live.room_ids[row] != snapshot.room_ids[room]:
+            counts[snapshot.room_type[room]] += 1
+    popular = np.flatnonzero(counts)
+    if len(popular):
+        group = popular[0]
+        results["popularity"] = {
+            "type": snapshot.room_types.values[group],
+            "booking_count": int(counts[group]),
+            "booking_percentage": _sql_round(int(counts[group]) * 100.0 / len(live), 2) if len(live) else None,
+        }
+    return results
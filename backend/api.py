@@ -1,24 +1,177 @@
-from fastapi import FastAPI, Query
-from typing import Optional
+from fastapi import FastAPI, Query, Request, Response
+from pydantic import BaseModel
+from typing import Any, Callable, Dict, List, Optional
 from tools import (
     get_vacant_rooms, get_upcoming_arrivals, get_upcoming_departures,
     get_frequent_customers, get_room_occupancy_stats, get_current_stays,
     get_revenue_by_room_type, get_customer_bookings, add_customer,
-    add_payment, book_room, check_in_guest, checkout_guest,
+    add_payment, book_room, check_in_guest, checkout_guest, group_check_in, group_checkout, assign_rooms,
+    recalculate_room_rates, get_room_rates, get_revenue_time_series,
     update_customer_info, cancel_booking, apply_discount,
     get_room_by_id, get_customer_by_id, get_booking_details,
     search_rooms_by_price, get_room_availability, list_bookings_by_date_range,
     get_payment_details, update_room_info, update_booking_details,
     get_hotel_statistics, add_new_room, search_customers, get_all_tables,
-    get_all_customers, get_all_bookings, get_all_rooms, get_all_payments
 )
-from langchain_core.messages import HumanMessage
-from agent import agent, parse_ai_and_tools_messages
+import tools
+from admission import AdmissionRejected, CoalescingMiddleware, agent_governor, client_id, coalescing_stats
+from archive import archive_bookings, install_archive
+from assignment import ASSIGNMENT_HORIZON_DAYS
+from pricing import install_rate_table
+import occupancy
+import tracing
+from tracing import TracingMiddleware
+from batch import run_batch
+from chain import chain_occupancy, chain_revenue
+from bulk_import import import_stream
+from export import export_bookings
+from responses import FastJSONResponse, json_rows
+from dashboard import get_dashboard
+from properties import PROPERTIES, check_property, current_property, use_property
+from events import event_bus, format_sse
+from sync import compact_change_log, get_changes, install_change_log
+from schema_catalog import catalog
+import workers
+from writer import get_writer_stats
+import asyncio
+import importlib
+import io
+import os
+import sqlite3
+import tempfile
+from contextlib import asynccontextmanager
 import uvicorn
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
-
-app = FastAPI()
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import FileResponse, HTMLResponse, StreamingResponse
+from starlette.datastructures import Headers, QueryParams
+
+# The agent module pulls in LangGraph and the LLM client, so REST-only
+# traffic never pays for it. It is imported on the first /chat-ai call or
+# by the warm-up task started after the server is up.
+AGENT_WARMUP = os.getenv("AGENT_WARMUP", "1") == "1"
+EVENTS_KEEPALIVE_SECONDS = float(os.getenv("EVENTS_KEEPALIVE_SECONDS", "15"))
+SYNC_COMPACT_INTERVAL_SECONDS = float(os.getenv("SYNC_COMPACT_INTERVAL_SECONDS", "3600"))
+# How often old bookings are moved to the archive database; 0 leaves it to `python archive.py`
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "0"))
+# Responses smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+# Import uploads larger than this are spooled to a temporary file
+IMPORT_SPOOL_BYTES = int(os.getenv("IMPORT_SPOOL_BYTES", str(16 * 1024 * 1024)))
+_agent_module = None
+
+async def get_agent_module():
+    """Import the agent module on first use without blocking the event loop."""
+    global _agent_module
+    if _agent_module is None:
+        _agent_module = await run_in_threadpool(importlib.import_module, "agent")
+    return _agent_module
+
+def for_every_database(fn: Callable[[str], Any], failure: str) -> None:
+    """Call fn(db_path) for each property's database, or the single database, scoped to it."""
+    for name, db_path in tools.database_paths().items():
+        try:
+            with use_property(name):
+                fn(db_path)
+        except (sqlite3.Error, ValueError, TypeError) as e:
+            print(f"{failure}{f' for property {name}' if name else ''}: {e}")
+
+def initialise_database(db_path: str) -> None:
+    install_change_log(db_path)
+    install_archive(db_path)
+    install_rate_table(db_path)
+    catalog.refresh(db_path)
+
+async def compact_change_log_periodically():
+    """Keep the sync change log small."""
+    while True:
+        await asyncio.sleep(SYNC_COMPACT_INTERVAL_SECONDS)
+        await run_in_threadpool(for_every_database, compact_change_log, "Change log compaction failed")
+
+async def verify_occupancy_periodically():
+    """Correct the in-memory room state from the Rooms table, e.g. after writes by other processes."""
+    while True:
+        await asyncio.sleep(occupancy.OCCUPANCY_VERIFY_SECONDS)
+        await run_in_threadpool(for_every_database, lambda db_path: occupancy.verify(), "Occupancy check failed")
+
+async def archive_periodically():
+    """Move bookings past the archive horizon out of the live tables."""
+    while True:
+        await asyncio.sleep(ARCHIVE_INTERVAL_SECONDS)
+        await run_in_threadpool(for_every_database, lambda db_path: archive_bookings(), "Archiving failed")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if tools.database_paths():
+        for_every_database(initialise_database, "Database not initialised at startup")
+        if occupancy.OCCUPANCY_ENGINE:
+            # Vacancy and occupancy are answered from memory from here on
+            for_every_database(occupancy.load, "Room state not loaded")
+    else:
+        print("Database not initialised at startup: Database path not set. "
+              "Please check SQLITE_DB_PATH in your .env file.")
+    # Statistics, revenue and job-queue reports run in worker processes from here on
+    await run_in_threadpool(workers.start_pool)
+    background = [asyncio.create_task(compact_change_log_periodically())]
+    if occupancy.OCCUPANCY_ENGINE and occupancy.OCCUPANCY_VERIFY_SECONDS > 0:
+        background.append(asyncio.create_task(verify_occupancy_periodically()))
+    if ARCHIVE_INTERVAL_SECONDS > 0:
+        background.append(asyncio.create_task(archive_periodically()))
+    if AGENT_WARMUP:
+        background.append(asyncio.create_task(get_agent_module()))
+    if tools.ANALYTICS_BACKEND == "numpy":
+        # Load the report snapshot before the first report asks for it
+        analytics = importlib.import_module("analytics")
+        background.append(asyncio.create_task(run_in_threadpool(
+            for_every_database, lambda db_path: analytics.get_snapshot(), "Analytics snapshot failed")))
+    yield
+    for task in background:
+        if not task.done():
+            task.cancel()
+    await run_in_threadpool(workers.stop_pool)
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+
+# Innermost, so coalesced responses are shared before compression
+app.add_middleware(CoalescingMiddleware)
+
+# Brotli when the optional brotli-asgi package is installed, otherwise gzip;
+# both pick the encoding from Accept-Encoding and leave event streams alone
+try:
+    from brotli_asgi import BrotliMiddleware
+    app.add_middleware(BrotliMiddleware, minimum_size=COMPRESS_MIN_BYTES, gzip_fallback=True,
+                       excluded_handlers=["/events"])
+except ImportError:
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESS_MIN_BYTES)
+
+class PropertyMiddleware:
+    """Scope each request to the property named by the X-Property header or ?property=.
+
+    Every tool and query the request runs then uses that property's database and
+    connection pool. Requests that name no property use the default database.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        name = Headers(scope=scope).get("x-property") or QueryParams(scope["query_string"]).get("property")
+        if not name:
+            return await self.app(scope, receive, send)
+        try:
+            check_property(name)
+        except ValueError as e:
+            return await FastJSONResponse({"error": str(e)}, status_code=404)(scope, receive, send)
+        with use_property(name):
+            await self.app(scope, receive, send)
+
+app.add_middleware(PropertyMiddleware)
+
+# Outside the property scope, so the request span covers everything but CORS
+app.add_middleware(TracingMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -26,9 +179,29 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Trace-Id"],
 )
 
 
+def stream_rows(pages: Any, params: Optional[Dict[str, Any]] = None, format: str = "rows") -> Any:
+    """Stream a large read as JSON, encoding QUERY_FETCH_ROWS rows at a time.
+
+    "rows" sends the list of row dicts the tools return and "columnar" sends
+    {"columns", "rows"} with each row as an array. Memory stays at one page
+    however many rows there are, and FastAPI's jsonable_encoder pass is skipped.
+    Pages are separate short reads, so a slow client doesn't hold off writers.
+    """
+    try:
+        rows = tools.iter_pages(pages, params)
+    except (sqlite3.Error, ValueError) as e:
+        error = f"Database error: {str(e)}" if isinstance(e, sqlite3.Error) else f"Unexpected error: {str(e)}"
+        return {"error": error} if format == "columnar" else [{"error": error}]
+    if format == "columnar":
+        chunks = json_rows(rows.unique_column_names(), rows.batches(unique_columns=True), columnar=True)
+    else:
+        chunks = json_rows(rows.columns, rows.batches())
+    return StreamingResponse(chunks, media_type="application/json")
+
 @app.get("/vacant-rooms")
 def vacant_rooms(room_type: Optional[str] = None):
     return get_vacant_rooms.run({"room_type": room_type})
@@ -57,6 +230,14 @@ def current_stays():
 def revenue(start_date: str = "", end_date: str = ""):
     return get_revenue_by_room_type.run({"start_date": start_date, "end_date": end_date})
 
+@app.get("/revenue-series")
+def revenue_series(start_date: str = "", end_date: str = "", granularity: str = "month",
+                   room_type: Optional[str] = None):
+    return get_revenue_time_series.run({
+        "start_date": start_date, "end_date": end_date,
+        "granularity": granularity, "room_type": room_type,
+    })
+
 @app.get("/customer-bookings")
 def customer_bookings(customer_id: int = 0, name: str = ""):
     return get_customer_bookings.run({"customer_id": customer_id, "name": name})
@@ -91,6 +272,71 @@ def check_in(room_id: int, booking_id: int):
 def check_out(room_id: int):
     return checkout_guest.run({"room_id": room_id})
 
+class GroupCheckInItem(BaseModel):
+    room_id: int
+    booking_id: int
+
+class GroupCheckInRequest(BaseModel):
+    items: Optional[List[GroupCheckInItem]] = None
+    arrival_date: str = ""
+    floor: Optional[int] = None
+    room_type: Optional[str] = None
+
+class GroupCheckOutRequest(BaseModel):
+    room_ids: Optional[List[int]] = None
+    departure_date: str = ""
+    floor: Optional[int] = None
+    room_type: Optional[str] = None
+
+@app.post("/group-check-in")
+def group_check_in_api(request: GroupCheckInRequest):
+    """Check in a list of (room, booking) pairs, or every booking arriving on a date.
+
+    Without items, arrival_date (default today), floor and room_type select the
+    bookings. Valid items commit together; each item gets its own result.
+    """
+    pairs = [[item.room_id, item.booking_id] for item in request.items] if request.items is not None else None
+    return group_check_in.run({
+        "pairs": pairs, "arrival_date": request.arrival_date,
+        "floor": request.floor, "room_type": request.room_type,
+    })
+
+@app.post("/group-check-out")
+def group_check_out_api(request: GroupCheckOutRequest):
+    """Check out a list of rooms, or every occupied room whose guest departs on a date.
+
+    Without room_ids, departure_date (default today), floor and room_type select
+    the rooms. Valid rooms are vacated together; each room gets its own result.
+    """
+    return group_checkout.run({
+        "room_ids": request.room_ids, "departure_date": request.departure_date,
+        "floor": request.floor, "room_type": request.room_type,
+    })
+
+class AssignRoomsRequest(BaseModel):
+    start_date: str = ""
+    days: int = ASSIGNMENT_HORIZON_DAYS
+    room_type: Optional[str] = None
+    booking_ids: Optional[List[int]] = None
+    dry_run: bool = False
+
+@app.post("/assign-rooms")
+def assign_rooms_api(request: AssignRoomsRequest):
+    """Give every unassigned booking arriving in the horizon (or the listed bookings) a room.
+
+    With "dry_run": true the plan is returned without being written.
+    """
+    return assign_rooms.run(request.model_dump())
+
+@app.post("/room-rates/recalculate")
+def recalculate_rates_api(days: int = 0):
+    """Recompute and store the recommended rates of every room type for the next days."""
+    return recalculate_room_rates.run({"days": days})
+
+@app.get("/room-rates")
+def room_rates(start_date: str = "", end_date: str = "", room_type: Optional[str] = None):
+    return get_room_rates.run({"start_date": start_date, "end_date": end_date, "room_type": room_type})
+
 @app.put("/update-customer")
 def update_customer(
     customer_id: int,
@@ -151,8 +397,11 @@ def room_availability(room_id: int, start_date: str, end_date: str):
     })
 
 @app.get("/bookings/date-range")
-def bookings_by_date(start_date: str, end_date: str):
+def bookings_by_date(start_date: str, end_date: str, format: str = "rows"):
     """List all bookings within a specific date range"""
+    # The SQL version streams; the numpy backend answers from its snapshot
+    if format == "columnar" or tools.ANALYTICS_BACKEND != "numpy":
+        return stream_rows(tools.BOOKINGS_BY_DATE_RANGE_PAGES, {"start": start_date, "end": end_date}, format)
     return list_bookings_by_date_range.run({
         "start_date": start_date,
         "end_date": end_date
@@ -198,6 +447,170 @@ def hotel_statistics():
     """Generate comprehensive hotel statistics"""
     return get_hotel_statistics.run({})
 
+@app.get("/dashboard")
+def dashboard(request: Request, days: int = 7):
+    """Get hotel statistics, current stays and upcoming arrivals in one snapshot.
+
+    Honors If-None-Match: returns 304 without querying when nothing has changed.
+    """
+    try:
+        etag, snapshot = get_dashboard(days, request.headers.get("if-none-match"))
+    except ValueError as e:
+        return {"error": str(e)}
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "X-Property"}
+    if snapshot is None:
+        return Response(status_code=304, headers=headers)
+    return Response(content=snapshot, media_type="application/json", headers=headers)
+
+@app.get("/events")
+async def events(request: Request):
+    """Stream row-level change events (booking created, room vacated, ...) as Server-Sent Events.
+
+    Reconnecting clients get missed events replayed from Last-Event-ID. A "resync"
+    event means events were dropped and the client should refetch its data.
+    """
+    last_event_id = request.headers.get("last-event-id")
+    subscriber = event_bus.subscribe(int(last_event_id) if last_event_id and last_event_id.isdigit() else None,
+                                     property=current_property.get())
+
+    async def stream():
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                batch = await subscriber.next_batch(EVENTS_KEEPALIVE_SECONDS)
+                if not batch:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield "".join(format_sse(event) for event in batch)
+        finally:
+            event_bus.unsubscribe(subscriber)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(stream(), media_type="text/event-stream", headers=headers)
+
+@app.get("/sync")
+def sync_changes(since: Optional[int] = None, tables: Optional[str] = None, limit: int = 5000):
+    """Get rows of Customers, Rooms, Bookings and Pricing changed since a version token.
+
+    Deleted rows come back as ids under "deletes". Pass the returned "version" as
+    `since` next time; "full": true means the client must replace its copy.
+    """
+    table_list = [t.strip() for t in tables.split(",")] if tables else None
+    return get_changes(since, table_list, max(1, min(limit, 50000)))
+
+class BatchStep(BaseModel):
+    tool: str
+    args: Dict[str, Any] = {}
+
+class BatchRequest(BaseModel):
+    steps: List[BatchStep]
+    transaction: bool = True
+
+@app.post("/batch")
+def batch(request: BatchRequest):
+    """Run several tool calls in order in one request.
+
+    Arguments can reference earlier results, e.g. "$0.PricingID" for the payment
+    created by step 0. With "transaction": true (the default) all writes commit
+    together or not at all.
+    """
+    return run_batch([step.model_dump() for step in request.steps], request.transaction)
+
+@app.post("/import/{table}")
+async def bulk_import(table: str, request: Request, format: str = "csv"):
+    """Bulk import customers, payments, rooms or bookings from a CSV or NDJSON request body.
+
+    Returns inserted and rejected counts with the reasons rows were rejected.
+    """
+    with tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_BYTES) as upload:
+        async for chunk in request.stream():
+            upload.write(chunk)
+        upload.seek(0)
+        stream = io.TextIOWrapper(upload, encoding="utf-8", newline="")
+        try:
+            return await run_in_threadpool(import_stream, table, stream, format)
+        except ValueError as e:
+            return {"error": str(e)}
+        finally:
+            stream.detach()
+
+@app.get("/export/bookings")
+def export_bookings_api(format: str = "csv", start_date: Optional[str] = None, end_date: Optional[str] = None,
+                        since_last: Optional[str] = None):
+    """Stream bookings joined with customer, room and payment details as CSV, Parquet or Arrow.
+
+    `since_last=<name>` exports only bookings changed since the last completed export with that name.
+    """
+    try:
+        chunks = export_bookings(format, start_date, end_date, since_last)
+    except ValueError as e:
+        return {"error": str(e)}
+    media_types = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet",
+                   "arrow": "application/vnd.apache.arrow.stream"}
+    extension = {"csv": "csv", "parquet": "parquet", "arrow": "arrows"}[format]
+    headers = {"Content-Disposition": f'attachment; filename="bookings.{extension}"'}
+    return StreamingResponse(chunks, media_type=media_types[format], headers=headers)
+
+class JobRequest(BaseModel):
+    task: str
+    args: Dict[str, Any] = {}
+    timeout: Optional[float] = None
+
+def _job_pool() -> workers.WorkerPool:
+    if workers.pool is None:
+        raise ValueError("The worker pool is disabled (WORKER_PROCESSES=0)")
+    return workers.pool
+
+@app.post("/jobs", status_code=202)
+def submit_job(request: JobRequest):
+    """Queue a report or export to run in a worker process.
+
+    Tasks: get_hotel_statistics, get_revenue_by_room_type, list_bookings_by_date_range
+    and export_bookings (args: format, start_date, end_date). Poll GET /jobs/{job_id}.
+    """
+    try:
+        job = _job_pool().submit(request.task, request.args, request.timeout)
+    except ValueError as e:
+        return {"error": str(e)}
+    except workers.WorkerError as e:
+        return FastJSONResponse({"error": str(e)}, status_code=429, headers={"Retry-After": "5"})
+    return job.to_dict()
+
+@app.get("/jobs")
+def job_stats():
+    """Get worker pool counters, queue depth and running jobs"""
+    try:
+        return _job_pool().get_stats()
+    except ValueError as e:
+        return {"error": str(e)}
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    """Get a job's state, and its result once done"""
+    job = workers.pool.get(job_id) if workers.pool is not None else None
+    if job is None:
+        return FastJSONResponse({"error": f"No job with ID {job_id}"}, status_code=404)
+    return job.to_dict(include_result=job.task != "export_bookings")
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    """Cancel a queued or running job"""
+    job = workers.pool.cancel(job_id) if workers.pool is not None else None
+    if job is None:
+        return FastJSONResponse({"error": f"No job with ID {job_id}"}, status_code=404)
+    return job.to_dict(include_result=False)
+
+@app.get("/jobs/{job_id}/file")
+def job_file(job_id: str):
+    """Download the file written by a finished export job"""
+    job = workers.pool.get(job_id) if workers.pool is not None else None
+    if job is None or job.task != "export_bookings":
+        return FastJSONResponse({"error": f"No export job with ID {job_id}"}, status_code=404)
+    if job.state != "done":
+        return FastJSONResponse({"error": f"Export is {job.state}"}, status_code=409)
+    path = job.args["path"]
+    return FileResponse(path, filename="bookings" + os.path.splitext(path)[1])
+
 @app.post("/add-room")
 def add_room(room_id: int, room_type: str, price: float):
     """Add a new room to the hotel inventory"""
@@ -218,32 +631,105 @@ def all_tables():
     return get_all_tables.run({})
 
 @app.get("/all-customers")
-def all_customers():
+def all_customers(format: str = "rows"):
     """Retrieve all customers from the database"""
-    return get_all_customers.run({})
+    return stream_rows(tools.ALL_CUSTOMERS_PAGES, format=format)
 
 @app.get("/all-bookings")
-def all_bookings():
+def all_bookings(format: str = "rows"):
     """Retrieve all bookings from the database"""
-    return get_all_bookings.run({})
+    return stream_rows(tools.ALL_BOOKINGS_PAGES, format=format)
 
 @app.get("/all-rooms")
-def all_rooms():
+def all_rooms(format: str = "rows"):
     """Retrieve all rooms from the database"""
-    return get_all_rooms.run({})
+    return stream_rows(tools.ALL_ROOMS_PAGES, format=format)
 
 @app.get("/all-payments")
-def all_payments():
+def all_payments(format: str = "rows"):
     """Retrieve all payments from the database"""
-    return get_all_payments.run({})
+    return stream_rows(tools.ALL_PAYMENTS_PAGES, format=format)
     
+@app.get("/write-stats")
+def write_stats():
+    """Get group commit counters (writes, commits, average group size) per database"""
+    return get_writer_stats()
+
+@app.get("/occupancy-engine-stats")
+def occupancy_engine_stats():
+    """Get load, update and consistency-check counters of the in-memory room state per database"""
+    return occupancy.get_occupancy_stats()
+
+@app.get("/properties")
+def list_properties():
+    """List the hotels this API serves; pass one as X-Property or ?property= to scope a request"""
+    return [{"property": name} for name in PROPERTIES]
+
+@app.get("/chain/occupancy")
+def chain_occupancy_api():
+    """Room occupancy by type for every property, plus chain-wide rows (property "all")"""
+    try:
+        return chain_occupancy()
+    except ValueError as e:
+        return [{"error": str(e)}]
+
+@app.get("/chain/revenue")
+def chain_revenue_api(start_date: str = "", end_date: str = ""):
+    """Revenue by room type for every property, plus chain-wide rows (property "all")"""
+    try:
+        return chain_revenue(start_date, end_date)
+    except ValueError as e:
+        return [{"error": str(e)}]
+
 @app.get("/chat-ai")
-async def serve_chat_ai(user_query:str):
-    resAi = await agent.ainvoke({"messages": [
-            HumanMessage(content=user_query),]},config={"thread_id": "1"})
-    print(resAi)
-    resAi = parse_ai_and_tools_messages(resAi["messages"])
+async def serve_chat_ai(request: Request, user_query:str):
+    chat = await get_agent_module()
+    # A conversation scoped to a property (X-Property or ?property=) only sees that hotel
+    name = current_property.get()
+    config = {"thread_id": "1"} if name is None else {"thread_id": f"1@{name}", "property": name}
+    # Agent steps, LLM calls and tool calls join the request's trace when it is sampled
+    config["callbacks"] = tracing.agent_callbacks()
+    try:
+        # At most AGENT_MAX_CONCURRENT runs at once; the rest wait their client's turn
+        async with agent_governor.slot(client_id(request.headers, request.client)):
+            resAi = await chat.agent.ainvoke({"messages": [
+                    chat.HumanMessage(content=user_query),]},config=config)
+    except AdmissionRejected as e:
+        return FastJSONResponse({"error": str(e)}, status_code=e.status_code,
+                                headers={"Retry-After": str(e.retry_after)})
+    resAi = chat.parse_ai_and_tools_messages(resAi["messages"])
     return resAi
 
+@app.get("/admission-stats")
+def admission_stats():
+    """Get agent admission counters and how many read requests shared an execution"""
+    return {"agent": agent_governor.get_stats(), "coalescing": dict(coalescing_stats)}
+
+@app.get("/debug/traces")
+def list_traces():
+    """List the most recent request traces, newest first"""
+    return tracing.list_traces()
+
+@app.get("/debug/traces/{trace_id}")
+def get_trace(trace_id: str, format: str = "tree"):
+    """Show one request trace: "tree" (nested spans with timings), "otlp" (OTLP/JSON) or "html" (waterfall)"""
+    document = tracing.exporter.find(trace_id.lower())
+    if document is None:
+        return FastJSONResponse({"error": f"Trace {trace_id} not found"}, status_code=404)
+    if format == "otlp":
+        return document
+    if format == "html":
+        return HTMLResponse(tracing.trace_html(document))
+    if format != "tree":
+        return FastJSONResponse({"error": f"Unknown format {format!r}; expected tree, otlp or html"},
+                                status_code=400)
+    return tracing.trace_tree(document)
+
+@app.get("/chat-ai/stats")
+async def chat_ai_stats():
+    """Get counters for tool calls answered from the agent's per-thread cache"""
+    chat = await get_agent_module()
+    return chat.get_tool_cache_stats()
+
 if __name__ == "__main__":
     uvicorn.run("api:app", host="127.0.0.1", port=8000, reload=True)
\ No newline at end of file
@@ -0,0 +1,195 @@
+# archive.py
+
+import argparse
+import json
+import os
+import sqlite3
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import tools
+from events import publish_event
+from sync import change_log_suspended, install_change_log, restart_sync
+
+# Bookings that departed more than this many days ago are archived
+ARCHIVE_HORIZON_DAYS = int(os.getenv("ARCHIVE_HORIZON_DAYS", "365"))
+# Bookings moved per transaction; each batch holds the write lock only briefly
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+# Pause between batches so other writers get the lock
+ARCHIVE_BATCH_PAUSE_SECONDS = float(os.getenv("ARCHIVE_BATCH_PAUSE_SECONDS", "0.05"))
+
+_ARCHIVE_DDL = """
+CREATE TABLE IF NOT EXISTS archive.Bookings (
+    BookingsID INTEGER PRIMARY KEY,
+    customerID INTEGER NOT NULL,
+    bookedDate DATE NOT NULL,
+    arrivalDate DATE NOT NULL,
+    departureDay DATE NOT NULL,
+    paymentID INTEGER NOT NULL,
+    RoomID INTEGER
+);
+CREATE INDEX IF NOT EXISTS archive.idx_archive_bookings_customer ON Bookings(customerID);
+CREATE INDEX IF NOT EXISTS archive.idx_archive_bookings_arrival ON Bookings(arrivalDate);
+CREATE INDEX IF NOT EXISTS archive.idx_archive_bookings_departure ON Bookings(departureDay);
+CREATE INDEX IF NOT EXISTS archive.idx_archive_bookings_payment ON Bookings(paymentID);
+CREATE TABLE IF NOT EXISTS archive.Pricing (
+    PaymentID INTEGER PRIMARY KEY,
+    PaymentType TEXT NOT NULL,
+    isDone BOOLEAN NOT NULL,
+    price REAL NOT NULL,
+    discount REAL CHECK(discount <= 100)
+);
+"""
+
+# Old enough, not some room's current stay, and not the newest booking, whose id
+# keeps new BookingsIDs from reusing archived ones
+_CANDIDATES_SQL = """
+SELECT BookingsID FROM main.Bookings
+WHERE BookingsID > :after
+  AND BookingsID < (SELECT MAX(BookingsID) FROM main.Bookings)
+  AND departureDay < :cutoff
+  AND BookingsID NOT IN (SELECT currentStay FROM main.Rooms WHERE currentStay IS NOT NULL)
+ORDER BY BookingsID
+LIMIT :limit
+"""
+
+# A booking moves together with its payment, so each half of the views can join
+# within its own schema. Bookings whose payment is shared with a booking that
+# stays live are skipped, as is the newest payment (same reason as above).
+_MOVABLE_SQL = """
+SELECT BookingsID, paymentID FROM main.Bookings
+WHERE BookingsID IN (SELECT value FROM json_each(:candidates))
+  AND paymentID NOT IN (SELECT paymentID FROM main.Bookings
+                        WHERE BookingsID NOT IN (SELECT value FROM json_each(:candidates)))
+  AND paymentID < (SELECT MAX(PaymentID) FROM main.Pricing)
+"""
+
+_IDS = "SELECT value FROM json_each(?)"
+
+def install_archive(db_path: str) -> str:
+    """Create the archive database and its tables if they don't exist yet.
+
+    Returns:
+        Path of the archive database
+    """
+    path = tools.archive_db_path(db_path)
+    created = not os.path.exists(path)
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("ATTACH DATABASE ? AS archive", (path,))
+        conn.executescript(_ARCHIVE_DDL)
+        conn.commit()
+    finally:
+        conn.close()
+    if created:
+        # Pooled connections opened before the archive existed don't have it attached
+        tools.close_read_connections()
+    return path
+
+def _move_batch(conn: sqlite3.Connection, candidates: List[int]) -> Tuple[int, int]:
+    """Move candidate bookings and their payments to the archive.
+
+    Returns:
+        (bookings moved, payments moved)
+    """
+    movable = conn.execute(_MOVABLE_SQL, {"candidates": json.dumps(candidates)}).fetchall()
+    if not movable:
+        return 0, 0
+    booking_ids = [booking_id for booking_id, _ in movable]
+    payment_ids = sorted({payment_id for _, payment_id in movable})
+    bookings, payments = json.dumps(booking_ids), json.dumps(payment_ids)
+    # INSERT OR REPLACE keeps a rerun after an interrupted batch harmless
+    conn.execute(
+        f"INSERT OR REPLACE INTO archive.Bookings ({tools.BOOKINGS_COLUMNS}) "
+        f"SELECT {tools.BOOKINGS_COLUMNS} FROM main.Bookings WHERE BookingsID IN ({_IDS})", (bookings,))
+    conn.execute(
+        f"INSERT OR REPLACE INTO archive.Pricing ({tools.PRICING_COLUMNS}) "
+        f"SELECT {tools.PRICING_COLUMNS} FROM main.Pricing WHERE PaymentID IN ({_IDS})", (payments,))
+    conn.execute(f"DELETE FROM main.Bookings WHERE BookingsID IN ({_IDS})", (bookings,))
+    conn.execute(f"DELETE FROM main.Pricing WHERE PaymentID IN ({_IDS})", (payments,))
+    # The rows moved rather than being deleted, so no tombstones: sync clients and
+    # incremental exports start over from a full snapshot instead
+    restart_sync(conn)
+    return len(booking_ids), len(payment_ids)
+
+def archive_bookings(horizon_days: int = ARCHIVE_HORIZON_DAYS, before: Optional[str] = None,
+                     batch_size: int = ARCHIVE_BATCH_SIZE,
+                     pause_seconds: float = ARCHIVE_BATCH_PAUSE_SECONDS) -> Dict[str, Any]:
+    """Move old bookings and their payments into the archive database.
+
+    Runs online: each batch is its own short transaction, with a pause in
+    between. Historical tools read the views over live and archived rows
+    (see tools._ARCHIVE_VIEWS), so their results don't change. Bookings that are
+    a room's current stay stay live, as do bookings sharing a payment with one.
+
+    Args:
+        horizon_days: Archive bookings that departed more than this many days ago
+        before: Explicit cutoff date 'YYYY-MM-DD' instead of horizon_days
+        batch_size: Bookings moved per transaction
+        pause_seconds: Sleep between batches
+
+    Returns:
+        {"cutoff", "archive", "bookings", "payments", "batches", "longest_batch_ms", "seconds"}.
+        longest_batch_ms is the longest time the write lock was held.
+    """
+    cutoff = before or (date.today() - timedelta(days=horizon_days)).isoformat()
+    started = time.perf_counter()
+    install_change_log(tools.current_db_path())
+    path = install_archive(tools.current_db_path())
+    summary: Dict[str, Any] = {"cutoff": cutoff, "archive": path, "bookings": 0, "payments": 0, "batches": 0,
+                               "longest_batch_ms": 0.0}
+
+    conn = tools.get_db_connection()
+    # Transactions are managed explicitly, one per batch
+    conn.isolation_level = None
+    conn.execute("ATTACH DATABASE ? AS archive", (path,))
+    try:
+        after = 0
+        while True:
+            locked = time.perf_counter()
+            conn.execute("BEGIN IMMEDIATE")
+            candidates = [row[0] for row in conn.execute(
+                _CANDIDATES_SQL, {"after": after, "cutoff": cutoff, "limit": batch_size})]
+            if not candidates:
+                conn.execute("ROLLBACK")
+                break
+            with change_log_suspended(conn):
+                bookings, payments = _move_batch(conn, candidates)
+            conn.execute("COMMIT")
+            tools.bump_write_generation()
+            summary["longest_batch_ms"] = max(summary["longest_batch_ms"],
+                                              round((time.perf_counter() - locked) * 1000, 1))
+            summary["bookings"] += bookings
+            summary["payments"] += payments
+            summary["batches"] += 1
+            after = candidates[-1]
+            if len(candidates) < batch_size:
+                break
+            time.sleep(pause_seconds)
+        if summary["bookings"]:
+            # Lets the planner choose between the archive indexes and a scan
+            conn.execute("ANALYZE archive")
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+    summary["seconds"] = round(time.perf_counter() - started, 3)
+    if summary["bookings"]:
+        publish_event("resync", {"reason": "archive", "bookings": summary["bookings"]})
+    return summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move old bookings and their payments to the archive database")
+    parser.add_argument("--db", default=tools.DB_PATH)
+    parser.add_argument("--horizon-days", type=int, default=ARCHIVE_HORIZON_DAYS)
+    parser.add_argument("--before", help="Cutoff date 'YYYY-MM-DD' (overrides --horizon-days)")
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+    parser.add_argument("--pause", type=float, default=ARCHIVE_BATCH_PAUSE_SECONDS)
+    args = parser.parse_args()
+
+    tools.DB_PATH = args.db
+    print(json.dumps(archive_bookings(args.horizon_days, args.before, args.batch_size, args.pause)))
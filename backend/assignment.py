@@ -0,0 +1,81 @@
+# assignment.py
+
+import os
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+# Unassigned bookings arriving within this many days are assigned by default
+ASSIGNMENT_HORIZON_DAYS = int(os.getenv("ASSIGNMENT_HORIZON_DAYS", "30"))
+
+# Days are plain integers (e.g. julian day numbers); a stay [arrival, departure)
+# occupies the nights from arrival up to, not including, the departure day
+Stay = Tuple[int, int]
+
+# free_from of a room that has no stay before the current day, and next_busy of
+# one with no stay after it
+_NEVER = float("-inf")
+_OPEN = float("inf")
+
+def plan_assignments(bookings: Iterable[Tuple[int, int, int]], rooms: Sequence[int],
+                     busy: Dict[int, List[Stay]]) -> Tuple[Dict[int, int], List[int]]:
+    """Allocate rooms to bookings without overlapping any stay already in a room.
+
+    Bookings are swept in arrival order (longest first on the same day). Each
+    goes to the room that became free most recently before its arrival, so idle
+    gaps between stays stay short and untouched rooms stay free for long stays;
+    ties go to the room whose next stay starts soonest after the departure. A
+    booking keeps one room for its whole stay, so there are no room changes.
+
+    Args:
+        bookings: (booking_id, arrival, departure) to place
+        rooms: Candidate rooms
+        busy: Stays already assigned, by room; overlapping stays are tolerated
+
+    Returns:
+        ({booking_id: room_id}, [booking_id, ...] that no room could take)
+    """
+    stays = {room: sorted(busy.get(room, ())) for room in rooms}
+    # Stays already in rooms, by arrival; each marks its room busy once the sweep reaches it
+    starts = sorted((start, end, room) for room, room_stays in stays.items() for start, end in room_stays)
+    position = dict.fromkeys(rooms, 0)
+    free_from = dict.fromkeys(rooms, _NEVER)
+    next_busy = {room: room_stays[0][0] if room_stays else _OPEN for room, room_stays in stays.items()}
+    # free_from -> sorted (next_busy, room); days holds the keys in order
+    buckets: Dict[float, List[Tuple[float, int]]] = {_NEVER: sorted((next_busy[room], room) for room in rooms)}
+    days: List[float] = [_NEVER]
+
+    def move(room: int, new_free_from: float, new_next_busy: float) -> None:
+        bucket = buckets[free_from[room]]
+        del bucket[bisect_left(bucket, (next_busy[room], room))]
+        free_from[room], next_busy[room] = new_free_from, new_next_busy
+        if new_free_from not in buckets:
+            buckets[new_free_from] = []
+            insort(days, new_free_from)
+        insort(buckets[new_free_from], (new_next_busy, room))
+
+    assigned: Dict[int, int] = {}
+    unplaced: List[int] = []
+    started = 0
+    for booking_id, arrival, departure in sorted(bookings, key=lambda b: (b[1], b[1] - b[2], b[0])):
+        while started < len(starts) and starts[started][0] <= arrival:
+            _, end, room = starts[started]
+            started += 1
+            position[room] += 1
+            room_stays = stays[room]
+            following = room_stays[position[room]][0] if position[room] < len(room_stays) else _OPEN
+            move(room, max(free_from[room], end), following)
+
+        # Latest free_from at or before the arrival whose next stay starts after the departure
+        index = bisect_right(days, arrival)
+        while index:
+            index -= 1
+            bucket = buckets[days[index]]
+            fit = bisect_left(bucket, (departure,))
+            if fit < len(bucket):
+                room = bucket[fit][1]
+                assigned[booking_id] = room
+                move(room, departure, next_busy[room])
+                break
+        else:
+            unplaced.append(booking_id)
+    return assigned, unplaced
@@ -0,0 +1,140 @@
+# batch.py
+
+import os
+import re
+import sqlite3
+from typing import Any, Dict, List, Optional
+
+from langchain_core.tools import BaseTool
+
+import tools
+
+BATCH_MAX_STEPS = int(os.getenv("BATCH_MAX_STEPS", "500"))
+
+# Every tool in tools.py, by name
+TOOLS_BY_NAME: Dict[str, BaseTool] = {
+    obj.name: obj for obj in vars(tools).values() if isinstance(obj, BaseTool)
+}
+
+# "$2.PricingID" is field PricingID of the first row returned by step 2,
+# "$2[1].RoomID" picks row 1 instead. "$$..." escapes a literal "$".
+_REFERENCE = re.compile(r"^\$(\d+)(?:\[(\d+)\])?((?:\.\w+)*)$")
+
+class BatchError(Exception):
+    """A step failed or referenced a result that doesn't exist."""
+
+    def __init__(self, step: int, message: str):
+        super().__init__(message)
+        self.step = step
+        self.message = message
+
+def _references(value: Any) -> List[str]:
+    """Return every reference string inside a step's arguments."""
+    if isinstance(value, str):
+        return [value] if value.startswith("$") and not value.startswith("$$") else []
+    if isinstance(value, dict):
+        return [ref for item in value.values() for ref in _references(item)]
+    if isinstance(value, list):
+        return [ref for item in value for ref in _references(item)]
+    return []
+
+def _resolve(value: Any, results: List[List[Dict[str, Any]]], step: int) -> Any:
+    """Replace references in a step's arguments with values from earlier results."""
+    if isinstance(value, dict):
+        return {key: _resolve(item, results, step) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_resolve(item, results, step) for item in value]
+    if not isinstance(value, str) or not value.startswith("$"):
+        return value
+    if value.startswith("$$"):
+        return value[1:]
+
+    match = _REFERENCE.match(value)
+    source, row, path = int(match.group(1)), int(match.group(2) or 0), match.group(3)
+    rows = results[source]
+    if row >= len(rows):
+        raise BatchError(step, f"{value}: step {source} returned {len(rows)} row(s)")
+    resolved: Any = rows[row]
+    for field in path.split(".")[1:]:
+        if not isinstance(resolved, dict) or field not in resolved:
+            available = ", ".join(resolved) if isinstance(resolved, dict) else type(resolved).__name__
+            raise BatchError(step, f"{value}: no field '{field}' (available: {available})")
+        resolved = resolved[field]
+    return resolved
+
+def validate_batch(steps: List[Dict[str, Any]]) -> None:
+    """Check tool names and references before anything runs.
+
+    Raises:
+        BatchError: For the first invalid step
+    """
+    if len(steps) > BATCH_MAX_STEPS:
+        raise BatchError(BATCH_MAX_STEPS, f"A batch can have at most {BATCH_MAX_STEPS} steps")
+    for index, step in enumerate(steps):
+        if step.get("tool") not in TOOLS_BY_NAME:
+            raise BatchError(index, f"Unknown tool: {step.get('tool')}")
+        for ref in _references(step.get("args") or {}):
+            match = _REFERENCE.match(ref)
+            if not match:
+                raise BatchError(index, f"Malformed reference: {ref}")
+            if int(match.group(1)) >= index:
+                raise BatchError(index, f"{ref} must refer to an earlier step")
+
+def _failed(result: Any) -> Optional[str]:
+    """Return the error message of a tool result, or None if it succeeded."""
+    if isinstance(result, list) and result and isinstance(result[0], dict) and "error" in result[0]:
+        return str(result[0]["error"])
+    return None
+
+def run_batch(steps: List[Dict[str, Any]], transaction: bool = True) -> Dict[str, Any]:
+    """Run tool invocations in order on one database connection.
+
+    Args:
+        steps: List of {"tool": name, "args": {...}}. Argument values can reference
+            earlier results, e.g. {"payment_id": "$0.PricingID"}.
+        transaction: Run all write steps in one transaction. Nothing is committed
+            unless every step succeeds. Without it each write commits on its own
+            and the steps before a failure stay applied.
+
+    Returns:
+        {"committed", "completed", "results": [{"tool", "result"}], "error"}.
+        The batch stops at the first failing step; "error" names it. If the
+        transaction itself can't start or commit, "error" has step None.
+    """
+    try:
+        validate_batch(steps)
+    except BatchError as e:
+        return {"committed": False, "completed": 0, "results": [],
+                "error": {"step": e.step, "message": e.message}}
+
+    has_writes = any(step["tool"] in tools.WRITE_TOOL_NAMES for step in steps)
+    results: List[Dict[str, Any]] = []
+    outputs: List[Any] = []
+    try:
+        # Read-only batches read from one snapshot; custom_query and read_records
+        # use their own sandboxed connection and don't see uncommitted writes.
+        with tools.shared_connection(transaction=transaction, read_only=not has_writes):
+            for index, step in enumerate(steps):
+                tool = TOOLS_BY_NAME[step["tool"]]
+                args = _resolve(step.get("args") or {}, outputs, index)
+                try:
+                    output = tool.invoke(args)
+                except Exception as e:
+                    raise BatchError(index, f"{tool.name} failed: {e}")
+                results.append({"tool": tool.name, "result": output})
+                outputs.append(output if isinstance(output, list) else [output])
+                error = _failed(output)
+                if error is not None:
+                    raise BatchError(index, error)
+    except BatchError as e:
+        # Without a transaction, writes before the failing step were committed
+        committed = not transaction and any(
+            result["tool"] in tools.WRITE_TOOL_NAMES for result in results[:e.step])
+        return {"committed": committed, "completed": len(results),
+                "results": results, "error": {"step": e.step, "message": e.message}}
+    except sqlite3.Error as e:
+        # Taking the write lock or committing failed, e.g. "database is locked";
+        # the transaction was rolled back
+        return {"committed": False, "completed": len(results), "results": results,
+                "error": {"step": None, "message": f"Database error: {str(e)}"}}
+    return {"committed": has_writes, "completed": len(results), "results": results, "error": None}
@@ -0,0 +1,763 @@
+import argparse
+import asyncio
+import math
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import tools
+from setup import setup_database
+
+BENCH_DB_FILE = os.path.join(tempfile.gettempdir(), "hotel_bench.db")
+
+def seed_benchmark_db(db_path=BENCH_DB_FILE, rooms=2000, customers=50000, bookings=200000, seed=42):
+    """Build a hotel database with synthetic data for benchmarking."""
+    setup_database(db_path)
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    first_room = 1000
+    cursor.executemany(
+        "INSERT INTO Rooms (RoomID, isVacant, currentStay, type, price) VALUES (?, 1, NULL, ?, ?)",
+        [(first_room + i, rng.choice(("2BHK", "3BHK")), rng.choice((1500, 2500))) for i in range(rooms)],
+    )
+    cursor.executemany(
+        "INSERT INTO Customers (FirstName, LastName, DOB, IdentityType, IdentityString) VALUES (?, ?, ?, ?, ?)",
+        [(f"First{i}", f"Last{i}", "1990-01-01", rng.choice(("Adhar", "PAN", "DL")), f"ID{i:08d}")
+         for i in range(customers)],
+    )
+    cursor.executemany(
+        "INSERT INTO Pricing (PaymentType, isDone, price, discount) VALUES (?, ?, ?, ?)",
+        ((rng.choice(("Cash", "UPI", "Credit Card")), rng.randint(0, 1), rng.randint(500, 5000), rng.choice((0, 5, 10)))
+         for _ in range(bookings)),
+    )
+
+    start = date.today() - timedelta(days=3 * 365)
+
+    # Generated while inserting, so millions of bookings don't have to fit in memory
+    def booking_rows():
+        for i in range(bookings):
+            arrival = start + timedelta(days=rng.randint(0, 4 * 365))
+            booked = arrival - timedelta(days=rng.randint(0, 120))
+            departure = arrival + timedelta(days=rng.randint(1, 10))
+            yield (
+                rng.randint(6, customers + 5), booked.isoformat(), arrival.isoformat(),
+                departure.isoformat(), i + 6, first_room + rng.randrange(rooms),
+            )
+
+    cursor.executemany(
+        "INSERT INTO Bookings (customerID, bookedDate, arrivalDate, departureDay, paymentID, RoomID) VALUES (?, ?, ?, ?, ?, ?)",
+        booking_rows(),
+    )
+    conn.commit()
+    conn.close()
+    return db_path
+
+def use_database(db_path):
+    """Point the tools module at a database file."""
+    tools.close_read_connections()
+    tools.DB_PATH = db_path
+
+def timed(fn, repeat=5):
+    """Return the best wall-clock time of fn() in milliseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def bench_parallel_tools(args):
+    """Compare one agent step of independent read tools run serially vs on the tool node."""
+    from langchain_core.messages import AIMessage
+    from langgraph.graph import END, START, MessagesState, StateGraph
+    from tool_executor import build_tool_node
+
+    step_tools = [tools.get_room_occupancy_stats, tools.get_upcoming_arrivals, tools.get_revenue_by_room_type]
+    calls = [{"name": t.name, "args": {}, "id": f"call_{i}", "type": "tool_call"} for i, t in enumerate(step_tools)]
+    graph = StateGraph(MessagesState)
+    graph.add_node("tools", build_tool_node(step_tools))
+    graph.add_edge(START, "tools")
+    graph.add_edge("tools", END)
+    node = graph.compile()
+    state = {"messages": [AIMessage(content="", tool_calls=calls)]}
+
+    slowest = 0.0
+    for t in step_tools:
+        elapsed = timed(lambda: t.invoke({}))
+        slowest = max(slowest, elapsed)
+        print(f"{t.name:<28} {elapsed:8.1f} ms")
+    serial = timed(lambda: [t.invoke({}) for t in step_tools])
+    parallel = timed(lambda: node.invoke(state))
+    loop = asyncio.new_event_loop()
+    parallel_async = timed(lambda: loop.run_until_complete(node.ainvoke(state)))
+    # Both paths run the calls through the same ToolNode execution
+    contents = [[(m.content, m.status) for m in result["messages"][1:]]
+                for result in (node.invoke(state), loop.run_until_complete(node.ainvoke(state)))]
+    loop.close()
+    print(f"{'slowest call':<28} {slowest:8.1f} ms")
+    print(f"{'serial step':<28} {serial:8.1f} ms")
+    print(f"{'parallel step (invoke)':<28} {parallel:8.1f} ms")
+    print(f"{'parallel step (ainvoke)':<28} {parallel_async:8.1f} ms")
+    print(f"{'same results':<28} {'yes' if contents[0] == contents[1] else 'NO'}")
+
+_COLD_START_SCRIPT = """
+import time
+start = time.perf_counter()
+import api
+{eager}
+imported = time.perf_counter()
+api.occupancy_stats()
+served = time.perf_counter()
+print(imported - start, served - start)
+"""
+
+def bench_startup(args):
+    """Compare import time and time to first REST response with a lazy vs eager agent import."""
+    env = dict(os.environ, SQLITE_DB_PATH=args.db, AGENT_WARMUP="0")
+    modes = {"lazy agent": "", "eager agent": "import agent"}
+    for label, eager in modes.items():
+        imports, firsts = [], []
+        for _ in range(args.repeat):
+            out = subprocess.run(
+                [sys.executable, "-c", _COLD_START_SCRIPT.format(eager=eager)],
+                env=env, capture_output=True, text=True, check=True,
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+            ).stdout.split()
+            imports.append(float(out[-2]) * 1000)
+            firsts.append(float(out[-1]) * 1000)
+        print(f"{label:<12} import {min(imports):8.1f} ms   first response {min(firsts):8.1f} ms")
+
+def bench_sync(args):
+    """Compare payload size of a full resync with a delta sync after a few writes."""
+    import json
+    from sync import get_changes, install_change_log
+
+    install_change_log(args.db)
+    full = get_changes(None, ["Bookings"])
+    version = full["version"]
+    for booking_id in range(10, 60):
+        tools.update_booking_details.invoke({"booking_id": booking_id, "departure_day": "2030-01-01"})
+    tools.cancel_booking.invoke({"booking_id": 70})
+    delta = get_changes(version, ["Bookings"])
+    full_bytes = len(json.dumps(full))
+    delta_bytes = len(json.dumps(delta))
+    print(f"full resync   {len(full['changes']['Bookings']['upserts']):>8} rows {full_bytes / 1024:10.1f} KiB")
+    print(f"delta sync    {len(delta['changes']['Bookings']['upserts']):>8} rows {delta_bytes / 1024:10.1f} KiB "
+          f"({len(delta['changes']['Bookings']['deletes'])} tombstones)")
+
+def bench_archive(args):
+    """Time front-desk and historical tools before and after archiving bookings older than a year."""
+    from archive import archive_bookings
+
+    workdir = tempfile.mkdtemp()
+    try:
+        db_path = os.path.join(workdir, "hotel.db")
+        shutil.copy(args.db, db_path)
+        use_database(db_path)
+        today = date.today()
+        calls = [
+            ("get_upcoming_arrivals", {"days": 7}),
+            ("get_current_stays", {}),
+            ("get_room_occupancy_stats", {}),
+            ("get_customer_bookings", {"customer_id": 123}),
+            ("get_customer_by_id", {"customer_id": 123}),
+            ("get_revenue_by_room_type", {"start_date": (today - timedelta(days=700)).isoformat(),
+                                          "end_date": (today - timedelta(days=520)).isoformat()}),
+            ("list_bookings_by_date_range", {"start_date": (today - timedelta(days=600)).isoformat(),
+                                             "end_date": (today - timedelta(days=598)).isoformat()}),
+        ]
+
+        def run_calls():
+            return {name: timed(lambda: getattr(tools, name).invoke(call_args), args.repeat)
+                    for name, call_args in calls}
+
+        before = run_calls()
+        summary = archive_bookings(pause_seconds=0)
+        after = run_calls()
+        print(f"archived {summary['bookings']} bookings in {summary['batches']} batches, {summary['seconds']:.1f} s, "
+              f"longest write lock {summary['longest_batch_ms']:.1f} ms")
+        for name, _ in calls:
+            print(f"{name:<28} {before[name]:8.1f} ms -> {after[name]:8.1f} ms")
+    finally:
+        tools.close_read_connections()
+        shutil.rmtree(workdir)
+
+def _same_result(expected, actual, rel_tol=1e-9):
+    """Compare tool results, allowing float sums to differ in the last digits."""
+    if isinstance(expected, float) and isinstance(actual, float):
+        return math.isclose(expected, actual, rel_tol=rel_tol)
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        return expected.keys() == actual.keys() and all(_same_result(expected[k], actual[k]) for k in expected)
+    if isinstance(expected, list) and isinstance(actual, list):
+        return len(expected) == len(actual) and all(_same_result(e, a) for e, a in zip(expected, actual))
+    return type(expected) is type(actual) and expected == actual
+
+def bench_analytics(args):
+    """Compare the report tools on SQLite and on the NumPy analytics snapshot."""
+    import analytics
+
+    start = time.perf_counter()
+    snapshot = analytics.get_snapshot(max_age=0)
+    memory = sum(value.nbytes for part in snapshot.parts(history=True)
+                 for value in vars(part).values() if hasattr(value, "nbytes"))
+    print(f"snapshot of {snapshot.size} bookings loaded in {time.perf_counter() - start:.1f} s, "
+          f"{memory / 2**20:.0f} MiB of arrays")
+
+    today = date.today()
+    calls = [
+        ("get_revenue_by_room_type", {}),
+        ("get_revenue_by_room_type", {"start_date": (today - timedelta(days=3 * 365)).isoformat(),
+                                      "end_date": (today - timedelta(days=365)).isoformat()}),
+        ("list_bookings_by_date_range", {"start_date": (today - timedelta(days=400)).isoformat(),
+                                         "end_date": (today - timedelta(days=397)).isoformat()}),
+    ]
+    bookings = tools.run_query("SELECT COUNT(*) AS n FROM Bookings")[0]["n"]
+    if bookings <= 1000000:
+        calls.append(("get_hotel_statistics", {}))
+    else:
+        print("get_hotel_statistics skipped: its SQL version takes far too long at this size")
+    # Rows with the same arrival date come back in no particular order from SQLite
+    by_arrival = lambda row: (row.get("arrivalDate"), row.get("BookingsID"))
+    for name, call_args in calls:
+        results, times = {}, {}
+        for backend in ("sqlite", "numpy"):
+            tools.ANALYTICS_BACKEND = backend
+            tool = getattr(tools, name)
+            times[backend] = timed(lambda: tool.invoke(call_args), 1 if backend == "sqlite" else args.repeat)
+            results[backend] = tool.invoke(call_args)
+        tools.ANALYTICS_BACKEND = "sqlite"
+        expected = results["sqlite"]
+        if name == "list_bookings_by_date_range":
+            expected = sorted(expected, key=by_arrival)
+        same = _same_result(expected, results["numpy"])
+        label = f"{name}({', '.join(str(value) for value in call_args.values())})"
+        print(f"{label:<62} sqlite {times['sqlite']:9.1f} ms  numpy {times['numpy']:8.1f} ms  "
+              f"x{times['sqlite'] / times['numpy']:6.1f}  {'same' if same else 'DIFFERENT'}  ({len(expected)} rows)")
+
+def bench_assignment(args):
+    """Assign rooms to thousands of unassigned bookings arriving over the next 30 days."""
+    rng = random.Random(7)
+    for count in (1000, 5000):
+        path = f"{os.path.splitext(args.db)[0]}_assignment.db"
+        shutil.copyfile(args.db, path)
+        conn = sqlite3.connect(path)
+        rows = []
+        for _ in range(count):
+            arrival = date.today() + timedelta(days=rng.randint(0, 29))
+            departure = arrival + timedelta(days=rng.randint(1, 10))
+            rows.append((6, date.today().isoformat(), arrival.isoformat(), departure.isoformat(), 6))
+        conn.executemany(
+            "INSERT INTO Bookings (customerID, bookedDate, arrivalDate, departureDay, paymentID) VALUES (?, ?, ?, ?, ?)",
+            rows)
+        conn.commit()
+        conn.close()
+        use_database(path)
+        for dry_run in (True, False):
+            start = time.perf_counter()
+            result = tools.assign_rooms.invoke({"dry_run": dry_run})[0]
+            elapsed = (time.perf_counter() - start) * 1000
+            label = f"{count} bookings" + (", plan only" if dry_run else ", written")
+            print(f"{label:<28} {elapsed:8.1f} ms  assigned {result['assigned']}  unassigned {len(result['unassigned'])}")
+    use_database(args.db)
+
+def bench_batch(args):
+    """Compare a 50-room group booking as separate REST calls vs one /batch request."""
+    os.environ["AGENT_WARMUP"] = "0"
+    from fastapi.testclient import TestClient
+    import api
+
+    rooms = [room["RoomID"] for room in tools.get_all_rooms.invoke({})[:50]]
+    arrival = (date.today() + timedelta(days=400)).isoformat()
+    departure = (date.today() + timedelta(days=402)).isoformat()
+    with TestClient(api.app) as client:
+        def separate_calls():
+            for room_id in rooms:
+                payment = client.post("/add-payment", params={"payment_type": "UPI", "price": 1500}).json()
+                client.post("/book-room", params={
+                    "customer_id": 6, "room_id": room_id, "arrival_date": arrival,
+                    "departure_day": departure, "payment_id": payment[0]["PricingID"]})
+
+        steps = []
+        for room_id in rooms:
+            steps.append({"tool": "add_payment", "args": {"payment_type": "UPI", "price": 1500}})
+            steps.append({"tool": "book_room", "args": {
+                "customer_id": 6, "room_id": room_id, "arrival_date": arrival,
+                "departure_day": departure, "payment_id": f"${len(steps) - 1}.PricingID"}})
+
+        def one_batch():
+            assert client.post("/batch", json={"steps": steps}).json()["error"] is None
+
+        print(f"{'separate calls':<16} {2 * len(rooms):>4} requests {timed(separate_calls, args.repeat):10.1f} ms")
+        print(f"{'/batch':<16} {1:>4} request  {timed(one_batch, args.repeat):10.1f} ms")
+
+def bench_groups(args):
+    """Check a 200-room group in and out with one call per room vs one group call."""
+    os.environ["AGENT_WARMUP"] = "0"
+    from fastapi.testclient import TestClient
+    import api
+
+    path = f"{os.path.splitext(args.db)[0]}_groups.db"
+    shutil.copyfile(args.db, path)
+    use_database(path)
+    today = date.today().isoformat()
+    departure = (date.today() + timedelta(days=3)).isoformat()
+    conn = sqlite3.connect(path)
+    rooms = [row[0] for row in conn.execute("SELECT RoomID FROM Rooms ORDER BY RoomID DESC LIMIT 200")]
+    conn.execute(f"UPDATE Rooms SET isVacant = 1, currentStay = NULL WHERE RoomID >= {min(rooms)}")
+    bookings = [conn.execute(
+        "INSERT INTO Bookings (customerID, bookedDate, arrivalDate, departureDay, paymentID, RoomID) "
+        "VALUES (6, ?, ?, ?, 6, ?)", (today, today, departure, room_id)).lastrowid for room_id in rooms]
+    conn.commit()
+    conn.close()
+    items = [{"room_id": room_id, "booking_id": booking_id} for room_id, booking_id in zip(rooms, bookings)]
+
+    with TestClient(api.app) as client:
+        def separate_calls():
+            for item in items:
+                assert "error" not in client.post("/check-in", params=item).json()[0]
+            for room_id in rooms:
+                client.post("/check-out", params={"room_id": room_id})
+
+        def group_calls(check_in):
+            results = client.post("/group-check-in", json=check_in).json()
+            assert sum("success" in result for result in results) == len(items)
+            results = client.post("/group-check-out", json={"room_ids": rooms}).json()
+            assert all("success" in result for result in results)
+
+        print(f"{'separate calls':<22} {2 * len(items):>4} requests {timed(separate_calls, args.repeat):10.1f} ms")
+        print(f"{'group, listed pairs':<22} {2:>4} requests {timed(lambda: group_calls({'items': items}), args.repeat):10.1f} ms")
+        check_in = {"arrival_date": today, "floor": rooms[0] // 100}
+        rooms = [room_id for room_id in rooms if room_id // 100 == check_in["floor"]]
+        items = [item for item in items if item["room_id"] in rooms]
+        print(f"{'group, date and floor':<22} {2:>4} requests {timed(lambda: group_calls(check_in), args.repeat):10.1f} ms"
+              f"  ({len(items)} rooms)")
+    use_database(args.db)
+
+def bench_pricing(args):
+    """Recalculate 365 nights of rates per room type from SQLite and from the analytics snapshot."""
+    import analytics
+    import pricing
+
+    path = f"{os.path.splitext(args.db)[0]}_pricing.db"
+    shutil.copyfile(args.db, path)
+    pricing.install_rate_table(path)
+    use_database(path)
+    backend = tools.ANALYTICS_BACKEND
+    for source in ("sqlite", "numpy"):
+        tools.ANALYTICS_BACKEND = source
+        if source == "numpy":
+            analytics.get_snapshot()
+        runs = [pricing.recalculate_rates(365) for _ in range(args.repeat)]
+        best = min(runs, key=lambda run: run["load_ms"] + run["compute_ms"] + run["store_ms"])
+        print(f"{best['source']:<9} {best['rows']} rates  load {best['load_ms']:7.1f} ms  "
+              f"compute {best['compute_ms']:6.1f} ms  store {best['store_ms']:6.1f} ms")
+    tools.ANALYTICS_BACKEND = backend
+    use_database(args.db)
+
+def bench_revenue_series(args):
+    """Prorated revenue per room type for a year at each granularity, and monthly over all history."""
+    import revenue
+
+    end = date.today().isoformat()
+    for granularity in revenue.GRANULARITIES:
+        rows = revenue.revenue_time_series(end_date=end, granularity=granularity)
+        elapsed = timed(lambda: revenue.revenue_time_series(end_date=end, granularity=granularity), args.repeat)
+        print(f"{granularity:<6} 1 year   {len(rows):5d} rows  {elapsed:7.1f} ms")
+    rows = revenue.revenue_time_series(start_date="2000-01-01", end_date=end)
+    elapsed = timed(lambda: revenue.revenue_time_series(start_date="2000-01-01", end_date=end), args.repeat)
+    print(f"month  all time {len(rows):5d} rows  {elapsed:7.1f} ms")
+
+def bench_occupancy(args):
+    """Vacancy and occupancy reads from the Rooms table vs the in-memory room state, half the rooms occupied."""
+    import occupancy
+
+    path = f"{os.path.splitext(args.db)[0]}_occupancy.db"
+    shutil.copyfile(args.db, path)
+    conn = sqlite3.connect(path)
+    rooms = [row[0] for row in conn.execute("SELECT RoomID FROM Rooms WHERE RoomID % 2 = 1")]
+    stays = [row[0] for row in conn.execute(
+        "SELECT BookingsID FROM Bookings ORDER BY BookingsID DESC LIMIT ?", (len(rooms),))]
+    conn.executemany("UPDATE Rooms SET isVacant = 0, currentStay = ? WHERE RoomID = ?", zip(stays, rooms))
+    conn.commit()
+    conn.close()
+    use_database(path)
+    reads = {
+        "get_vacant_rooms": lambda: tools.get_vacant_rooms.func(),
+        "get_vacant_rooms 2BHK": lambda: tools.get_vacant_rooms.func("2BHK"),
+        "get_room_occupancy_stats": lambda: tools.get_room_occupancy_stats.func(),
+        "get_current_stays": lambda: tools.get_current_stays.func(),
+    }
+    from_sql = {name: (read(), timed(read, args.repeat)) for name, read in reads.items()}
+    start = time.perf_counter()
+    state = occupancy.load()
+    print(f"room state of {sum(state.total)} rooms loaded in {(time.perf_counter() - start) * 1000:.1f} ms")
+    for name, read in reads.items():
+        rows, elapsed = read(), timed(read, args.repeat)
+        print(f"{name:<26} sqlite {from_sql[name][1]:7.3f} ms  memory {elapsed:7.3f} ms  "
+              f"{'same' if rows == from_sql[name][0] else 'DIFFERENT'}")
+    print(f"{'hotel statistics occupancy':<26} memory {timed(state.occupancy, args.repeat):7.3f} ms")
+    start = time.perf_counter()
+    corrected = occupancy.verify()
+    print(f"consistency check {(time.perf_counter() - start) * 1000:.1f} ms, {corrected} rooms corrected")
+    use_database(args.db)
+
+def bench_import(args):
+    """Bulk import synthetic customers (CSV) and bookings with inline payments (NDJSON)."""
+    import csv
+    import json
+    from bulk_import import import_file
+
+    rows = args.bookings
+    rng = random.Random(7)
+    workdir = tempfile.mkdtemp(prefix="hotel_import_")
+    customers_csv = os.path.join(workdir, "customers.csv")
+    bookings_ndjson = os.path.join(workdir, "bookings.ndjson")
+    with open(customers_csv, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["FirstName", "LastName", "DOB", "IdentityType", "IdentityString"])
+        for i in range(rows):
+            writer.writerow([f"First{i}", f"Last{i}", "1990-01-01", rng.choice(("Adhar", "PAN", "DL")), f"IMP{i:09d}"])
+    start = date.today()
+    with open(bookings_ndjson, "w") as f:
+        for i in range(rows):
+            arrival = start + timedelta(days=rng.randint(0, 365))
+            f.write(json.dumps({
+                "customerID": rng.randint(1, 5), "RoomID": rng.choice((101, 102, 103, 104, 105)),
+                "arrivalDate": arrival.isoformat(), "departureDay": (arrival + timedelta(days=2)).isoformat(),
+                "PaymentType": "UPI", "price": 1500, "discount": 5,
+            }) + "\n")
+
+    import_db = os.path.join(workdir, "import.db")
+    setup_database(import_db)
+    use_database(import_db)
+    for table, path in (("customers", customers_csv), ("bookings", bookings_ndjson)):
+        result = import_file(table, path)
+        print(f"{table:<10} {result['inserted']:>8} rows {result['seconds']:8.2f} s "
+              f"{result['rows_per_second']:>10} rows/s ({result['rejected']} rejected)")
+    shutil.rmtree(workdir)
+
+def bench_export(args):
+    """Stream the bookings export with different row group sizes and report peak Python memory."""
+    import tracemalloc
+    from export import export_bookings
+
+    formats = ["csv"]
+    try:
+        import pyarrow  # noqa: F401
+        formats += ["parquet", "arrow"]
+    except ImportError:
+        print("pyarrow not installed; only CSV is measured")
+    for fmt in formats:
+        for row_group_size in (5000, 10000, 50000):
+            tracemalloc.start()
+            start = time.perf_counter()
+            size = sum(len(chunk) for chunk in export_bookings(fmt, row_group_size=row_group_size))
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{fmt:<8} group {row_group_size:>6}  {elapsed:7.2f} s  {size / 2**20:8.1f} MiB out  "
+                  f"peak {peak / 2**20:7.1f} MiB")
+
+def bench_serialization(args):
+    """Compare payload size and encoding CPU of the row and columnar response formats."""
+    import gzip
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    from responses import FastJSONResponse
+
+    endpoints = [
+        ("/all-customers", tools.ALL_CUSTOMERS_QUERY, ()),
+        ("/all-bookings", tools.ALL_BOOKINGS_QUERY, ()),
+        ("/bookings/date-range", tools.BOOKINGS_BY_DATE_RANGE_QUERY, {"start": "2025-01-01", "end": "2025-12-31"}),
+    ]
+    for path, query, params in endpoints:
+        # What the endpoints do: rows as dicts, jsonable_encoder, then the response class
+        def rows_stdlib():
+            return JSONResponse(jsonable_encoder(tools.run_query(query, params))).body
+
+        def rows_fast():
+            return FastJSONResponse(jsonable_encoder(tools.run_query(query, params))).body
+
+        def columnar():
+            return FastJSONResponse(tools.run_query_columnar(query, params)).body
+
+        print(path)
+        for name, fn in (("rows + json", rows_stdlib), ("rows + orjson", rows_fast), ("columnar + orjson", columnar)):
+            body = fn()
+            cpu = []
+            for _ in range(args.repeat):
+                start = time.process_time()
+                fn()
+                cpu.append(time.process_time() - start)
+            print(f"  {name:<18} {min(cpu) * 1000:8.1f} ms CPU  {len(body) / 2**20:7.2f} MiB  "
+                  f"gzip {len(gzip.compress(body, 6)) / 2**20:6.2f} MiB")
+
+def bench_row_memory(args):
+    """Peak Python memory and time of reading all bookings in each row representation."""
+    import tracemalloc
+    from responses import json_rows
+
+    query = tools.ALL_BOOKINGS_QUERY
+
+    def dicts_fetchall():
+        # run_query before it iterated the cursor
+        conn = tools.acquire_read_connection()
+        try:
+            cursor = conn.execute(query)
+            rows = cursor.fetchall()
+            columns = [description[0] for description in cursor.description]
+            return [dict(zip(columns, row)) for row in rows]
+        finally:
+            tools.release_read_connection(conn)
+
+    class Booking:
+        __slots__ = ("BookingsID", "customerID", "bookedDate", "arrivalDate", "departureDay", "paymentID",
+                     "RoomID", "room_type", "room_price")
+
+        def __init__(self, booking_id, customer_id, booked, arrival, departure, payment_id, _, room_id,
+                     room_type, room_price):
+            self.BookingsID = booking_id
+            self.customerID = customer_id
+            self.bookedDate = booked
+            self.arrivalDate = arrival
+            self.departureDay = departure
+            self.paymentID = payment_id
+            self.RoomID = room_id
+            self.room_type = room_type
+            self.room_price = room_price
+
+    def streamed_json():
+        rows = tools.iter_query(query)
+        return sum(len(chunk) for chunk in json_rows(rows.columns, rows.batches()))
+
+    variants = [
+        ("dicts, fetchall", dicts_fetchall),
+        ("dicts (run_query)", lambda: tools.run_query(query)),
+        ("tuples + header", lambda: tools.run_query_columnar(query)),
+        ("__slots__ records", lambda: list(tools.iter_query(query).records(Booking))),
+        ("iterator, count only", lambda: sum(1 for _ in tools.iter_query(query))),
+        ("iterator, JSON stream", streamed_json),
+    ]
+    for name, fn in variants:
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{name:<22} {elapsed * 1000:8.0f} ms  peak {peak / 2**20:7.1f} MiB")
+
+def bench_writes(args):
+    """Write throughput of 32 concurrent writers: per-call commits vs the group-commit writer."""
+    import shutil
+    import threading
+    import writer
+
+    writers, writes_each = 32, 25
+    path = f"{os.path.splitext(args.db)[0]}_writes.db"
+    shutil.copyfile(args.db, path)
+    use_database(path)
+    rooms = [row["RoomID"] for row in tools.run_query("SELECT RoomID FROM Rooms LIMIT 64")]
+
+    def writer_thread(number, latencies, errors):
+        for i in range(writes_each):
+            start = time.perf_counter()
+            if i % 2:
+                result = tools.checkout_guest.invoke({"room_id": rooms[(number + i) % len(rooms)]})
+            else:
+                result = tools.add_payment.invoke({"payment_type": "UPI", "price": 1500})
+            latencies.append((time.perf_counter() - start) * 1000)
+            if "error" in result[0]:
+                errors.append(result[0]["error"])
+
+    for grouped in (False, True):
+        tools.WRITE_GROUP_COMMIT = grouped
+        latencies, errors = [], []
+        threads = [threading.Thread(target=writer_thread, args=(n, latencies, errors)) for n in range(writers)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        label = "group commit" if grouped else "per-call commits"
+        print(f"{label:<17} {len(latencies) / elapsed:8.0f} writes/s  p50 {_percentile(latencies, 0.5):7.1f} ms  "
+              f"p99 {_percentile(latencies, 0.99):7.1f} ms  errors {len(errors)}"
+              + (f" ({errors[0]})" if errors else ""))
+    print(writer.get_writer_stats()[path])
+    use_database(args.db)
+
+def bench_admission(args):
+    """Coalesce concurrent identical reads, and admit a burst of agent runs fairly."""
+    os.environ["AGENT_WARMUP"] = "0"
+    import asyncio
+    import httpx
+    import admission
+    import api
+
+    async def burst(path, requests=32):
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            start = time.perf_counter()
+            responses = await asyncio.gather(*(client.get(path) for _ in range(requests)))
+            elapsed = (time.perf_counter() - start) * 1000
+        assert len({response.content for response in responses}) == 1
+        return elapsed
+
+    paths = admission.COALESCE_PATHS
+    for path in ("/current-stays", "/occupancy-stats", "/revenue"):
+        admission.COALESCE_PATHS = frozenset()
+        alone = asyncio.run(burst(path))
+        admission.COALESCE_PATHS = paths
+        before = dict(admission.coalescing_stats)
+        shared = asyncio.run(burst(path))
+        executions = admission.coalescing_stats["executions"] - before["executions"]
+        print(f"32 x GET {path:<17} separate {alone:8.1f} ms  coalesced {shared:8.1f} ms  "
+              f"({executions} executions)")
+
+    async def agent_burst():
+        # Agent runs stood in by a 100 ms sleep: 2 slots, client "a" sends 12, "b" and "c" 3 each
+        governor = admission.AgentGovernor(max_concurrent=2, max_queue=16, max_queue_per_client=6)
+        order, statuses = [], []
+
+        async def run(client):
+            try:
+                async with governor.slot(client):
+                    await asyncio.sleep(0.1)
+                    order.append(client)
+            except admission.AdmissionRejected as e:
+                statuses.append((client, e.status_code))
+
+        await asyncio.gather(*(run(client) for client in ["a"] * 12 + ["b"] * 3 + ["c"] * 3))
+        return order, statuses, governor.get_stats()
+
+    order, statuses, stats = asyncio.run(agent_burst())
+    print("completion order:", "".join(order))
+    print("rejected:", statuses)
+    print(stats)
+
+def bench_chain(args):
+    """Time chain-wide revenue and occupancy over copies of the benchmark database as shards."""
+    import shutil
+    import chain
+    import properties
+
+    shards = 4
+    for number in range(shards):
+        path = f"{os.path.splitext(args.db)[0]}_shard{number}.db"
+        if not os.path.exists(path):
+            shutil.copyfile(args.db, path)
+        properties.PROPERTIES[f"hotel{number}"] = path
+    single = timed(lambda: tools.get_revenue_by_room_type.invoke({}), args.repeat)
+    print(f"get_revenue_by_room_type on one shard        {single:8.1f} ms")
+    for workers in (1, shards):
+        chain.CHAIN_WORKERS = workers
+        revenue = timed(chain.chain_revenue, args.repeat)
+        occupancy = timed(chain.chain_occupancy, args.repeat)
+        print(f"chain_revenue over {shards} shards, {workers} at a time   {revenue:8.1f} ms  "
+              f"(chain_occupancy {occupancy:.1f} ms)")
+    rows = chain.chain_revenue()
+    print([row for row in rows if row["property"] == chain.ALL_PROPERTIES])
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def bench_workers(args):
+    """Interactive endpoint latency while reports run in the API process vs in the worker pool."""
+    os.environ["AGENT_WARMUP"] = "0"
+    import threading
+    from fastapi.testclient import TestClient
+    import api
+    import workers
+
+    # Without the context manager the lifespan doesn't run; the pool is started below
+    client = TestClient(api.app)
+    customers = [row["CustomerID"] for row in tools.run_query("SELECT CustomerID FROM Customers LIMIT 50")]
+    rooms = [row["RoomID"] for row in tools.run_query("SELECT RoomID FROM Rooms LIMIT 50")]
+
+    def interactive(requests=300):
+        latencies = []
+        for i in range(requests):
+            path = f"/customer/{customers[i % len(customers)]}" if i % 2 else f"/room/{rooms[i % len(rooms)]}"
+            start = time.perf_counter()
+            client.get(path)
+            latencies.append((time.perf_counter() - start) * 1000)
+        return latencies
+
+    def run(label):
+        stop = threading.Event()
+        reports = [0]
+
+        def report_loop(path):
+            while not stop.is_set():
+                client.get(path)
+                reports[0] += 1
+
+        loaders = [threading.Thread(target=report_loop, args=(path,))
+                   for path in ("/hotel-statistics", "/revenue")] if label != "idle" else []
+        for thread in loaders:
+            thread.start()
+        time.sleep(0.5 if loaders else 0)
+        start = time.perf_counter()
+        latencies = interactive()
+        elapsed = time.perf_counter() - start
+        stop.set()
+        for thread in loaders:
+            thread.join()
+        print(f"{label:<22} p50 {_percentile(latencies, 0.5):7.1f} ms  p99 {_percentile(latencies, 0.99):7.1f} ms  "
+              f"max {max(latencies):7.1f} ms  ({reports[0]} reports finished in {elapsed:.1f} s)")
+
+    run("idle")
+    run("reports in-process")
+    pool = workers.start_pool()
+    # Wait until the workers have imported the tools
+    pool.run("get_revenue_by_room_type", {"start_date": "2000-01-01", "end_date": "2000-01-02"})
+    run(f"reports on {pool.processes} workers")
+    print(pool.get_stats())
+    workers.stop_pool()
+
+BENCHMARKS = {
+    "analytics": bench_analytics,
+    "admission": bench_admission,
+    "archive": bench_archive,
+    "assignment": bench_assignment,
+    "batch": bench_batch,
+    "chain": bench_chain,
+    "export": bench_export,
+    "groups": bench_groups,
+    "import": bench_import,
+    "occupancy": bench_occupancy,
+    "parallel-tools": bench_parallel_tools,
+    "pricing": bench_pricing,
+    "revenue-series": bench_revenue_series,
+    "row-memory": bench_row_memory,
+    "serialization": bench_serialization,
+    "startup": bench_startup,
+    "sync": bench_sync,
+    "workers": bench_workers,
+    "writes": bench_writes,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hotel backend benchmarks")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--db", default=BENCH_DB_FILE, help="Benchmark database file")
+    parser.add_argument("--bookings", type=int, default=200000)
+    parser.add_argument("--reseed", action="store_true", help="Rebuild the benchmark database")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.reseed or not os.path.exists(args.db):
+        seed_benchmark_db(args.db, bookings=args.bookings)
+    use_database(args.db)
+    BENCHMARKS[args.benchmark](args)
@@ -0,0 +1,528 @@
+# bulk_import.py
+
+import argparse
+import csv
+import datetime
+import functools
+import gc
+import json
+import os
+import sqlite3
+import sys
+import time
+from itertools import islice
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, TextIO, Tuple
+
+import tools
+from events import publish_event
+from sync import change_log_suspended, install_change_log, log_changes
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; NDJSON lines are then decoded with the stdlib
+    orjson = None
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "10000"))
+# Rejects beyond this many are counted but not included in the report
+IMPORT_MAX_REPORTED_REJECTS = int(os.getenv("IMPORT_MAX_REPORTED_REJECTS", "1000"))
+
+IMPORT_FORMATS = ("csv", "ndjson")
+
+# Insert order, so rows created inline exist before the rows referencing them
+_INSERT_ORDER = ("Customers", "Pricing", "Rooms", "Bookings")
+
+# (table, values) pairs produced from one source row
+_Inserts = Tuple[Tuple[str, tuple], ...]
+
+class RowRejected(ValueError):
+    """A source row failed validation."""
+
+# Field parsers. Source columns are matched case-insensitively against the
+# database column names, so CSV headers and NDJSON keys both work.
+
+def _text(row: Dict[str, Any], key: str) -> str:
+    value = row.get(key)
+    if value.__class__ is not str:
+        if value is None:
+            raise RowRejected(f"missing {key}")
+        value = str(value)
+    value = value.strip()
+    if not value:
+        raise RowRejected(f"missing {key}")
+    return value
+
+def _optional(row: Dict[str, Any], key: str) -> Optional[Any]:
+    value = row.get(key)
+    return None if value is None or value == "" or (value.__class__ is str and not value.strip()) else value
+
+def _int(row: Dict[str, Any], key: str) -> int:
+    try:
+        return int(_text(row, key))
+    except ValueError:
+        raise RowRejected(f"{key} is not an integer: {row.get(key)!r}")
+
+def _float(row: Dict[str, Any], key: str, default: Optional[float] = None) -> float:
+    if default is not None and _optional(row, key) is None:
+        return default
+    try:
+        return float(_text(row, key))
+    except ValueError:
+        raise RowRejected(f"{key} is not a number: {row.get(key)!r}")
+
+def _bool(row: Dict[str, Any], key: str, default: bool) -> int:
+    value = _optional(row, key)
+    if value is None:
+        return int(default)
+    text = str(value).strip().lower()
+    if text in ("1", "true", "yes", "y"):
+        return 1
+    if text in ("0", "false", "no", "n"):
+        return 0
+    raise RowRejected(f"{key} is not a boolean: {value!r}")
+
+@functools.lru_cache(maxsize=65536)
+def _parse_date(text: str) -> Optional[str]:
+    # Imports repeat the same few thousand dates, so parsing is memoized
+    try:
+        return datetime.date.fromisoformat(text).isoformat()
+    except ValueError:
+        return None
+
+def _date(row: Dict[str, Any], key: str) -> str:
+    text = _text(row, key)
+    date = _parse_date(text)
+    if date is None:
+        raise RowRejected(f"{key} is not a YYYY-MM-DD date: {text!r}")
+    return date
+
+def _choice(row: Dict[str, Any], key: str, allowed: Tuple[str, ...]) -> str:
+    value = _text(row, key)
+    if value not in allowed:
+        raise RowRejected(f"{key} must be one of {', '.join(allowed)}: {value!r}")
+    return value
+
+class _IdAllocator:
+    """Hands out primary keys for new rows so foreign keys can be resolved before inserting."""
+
+    def __init__(self, existing: Set[int]):
+        self.ids = existing
+        self.next_id = max(existing, default=0) + 1
+
+    def sync(self, conn: sqlite3.Connection, table: str, pk: str) -> None:
+        """Skip ids taken by other writers since the last chunk."""
+        current = conn.execute(f"SELECT MAX({pk}) FROM {table}").fetchone()[0] or 0
+        self.next_id = max(self.next_id, current + 1)
+
+    def claim(self, requested: Optional[int] = None) -> int:
+        if requested is not None:
+            if requested in self.ids:
+                raise RowRejected(f"id {requested} already exists")
+            self.ids.add(requested)
+            return requested
+        while self.next_id in self.ids:
+            self.next_id += 1
+        self.ids.add(self.next_id)
+        return self.next_id
+
+class _ImportContext:
+    """In-memory key maps used to validate and resolve foreign keys without per-row queries."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.customers = _IdAllocator({row[0] for row in conn.execute("SELECT CustomerID FROM Customers")})
+        self._customer_by_identity: Optional[Dict[Tuple[str, str], int]] = None
+        self.payments = _IdAllocator({row[0] for row in conn.execute("SELECT PaymentID FROM Pricing")})
+        self.rooms = _IdAllocator({row[0] for row in conn.execute("SELECT RoomID FROM Rooms")})
+        self.bookings = _IdAllocator({row[0] for row in conn.execute("SELECT BookingsID FROM Bookings")})
+        # UTC, the same day as SQLite's date('now')
+        self.today = datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+
+    @property
+    def customer_by_identity(self) -> Dict[Tuple[str, str], int]:
+        """CustomerID by (IdentityType, IdentityString), loaded on first use.
+
+        Bookings that give their customerID never need it.
+        """
+        if self._customer_by_identity is None:
+            self._customer_by_identity = {
+                (row[1], row[2]): row[0]
+                for row in self.conn.execute("SELECT CustomerID, IdentityType, IdentityString FROM Customers")
+            }
+        return self._customer_by_identity
+
+    def sync(self, conn: sqlite3.Connection) -> None:
+        self.customers.sync(conn, "Customers", "CustomerID")
+        self.payments.sync(conn, "Pricing", "PaymentID")
+        self.rooms.sync(conn, "Rooms", "RoomID")
+        self.bookings.sync(conn, "Bookings", "BookingsID")
+
+    def forget(self, inserts: "_Inserts") -> None:
+        """Release the ids of rows that were not inserted."""
+        allocators = {"Customers": self.customers, "Pricing": self.payments,
+                      "Rooms": self.rooms, "Bookings": self.bookings}
+        for table, values in inserts:
+            allocators[table].ids.discard(values[0])
+            if table == "Customers":
+                self.customer_by_identity.pop((values[4], values[5]), None)
+
+# Each converter turns a source row into the (table, values) pairs to insert,
+# in insert order. The first value is always the primary key.
+
+def _customer(row: Dict[str, Any], ctx: _ImportContext) -> _Inserts:
+    identity = (_choice(row, "identitytype", ("Adhar", "PAN", "DL")), _text(row, "identitystring"))
+    if identity in ctx.customer_by_identity:
+        raise RowRejected(f"customer with {identity[0]} {identity[1]} already exists "
+                          f"(CustomerID {ctx.customer_by_identity[identity]})")
+    values = (_text(row, "firstname"), _text(row, "lastname"), _date(row, "dob"), *identity)
+    requested = _int(row, "customerid") if _optional(row, "customerid") is not None else None
+    customer_id = ctx.customers.claim(requested)
+    ctx.customer_by_identity[identity] = customer_id
+    return (("Customers", (customer_id, *values)),)
+
+def _payment_values(row: Dict[str, Any]) -> tuple:
+    discount = _float(row, "discount", 0.0)
+    if not 0 <= discount <= 100:
+        raise RowRejected(f"discount must be between 0 and 100: {discount}")
+    return (_text(row, "paymenttype"), _bool(row, "isdone", False), _float(row, "price"), discount)
+
+def _payment(row: Dict[str, Any], ctx: _ImportContext) -> _Inserts:
+    values = _payment_values(row)
+    requested = _int(row, "paymentid") if _optional(row, "paymentid") is not None else None
+    return (("Pricing", (ctx.payments.claim(requested), *values)),)
+
+def _room(row: Dict[str, Any], ctx: _ImportContext) -> _Inserts:
+    values = (_bool(row, "isvacant", True), None, _choice(row, "type", ("2BHK", "3BHK")), _float(row, "price"))
+    return (("Rooms", (ctx.rooms.claim(_int(row, "roomid")), *values)),)
+
+def _booking(row: Dict[str, Any], ctx: _ImportContext) -> _Inserts:
+    # The customer is given by id or by identity document
+    if _optional(row, "customerid") is not None:
+        customer_id = _int(row, "customerid")
+        if customer_id not in ctx.customers.ids:
+            raise RowRejected(f"customer {customer_id} does not exist")
+    elif _optional(row, "identitytype") is None:
+        raise RowRejected("missing customerid (or identitytype and identitystring)")
+    else:
+        identity = (_text(row, "identitytype"), _text(row, "identitystring"))
+        customer_id = ctx.customer_by_identity.get(identity)
+        if customer_id is None:
+            raise RowRejected(f"no customer with {identity[0]} {identity[1]}")
+
+    room_id = None
+    if _optional(row, "roomid") is not None:
+        room_id = _int(row, "roomid")
+        if room_id not in ctx.rooms.ids:
+            raise RowRejected(f"room {room_id} does not exist")
+
+    arrival, departure = _date(row, "arrivaldate"), _date(row, "departureday")
+    if departure < arrival:
+        raise RowRejected("departureday is before arrivaldate")
+    booked = _date(row, "bookeddate") if _optional(row, "bookeddate") is not None else ctx.today
+
+    # The payment is given by id or inline as PaymentType/price/discount/isDone
+    payment: _Inserts = ()
+    if _optional(row, "paymentid") is not None:
+        payment_id = _int(row, "paymentid")
+        if payment_id not in ctx.payments.ids:
+            raise RowRejected(f"payment {payment_id} does not exist")
+    else:
+        payment_values = _payment_values(row)
+        payment_id = ctx.payments.claim()
+        payment = (("Pricing", (payment_id, *payment_values)),)
+
+    requested = _int(row, "bookingsid") if _optional(row, "bookingsid") is not None else None
+    booking = (ctx.bookings.claim(requested), customer_id, booked, arrival, departure, payment_id, room_id)
+    return (*payment, ("Bookings", booking))
+
+IMPORT_TABLES: Dict[str, Callable[[Dict[str, Any], _ImportContext], _Inserts]] = {
+    "customers": _customer,
+    "payments": _payment,
+    "rooms": _room,
+    "bookings": _booking,
+}
+
+# Fast converters for the common, well-formed row. They inline the field
+# parsing above and return None (or raise) for anything unusual before
+# claiming ids, so the row then goes through the converter above, which
+# decides whether it is accepted and with which reject reason.
+
+_IDENTITY_TYPES = ("Adhar", "PAN", "DL")
+_BOOLEANS = {"1": 1, "true": 1, "yes": 1, "y": 1, "0": 0, "false": 0, "no": 0, "n": 0}
+
+def _as_int(value: Any) -> int:
+    return value if value.__class__ is int else int(value.strip())
+
+def _as_float(value: Any) -> float:
+    return float(value) if value.__class__ is int or value.__class__ is float else float(value.strip())
+
+def _fast_payment_values(row: Dict[str, Any]) -> Optional[tuple]:
+    get = row.get
+    discount = get("discount")
+    discount = 0.0 if discount is None or discount == "" else _as_float(discount)
+    if not 0 <= discount <= 100:
+        return None
+    is_done = get("isdone")
+    is_done = 0 if is_done is None or is_done == "" else _BOOLEANS.get(str(is_done).strip().lower())
+    payment_type = get("paymenttype").strip()
+    if is_done is None or not payment_type:
+        return None
+    return (payment_type, is_done, _as_float(get("price")), discount)
+
+def _fast_customer(row: Dict[str, Any], ctx: _ImportContext) -> Optional[_Inserts]:
+    get = row.get
+    requested = get("customerid")
+    if requested is not None and requested != "":
+        return None
+    identity = (get("identitytype").strip(), get("identitystring").strip())
+    first, last = get("firstname").strip(), get("lastname").strip()
+    dob = _parse_date(get("dob").strip())
+    if (identity[0] not in _IDENTITY_TYPES or not identity[1] or not first or not last or dob is None
+            or identity in ctx.customer_by_identity):
+        return None
+    customer_id = ctx.customers.claim()
+    ctx.customer_by_identity[identity] = customer_id
+    return (("Customers", (customer_id, first, last, dob, *identity)),)
+
+def _fast_payment(row: Dict[str, Any], ctx: _ImportContext) -> Optional[_Inserts]:
+    requested = row.get("paymentid")
+    values = _fast_payment_values(row) if requested is None or requested == "" else None
+    if values is None:
+        return None
+    return (("Pricing", (ctx.payments.claim(), *values)),)
+
+def _fast_booking(row: Dict[str, Any], ctx: _ImportContext) -> Optional[_Inserts]:
+    get = row.get
+    payment_id, requested = get("paymentid"), get("bookingsid")
+    if payment_id is not None and payment_id != "" or requested is not None and requested != "":
+        return None
+    customer_id = _as_int(get("customerid"))
+    room_id = get("roomid")
+    room_id = None if room_id is None or room_id == "" else _as_int(room_id)
+    arrival, departure = _parse_date(get("arrivaldate").strip()), _parse_date(get("departureday").strip())
+    booked = get("bookeddate")
+    booked = ctx.today if booked is None or booked == "" else _parse_date(booked.strip())
+    if (customer_id not in ctx.customers.ids or room_id is not None and room_id not in ctx.rooms.ids
+            or arrival is None or departure is None or booked is None or departure < arrival):
+        return None
+    payment_values = _fast_payment_values(row)
+    if payment_values is None:
+        return None
+    payment_id = ctx.payments.claim()
+    booking = (ctx.bookings.claim(), customer_id, booked, arrival, departure, payment_id, room_id)
+    return (("Pricing", (payment_id, *payment_values)), ("Bookings", booking))
+
+_FAST_IMPORT_TABLES: Dict[str, Callable[[Dict[str, Any], _ImportContext], Optional[_Inserts]]] = {
+    "customers": _fast_customer,
+    "payments": _fast_payment,
+    "bookings": _fast_booking,
+}
+
+_INSERT_SQL = {
+    "Customers": "INSERT INTO Customers (CustomerID, FirstName, LastName, DOB, IdentityType, IdentityString) "
+                 "VALUES (?, ?, ?, ?, ?, ?)",
+    "Pricing": "INSERT INTO Pricing (PaymentID, PaymentType, isDone, price, discount) VALUES (?, ?, ?, ?, ?)",
+    "Rooms": "INSERT INTO Rooms (RoomID, isVacant, currentStay, type, price) VALUES (?, ?, ?, ?, ?)",
+    "Bookings": "INSERT INTO Bookings (BookingsID, customerID, bookedDate, arrivalDate, departureDay, paymentID, RoomID) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+}
+
+def read_rows(stream: TextIO, fmt: str) -> Iterator[Tuple[int, Any]]:
+    """Yield (line number, row) from CSV or NDJSON text.
+
+    Rows are dicts with lower-cased keys; unparseable NDJSON lines are yielded as RowRejected.
+    """
+    if fmt == "csv":
+        reader = csv.reader(stream)
+        header = [name.strip().lower() for name in next(reader, [])]
+        for values in reader:
+            if values:
+                yield reader.line_num, dict(zip(header, values))
+        return
+    lowered: Dict[Tuple[str, ...], Optional[List[str]]] = {}
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            # orjson refuses some lines json accepts (NaN, huge integers), so
+            # those are decoded again by json, which also words the error
+            row = orjson.loads(line) if orjson is not None else json.loads(line)
+        except ValueError:
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_number, RowRejected(f"invalid JSON: {e}")
+                continue
+        if not isinstance(row, dict):
+            yield line_number, RowRejected("line is not a JSON object")
+            continue
+        # Lines usually share one key order, so lower-case each distinct key tuple
+        # once; None marks keys that are already lower-case
+        keys = tuple(row)
+        if keys not in lowered:
+            names = [str(key).lower() for key in keys]
+            lowered[keys] = None if names == list(keys) else names
+        names = lowered[keys]
+        yield line_number, row if names is None else dict(zip(names, row.values()))
+
+def _insert_rows(conn: sqlite3.Connection, inserts: Dict[str, List[tuple]]) -> None:
+    for table in _INSERT_ORDER:
+        if inserts[table]:
+            conn.executemany(_INSERT_SQL[table], inserts[table])
+
+def import_stream(table: str, stream: TextIO, fmt: str = "csv", chunk_size: int = IMPORT_CHUNK_SIZE,
+                  on_reject: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """Bulk insert rows from a CSV or NDJSON stream.
+
+    Rows are validated a chunk at a time against in-memory key maps and each chunk
+    is inserted with executemany in its own transaction. Invalid rows are rejected
+    and reported; they never abort the import.
+
+    Args:
+        table: One of IMPORT_TABLES (customers, payments, rooms, bookings)
+        stream: Text stream with a CSV header or one JSON object per line
+        fmt: "csv" or "ndjson"
+        chunk_size: Rows per transaction
+        on_reject: Called with every reject ({"line", "reason", "row"})
+
+    Returns:
+        {"table", "read", "inserted", "rejected", "rejects", "seconds", "rows_per_second"}.
+        "rejects" holds the first IMPORT_MAX_REPORTED_REJECTS rejects.
+
+    Bookings reference their customer by customerID or by IdentityType and
+    IdentityString, and their payment by paymentID or inline payment columns
+    (PaymentType, price, discount, isDone), which create the payment row.
+    """
+    if table not in IMPORT_TABLES:
+        raise ValueError(f"Unknown import table {table!r}; expected one of {', '.join(IMPORT_TABLES)}")
+    if fmt not in IMPORT_FORMATS:
+        raise ValueError(f"Unknown import format {fmt!r}; expected one of {', '.join(IMPORT_FORMATS)}")
+    convert = IMPORT_TABLES[table]
+    convert_fast = _FAST_IMPORT_TABLES.get(table)
+    summary: Dict[str, Any] = {"table": table, "read": 0, "inserted": 0, "rejected": 0, "rejects": []}
+
+    def reject(line: int, reason: str, row: Any) -> None:
+        entry = {"line": line, "reason": reason, "row": row}
+        summary["rejected"] += 1
+        if len(summary["rejects"]) < IMPORT_MAX_REPORTED_REJECTS:
+            summary["rejects"].append(entry)
+        if on_reject:
+            on_reject(entry)
+
+    started = time.perf_counter()
+    install_change_log(tools.current_db_path())
+    conn = tools.get_db_connection()
+    # Transactions are managed explicitly, one per chunk
+    conn.isolation_level = None
+    # The rows are plain tuples and dicts without cycles; collecting them
+    # over and over while chunks are built only costs time
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        ctx = _ImportContext(conn)
+        rows = read_rows(stream, fmt)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            summary["read"] += len(chunk)
+            # Validate before taking the write lock so other writers aren't held up
+            ctx.sync(conn)
+            inserts: Dict[str, List[tuple]] = {target: [] for target in _INSERT_ORDER}
+            accepted: List[Tuple[int, Any, _Inserts]] = []
+            for line, row in chunk:
+                if isinstance(row, RowRejected):
+                    reject(line, str(row), None)
+                    continue
+                row_inserts = None
+                if convert_fast is not None:
+                    try:
+                        row_inserts = convert_fast(row, ctx)
+                    except (AttributeError, TypeError, ValueError, OverflowError):
+                        pass
+                if row_inserts is None:
+                    try:
+                        row_inserts = convert(row, ctx)
+                    except RowRejected as e:
+                        reject(line, str(e), row)
+                        continue
+                accepted.append((line, row, row_inserts))
+                for target, values in row_inserts:
+                    inserts[target].append(values)
+            conn.execute("BEGIN IMMEDIATE")
+            # Change log entries are written per chunk instead of by the row triggers
+            with change_log_suspended(conn):
+                try:
+                    conn.execute("SAVEPOINT import_chunk")
+                    _insert_rows(conn, inserts)
+                    conn.execute("RELEASE import_chunk")
+                    summary["inserted"] += len(accepted)
+                except sqlite3.IntegrityError:
+                    # Something slipped past validation (e.g. another writer took an id);
+                    # redo the chunk row by row so only the offending rows are rejected
+                    conn.execute("ROLLBACK TO import_chunk")
+                    conn.execute("RELEASE import_chunk")
+                    inserts = {target: [] for target in _INSERT_ORDER}
+                    for line, row, row_inserts in accepted:
+                        conn.execute("SAVEPOINT import_row")
+                        try:
+                            for target, values in row_inserts:
+                                conn.execute(_INSERT_SQL[target], values)
+                        except sqlite3.IntegrityError as e:
+                            conn.execute("ROLLBACK TO import_row")
+                            ctx.forget(row_inserts)
+                            reject(line, f"database rejected row: {e}", row)
+                        else:
+                            summary["inserted"] += 1
+                            for target, values in row_inserts:
+                                inserts[target].append(values)
+                        conn.execute("RELEASE import_row")
+                for target in _INSERT_ORDER:
+                    if inserts[target]:
+                        log_changes(conn, target, (values[0] for values in inserts[target]))
+            conn.execute("COMMIT")
+            tools.bump_write_generation()
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+        conn.close()
+
+    elapsed = time.perf_counter() - started
+    summary["seconds"] = round(elapsed, 3)
+    summary["rows_per_second"] = round(summary["read"] / elapsed) if elapsed > 0 else None
+    if summary["inserted"]:
+        # Too many rows for per-row change events; clients refetch instead
+        publish_event("resync", {"reason": "import", "table": table, "inserted": summary["inserted"]})
+    return summary
+
+def import_file(table: str, path: str, fmt: Optional[str] = None, **kwargs: Any) -> Dict[str, Any]:
+    """Bulk import a CSV or NDJSON file; the format defaults to the file extension."""
+    if fmt is None:
+        fmt = "csv" if path.lower().endswith(".csv") else "ndjson"
+    with open(path, newline="", encoding="utf-8") as stream:
+        return import_stream(table, stream, fmt, **kwargs)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import customers, payments, rooms or bookings")
+    parser.add_argument("table", choices=sorted(IMPORT_TABLES))
+    parser.add_argument("file", help="CSV or NDJSON (.ndjson/.jsonl) file")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, help="Default: from the file extension")
+    parser.add_argument("--db", default=tools.DB_PATH)
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    parser.add_argument("--rejects", help="Write every rejected row to this NDJSON file")
+    args = parser.parse_args()
+
+    tools.DB_PATH = args.db
+    reject_file = open(args.rejects, "w", encoding="utf-8") if args.rejects else None
+    try:
+        write_reject = (lambda entry: reject_file.write(json.dumps(entry, default=str) + "\n")) if reject_file else None
+        result = import_file(args.table, args.file, args.format, chunk_size=args.chunk_size, on_reject=write_reject)
+    finally:
+        if reject_file:
+            reject_file.close()
+    result.pop("rejects")
+    print(json.dumps(result))
+    sys.exit(0 if result["inserted"] or not result["read"] else 1)
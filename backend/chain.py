@@ -0,0 +1,90 @@
+# chain.py
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+import tools
+from properties import PROPERTIES, use_property
+
+# Shards queried at the same time by a chain-wide report
+CHAIN_WORKERS = int(os.getenv("CHAIN_WORKERS", "4"))
+
+# Row of a chain-wide report that sums up every property
+ALL_PROPERTIES = "all"
+
+def for_each_property(fn: Callable[..., Any], *args: Any) -> Dict[str, Any]:
+    """Call fn(*args) once per property, in parallel, each scoped to its own database.
+
+    Returns:
+        {property: result}; a property whose call raised maps to [{"error": ...}]
+    """
+    if not PROPERTIES:
+        raise ValueError("No properties configured; set HOTEL_PROPERTIES to name=path,...")
+
+    def run(name: str) -> Any:
+        try:
+            with use_property(name):
+                return fn(*args)
+        except (ValueError, RuntimeError, OSError) as e:
+            return [{"error": f"{name}: {str(e)}"}]
+
+    with ThreadPoolExecutor(max_workers=min(CHAIN_WORKERS, len(PROPERTIES)),
+                            thread_name_prefix="chain-shard") as executor:
+        return dict(zip(PROPERTIES, executor.map(run, PROPERTIES)))
+
+def _merge(per_property: Dict[str, List[Dict[str, Any]]], key: str,
+           combine: Callable[[List[Dict[str, Any]]], Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Tag each property's rows with its name, then append one combined row per key."""
+    rows: List[Dict[str, Any]] = []
+    groups: Dict[Any, List[Dict[str, Any]]] = {}
+    for name, result in per_property.items():
+        for row in result:
+            rows.append({"property": name, **row})
+            if "error" not in row:
+                groups.setdefault(row.get(key), []).append(row)
+    for value, group in groups.items():
+        rows.append({"property": ALL_PROPERTIES, key: value, **combine(group)})
+    return rows
+
+def _combine_occupancy(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    total = sum(row["total_rooms"] for row in rows)
+    occupied = sum(row["occupied_rooms"] or 0 for row in rows)
+    return {
+        "total_rooms": total,
+        "vacant_rooms": sum(row["vacant_rooms"] or 0 for row in rows),
+        "occupied_rooms": occupied,
+        "occupancy_rate": round(occupied * 100.0 / total, 2) if total else None,
+    }
+
+def _combine_revenue(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    bookings = sum(row["booking_count"] for row in rows)
+    revenue = sum(row["total_revenue"] or 0 for row in rows)
+    return {
+        "booking_count": bookings,
+        "total_revenue": revenue,
+        "avg_revenue_per_booking": revenue / bookings if bookings else None,
+    }
+
+def chain_occupancy() -> List[Dict[str, Any]]:
+    """Room occupancy by room type for every property and across the chain.
+
+    Returns:
+        get_room_occupancy_stats rows with a "property" column, followed by one
+        row per room type with property "all" that combines every hotel
+    """
+    return _merge(for_each_property(tools.get_room_occupancy_stats.run, {}), "type", _combine_occupancy)
+
+def chain_revenue(start_date: str = "", end_date: str = "") -> List[Dict[str, Any]]:
+    """Revenue by room type for every property and across the chain.
+
+    Args:
+        start_date: Start date in format 'YYYY-MM-DD' (default: all time)
+        end_date: End date in format 'YYYY-MM-DD' (default: current date)
+
+    Returns:
+        get_revenue_by_room_type rows with a "property" column, followed by one
+        row per room type with property "all" that combines every hotel
+    """
+    args = {"start_date": start_date, "end_date": end_date}
+    return _merge(for_each_property(tools.get_revenue_by_room_type.run, args), "type", _combine_revenue)
@@ -0,0 +1,143 @@
+# dashboard.py
+
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+from properties import current_property
+from tools import acquire_read_connection, get_db_generation, release_read_connection
+
+# Builds everything the dashboard shows as one JSON document in a single
+# statement, so all parts come from the same snapshot of the database.
+# The statistics parts match get_hotel_statistics (totals include archived
+# bookings, through the All* views), current_stays matches
+# get_current_stays and arrivals matches get_upcoming_arrivals.
+DASHBOARD_QUERY = """
+WITH
+net_payments AS (
+    SELECT BookingsID, customerID, arrivalDate, departureDay,
+           isDone, price * (1 - discount/100.0) AS net_price
+    FROM AllBookingPayments
+),
+occupancy AS (
+    SELECT json_object(
+        'total_rooms', COUNT(*),
+        'vacant_rooms', SUM(CASE WHEN isVacant = 1 THEN 1 ELSE 0 END),
+        'occupied_rooms', SUM(CASE WHEN isVacant = 0 THEN 1 ELSE 0 END),
+        'occupancy_rate', ROUND(SUM(CASE WHEN isVacant = 0 THEN 1 ELSE 0 END) * 100.0 / COUNT(*), 2)
+    ) AS doc
+    FROM Rooms
+),
+revenue AS (
+    SELECT json_object(
+        'total_revenue', SUM(net_price),
+        'avg_revenue_per_booking', AVG(net_price),
+        'realized_revenue', SUM(CASE WHEN isDone = 1 THEN net_price ELSE 0 END),
+        'pending_revenue', SUM(CASE WHEN isDone = 0 THEN net_price ELSE 0 END)
+    ) AS doc
+    FROM net_payments
+),
+booking_stats AS (
+    SELECT json_object(
+        'total_bookings', COUNT(*),
+        'unique_customers', COUNT(DISTINCT customerID),
+        'avg_stay_duration', AVG(JULIANDAY(departureDay) - JULIANDAY(arrivalDate)),
+        'upcoming_bookings', COALESCE(SUM(CASE WHEN date(arrivalDate) >= date('now') THEN 1 ELSE 0 END), 0),
+        'active_bookings', (SELECT COUNT(*) FROM Rooms r JOIN Bookings b ON r.currentStay = b.BookingsID
+                            WHERE r.isVacant = 0)
+    ) AS doc
+    FROM AllBookings
+),
+popularity AS (
+    SELECT json_object('type', type, 'booking_count', booking_count, 'booking_percentage', booking_percentage) AS doc
+    FROM (
+        SELECT
+            r.type,
+            COUNT(b.BookingsID) AS booking_count,
+            ROUND(COUNT(b.BookingsID) * 100.0 / (SELECT COUNT(*) FROM AllBookings), 2) AS booking_percentage
+        FROM Rooms r
+        JOIN AllBookings b ON r.RoomID = b.RoomID OR
+                          (r.RoomID IN (SELECT RoomID FROM Rooms WHERE currentStay = b.BookingsID))
+        GROUP BY r.type
+        LIMIT 1
+    )
+),
+current_stays AS (
+    SELECT json_group_array(json_object(
+        'RoomID', r.RoomID, 'isVacant', r.isVacant, 'currentStay', r.currentStay,
+        'type', r.type, 'price', r.price,
+        'BookingsID', b.BookingsID, 'arrivalDate', b.arrivalDate, 'departureDay', b.departureDay,
+        'FirstName', c.FirstName, 'LastName', c.LastName
+    )) AS doc
+    FROM Rooms r
+    JOIN Bookings b ON r.currentStay = b.BookingsID
+    JOIN Customers c ON b.customerID = c.CustomerID
+    WHERE r.isVacant = 0
+),
+arrivals AS (
+    SELECT json_group_array(json_object(
+        'BookingsID', BookingsID, 'arrivalDate', arrivalDate, 'departureDay', departureDay,
+        'FirstName', FirstName, 'LastName', LastName, 'RoomID', RoomID, 'type', type
+    )) AS doc
+    FROM (
+        SELECT b.BookingsID, b.arrivalDate, b.departureDay,
+               c.FirstName, c.LastName, r.RoomID, r.type
+        FROM Bookings b
+        JOIN Customers c ON b.customerID = c.CustomerID
+        LEFT JOIN Rooms r ON r.RoomID = b.RoomID
+        WHERE date(b.arrivalDate) BETWEEN date('now') AND date('now', '+' || ? || ' days')
+        ORDER BY b.arrivalDate
+    )
+)
+SELECT json_object(
+    'statistics', json_object(
+        'occupancy', json(occupancy.doc),
+        'revenue', json(revenue.doc),
+        'bookings', json(booking_stats.doc),
+        'popularity', json((SELECT doc FROM popularity))
+    ),
+    'current_stays', json(current_stays.doc),
+    'arrivals', json(arrivals.doc)
+)
+FROM occupancy, revenue, booking_stats, current_stays, arrivals
+"""
+
+def _check_days(days: int) -> None:
+    # Same bounds as get_upcoming_arrivals; a negative count would match no arrivals
+    if not isinstance(days, int) or days < 0 or days > 365:
+        raise ValueError("Days must be a positive integer less than 366")
+
+def dashboard_etag(days: int = 7) -> str:
+    """ETag for the dashboard: changes on any database commit and when the date rolls over."""
+    _check_days(days)
+    # Each property's database has its own data_version, so the name keeps their tags apart
+    name = current_property.get()
+    scope = f"{name}." if name else ""
+    # The snapshot's date('now') is UTC, so the tag rolls over with the UTC date, not local time
+    today = datetime.now(timezone.utc).date().isoformat()
+    return f'W/"{scope}{get_db_generation()}.{today}.{days}"'
+
+def get_dashboard_snapshot(days: int = 7) -> str:
+    """Return the dashboard snapshot as a JSON document.
+
+    Args:
+        days: Number of days of upcoming arrivals to include
+
+    Returns:
+        JSON text with statistics, current_stays and arrivals
+
+    Raises:
+        ValueError: If days is outside 0..365
+    """
+    _check_days(days)
+    conn = acquire_read_connection()
+    try:
+        return conn.execute(DASHBOARD_QUERY, (days,)).fetchone()[0]
+    finally:
+        release_read_connection(conn)
+
+def get_dashboard(days: int = 7, if_none_match: Optional[str] = None) -> Tuple[str, Optional[str]]:
+    """Return (etag, snapshot JSON), with no JSON if the client's copy is still current."""
+    etag = dashboard_etag(days)
+    if if_none_match and etag in (tag.strip() for tag in if_none_match.split(",")):
+        return etag, None
+    return etag, get_dashboard_snapshot(days)
@@ -0,0 +1,194 @@
+# events.py
+
+import asyncio
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from properties import resolved_property
+
+EVENT_BUFFER_SIZE = int(os.getenv("EVENT_BUFFER_SIZE", "256"))
+EVENT_HISTORY_SIZE = int(os.getenv("EVENT_HISTORY_SIZE", "1024"))
+
+class Subscriber:
+    """One connected client with a bounded buffer of pending events.
+
+    Events are pushed from any thread but buffered on the subscriber's event
+    loop. If the client falls behind and the buffer fills up, the buffer is
+    replaced by a single "resync" event telling the client to refetch.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_buffer: int = EVENT_BUFFER_SIZE,
+                 property: Optional[str] = None):
+        self.loop = loop
+        self.max_buffer = max_buffer
+        # Only events of this property, and global ones such as resync (property None), are delivered
+        self.property = property
+        self.buffer: Deque[Dict[str, Any]] = deque()
+        self.ready = asyncio.Event()
+        self.overflowed = False
+
+    def _push(self, event: Dict[str, Any]) -> None:
+        if self.overflowed:
+            return
+        if event.get("property") not in (None, self.property):
+            return
+        if len(self.buffer) >= self.max_buffer:
+            self.overflowed = True
+            self.buffer.clear()
+            self.buffer.append({"id": event["id"], "type": "resync", "data": {}})
+        else:
+            self.buffer.append(event)
+        self.ready.set()
+
+    def push(self, event: Dict[str, Any]) -> None:
+        """Queue an event for this subscriber; safe to call from any thread."""
+        self.loop.call_soon_threadsafe(self._push, event)
+
+    async def next_batch(self, timeout: float) -> List[Dict[str, Any]]:
+        """Wait up to timeout seconds and return every buffered event (possibly none)."""
+        if not self.buffer:
+            self.ready.clear()
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        batch = list(self.buffer)
+        self.buffer.clear()
+        self.overflowed = False
+        return batch
+
+class EventBus:
+    """Fans out row-level change events from the write tools to connected clients."""
+
+    def __init__(self, history_size: int = EVENT_HISTORY_SIZE):
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._subscribers: List[Subscriber] = []
+        self._listeners: List[Callable[[List[Dict[str, Any]]], None]] = []
+        self._history: Deque[Dict[str, Any]] = deque(maxlen=history_size)
+
+    def publish(self, event_type: str, data: Dict[str, Any], property: Optional[str] = None) -> None:
+        """Record an event and hand it to every subscriber.
+
+        Args:
+            event_type: Event name
+            data: Event payload
+            property: Property whose database changed; None for events about every property
+        """
+        self.publish_many([(event_type, data, property)])
+
+    def publish_many(self, events: List[Tuple[str, Dict[str, Any], Optional[str]]]) -> None:
+        """Publish (event_type, data, property) events together, e.g. those of one transaction."""
+        with self._lock:
+            published = []
+            for event_type, data, property in events:
+                event = {"id": next(self._ids), "type": event_type, "ts": time.time(), "data": data,
+                         "property": property}
+                self._history.append(event)
+                published.append(event)
+            subscribers = list(self._subscribers)
+            listeners = list(self._listeners)
+        # Listeners go first, so state they keep is current once a client hears of the change
+        for listener in listeners:
+            try:
+                listener(published)
+            except Exception as e:
+                print(f"Event listener failed: {e}")
+        for subscriber in subscribers:
+            try:
+                for event in published:
+                    subscriber.push(event)
+            except RuntimeError:
+                # The subscriber's event loop has shut down
+                self.unsubscribe(subscriber)
+
+    def add_listener(self, listener: Callable[[List[Dict[str, Any]]], None]) -> None:
+        """Call listener(events) in the publishing thread with every batch of events.
+
+        A transaction's events arrive in one call, after it committed.
+        """
+        with self._lock:
+            self._listeners.append(listener)
+
+    def subscribe(self, last_event_id: Optional[int] = None, property: Optional[str] = None) -> Subscriber:
+        """Register a client on the running event loop.
+
+        Args:
+            last_event_id: Replay buffered events after this id (from SSE Last-Event-ID)
+            property: Only deliver events of this property; None means the default
+                property (the first one), whose database unscoped requests use
+        """
+        if property is None:
+            property = resolved_property()
+        subscriber = Subscriber(asyncio.get_running_loop(), property=property)
+        with self._lock:
+            if last_event_id is not None:
+                latest = self._history[-1]["id"] if self._history else 0
+                oldest = self._history[0]["id"] if self._history else latest + 1
+                if last_event_id > latest or last_event_id < oldest - 1:
+                    # Events were dropped from the history or the server restarted
+                    subscriber._push({"id": latest, "type": "resync", "data": {}})
+                else:
+                    for event in self._history:
+                        if event["id"] > last_event_id:
+                            subscriber._push(event)
+            self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+event_bus = EventBus()
+
+# Events published while a transaction is open, waiting for it to commit
+_held_events: contextvars.ContextVar[Optional[List[Tuple[str, Dict[str, Any], Optional[str]]]]] = \
+    contextvars.ContextVar("held_events", default=None)
+
+def publish_event(event_type: str, data: Dict[str, Any]) -> None:
+    """Publish a change event such as "booking.created" or "room.vacated".
+
+    The event carries the property whose database the write went to, which
+    for an unscoped write is the default property.
+    """
+    held = _held_events.get()
+    if held is not None:
+        held.append((event_type, data, resolved_property()))
+        return
+    event_bus.publish(event_type, data, resolved_property())
+
+@contextmanager
+def hold_events() -> Iterator[None]:
+    """Delay events published inside the block until it exits without an exception.
+
+    Used around a transaction so clients never see changes that get rolled back.
+    Events are dropped if the block raises.
+    """
+    held: List[Tuple[str, Dict[str, Any], Optional[str]]] = []
+    token = _held_events.set(held)
+    try:
+        yield
+    finally:
+        _held_events.reset(token)
+    if held:
+        event_bus.publish_many(held)
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """Encode an event in Server-Sent Events wire format."""
+    message = {"type": event["type"], "data": event["data"]}
+    if event.get("property") is not None:
+        message["property"] = event["property"]
+    payload = json.dumps(message, default=str)
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {payload}\n\n"
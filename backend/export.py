@@ -0,0 +1,268 @@
+# export.py
+
+import argparse
+import csv
+import io
+import json
+import os
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import tools
+from sync import change_log_versions, install_change_log
+
+# Rows per Parquet row group, and per query: each group is read whole before it is written out
+EXPORT_ROW_GROUP_SIZE = int(os.getenv("EXPORT_ROW_GROUP_SIZE", "10000"))
+
+EXPORT_FORMATS = ("csv", "parquet", "arrow")
+
+# The booking/customer/room/payment join of get_booking_details, one row per booking,
+# archived bookings included
+EXPORT_COLUMNS: List[Tuple[str, str]] = [
+    ("BookingsID", "int"), ("customerID", "int"), ("bookedDate", "str"), ("arrivalDate", "str"),
+    ("departureDay", "str"), ("paymentID", "int"), ("RoomID", "int"),
+    ("FirstName", "str"), ("LastName", "str"), ("IdentityType", "str"), ("IdentityString", "str"),
+    ("room_type", "str"), ("room_price", "float"),
+    ("PaymentType", "str"), ("payment_amount", "float"), ("discount", "float"), ("payment_completed", "int"),
+    ("stay_duration", "float"), ("final_amount", "float"),
+]
+
+EXPORT_QUERY = """
+SELECT
+    b.BookingsID, b.customerID, b.bookedDate, b.arrivalDate, b.departureDay, b.paymentID, b.RoomID,
+    c.FirstName, c.LastName, c.IdentityType, c.IdentityString,
+    r.type as room_type, r.price as room_price,
+    p.PaymentType, p.price as payment_amount, p.discount, p.isDone as payment_completed,
+    JULIANDAY(b.departureDay) - JULIANDAY(b.arrivalDate) as stay_duration,
+    p.price * (1 - p.discount/100.0) as final_amount
+FROM {schema}.Bookings b
+JOIN main.Customers c ON b.customerID = c.CustomerID
+LEFT JOIN main.Rooms r ON r.RoomID = b.RoomID
+JOIN {schema}.Pricing p ON b.paymentID = p.PaymentID
+WHERE b.BookingsID > :after {filters}
+ORDER BY b.BookingsID
+LIMIT :limit
+"""
+
+# Same overlap rule as list_bookings_by_date_range
+_DATE_RANGE_FILTER = """
+    AND ((b.arrivalDate BETWEEN :start AND :end) OR
+         (b.departureDay BETWEEN :start AND :end) OR
+         (b.arrivalDate <= :start AND b.departureDay >= :end))"""
+
+# A booking changed if its own row or any joined row changed
+_CHANGED_FILTER = """
+    AND (b.BookingsID IN (SELECT row_id FROM ChangeLog WHERE tbl = 'Bookings' AND version > :since AND version <= :until)
+         OR b.customerID IN (SELECT row_id FROM ChangeLog WHERE tbl = 'Customers' AND version > :since AND version <= :until)
+         OR b.paymentID IN (SELECT row_id FROM ChangeLog WHERE tbl = 'Pricing' AND version > :since AND version <= :until)
+         OR b.RoomID IN (SELECT row_id FROM ChangeLog WHERE tbl = 'Rooms' AND version > :since AND version <= :until))"""
+
+class _ByteSink(io.RawIOBase):
+    """Write-only file object that buffers output until it is drained."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+class _CsvWriter:
+    def __init__(self, sink: _ByteSink):
+        self._text = io.TextIOWrapper(sink, encoding="utf-8", newline="", write_through=True)
+        self._writer = csv.writer(self._text)
+        self._writer.writerow([name for name, _ in EXPORT_COLUMNS])
+
+    def write_group(self, rows: List[tuple]) -> None:
+        self._writer.writerows(rows)
+
+    def close(self) -> None:
+        self._text.flush()
+        self._text.detach()
+
+class _ArrowWriter:
+    """Parquet (one row group per batch) or Arrow IPC stream output."""
+
+    def __init__(self, sink: _ByteSink, fmt: str):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError(f"{fmt} export requires pyarrow (pip install pyarrow)")
+        self._pa = pa
+        types = {"int": pa.int64(), "float": pa.float64(), "str": pa.string()}
+        self._schema = pa.schema([(name, types[kind]) for name, kind in EXPORT_COLUMNS])
+        if fmt == "parquet":
+            self._writer = pq.ParquetWriter(sink, self._schema, compression="zstd")
+        else:
+            self._writer = pa.ipc.new_stream(sink, self._schema)
+        self._parquet = fmt == "parquet"
+
+    def write_group(self, rows: List[tuple]) -> None:
+        columns = list(zip(*rows))
+        batch = self._pa.RecordBatch.from_arrays(
+            [self._pa.array(column, type=field.type) for column, field in zip(columns, self._schema)],
+            schema=self._schema)
+        if self._parquet:
+            self._writer.write_batch(batch, row_group_size=len(rows))
+        else:
+            self._writer.write_batch(batch)
+
+    def close(self) -> None:
+        self._writer.close()
+
+def _export_mark_key(name: str) -> str:
+    return f"export:{name}"
+
+def _read_export_mark(name: str) -> Optional[int]:
+    rows = tools.run_query("SELECT value FROM ChangeLogMeta WHERE key = ?", (_export_mark_key(name),))
+    return rows[0]["value"] if rows and "value" in rows[0] else None
+
+def _save_export_mark(name: str, version: int) -> None:
+    tools.run_query(
+        "INSERT INTO ChangeLogMeta (key, value) VALUES (?, ?) "
+        "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+        (_export_mark_key(name), version))
+
+def _row_groups(filters: str, params: Dict[str, Any], row_group_size: int) -> Iterator[List[tuple]]:
+    """Yield the export rows in groups: archived bookings, then live ones, each paged by primary key.
+
+    Each half is read on its own rather than through the AllBookings view, so
+    every page is an index range instead of a sort of the whole union.
+    """
+    conn = tools.acquire_read_connection()
+    try:
+        schemas = tools.booking_schemas(conn)
+    finally:
+        tools.release_read_connection(conn)
+    for schema in schemas:
+        query = EXPORT_QUERY.format(schema=schema, filters=filters)
+        after = 0
+        while True:
+            # Fetched whole and the connection returned before yielding: in rollback-journal
+            # mode an open cursor would block every writer while a slow client downloads
+            conn = tools.acquire_read_connection()
+            try:
+                rows = conn.execute(query, {**params, "after": after, "limit": row_group_size}).fetchall()
+            finally:
+                tools.release_read_connection(conn)
+            if rows:
+                after = rows[-1][0]
+                yield rows
+            if len(rows) < row_group_size:
+                break
+
+def export_bookings(fmt: str = "csv", start_date: Optional[str] = None, end_date: Optional[str] = None,
+                    since_last: Optional[str] = None, row_group_size: int = EXPORT_ROW_GROUP_SIZE,
+                    summary: Optional[Dict[str, Any]] = None) -> Iterator[bytes]:
+    """Stream the booking/customer/room/payment join as CSV, Parquet or Arrow IPC bytes.
+
+    Memory stays bounded by one row group regardless of the number of bookings.
+
+    Args:
+        fmt: "csv", "parquet" or "arrow" (Arrow IPC stream)
+        start_date: Only bookings overlapping start_date..end_date (both required)
+        end_date: End of the date range, 'YYYY-MM-DD'
+        since_last: Name of an incremental export. Only bookings whose booking,
+            customer, room or payment row changed since the previous completed
+            export with this name are included; the first run exports everything.
+        row_group_size: Rows per query and per Parquet row group
+        summary: Filled in with rows, full, version and deleted booking ids
+            once the stream is exhausted
+
+    Returns:
+        Iterator of output chunks, one per row group
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}; expected one of {', '.join(EXPORT_FORMATS)}")
+    if (start_date is None) != (end_date is None):
+        raise ValueError("start_date and end_date must be given together")
+
+    filters, params = "", {}
+    if start_date is not None:
+        filters += _DATE_RANGE_FILTER
+        params.update(start=start_date, end=end_date)
+
+    full, version, deleted = True, None, []
+    if since_last is not None:
+        install_change_log(tools.current_db_path())
+        conn = tools.acquire_read_connection()
+        try:
+            version, horizon = change_log_versions(conn)
+            since = _read_export_mark(since_last)
+            if since is not None and horizon <= since <= version:
+                full = False
+                filters += _CHANGED_FILTER
+                params.update(since=since, until=version)
+                deleted = [row[0] for row in conn.execute(
+                    "SELECT row_id FROM ChangeLog WHERE tbl = 'Bookings' AND op = 'D' AND version > ? AND version <= ?",
+                    (since, version))]
+        finally:
+            tools.release_read_connection(conn)
+
+    # Arguments and the writer are checked eagerly; rows are produced lazily below
+    sink = _ByteSink()
+    writer = _CsvWriter(sink) if fmt == "csv" else _ArrowWriter(sink, fmt)
+    return _stream_export(sink, writer, filters, params, row_group_size, since_last, full, version, deleted, summary)
+
+def _stream_export(sink: _ByteSink, writer: Any, filters: str, params: Dict[str, Any], row_group_size: int,
+                   since_last: Optional[str], full: bool, version: Optional[int],
+                   deleted: List[int], summary: Optional[Dict[str, Any]]) -> Iterator[bytes]:
+    rows = 0
+    for group in _row_groups(filters, params, row_group_size):
+        writer.write_group(group)
+        rows += len(group)
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+    # Only a completed export moves the incremental mark forward
+    if since_last is not None:
+        _save_export_mark(since_last, version)
+    if summary is not None:
+        summary.update(rows=rows, full=full, version=version, deleted=deleted)
+
+def export_to_file(path: str, fmt: Optional[str] = None, **kwargs: Any) -> Dict[str, Any]:
+    """Export to a file; the format defaults to the file extension."""
+    if fmt is None:
+        extension = os.path.splitext(path)[1].lower().lstrip(".")
+        fmt = {"parquet": "parquet", "arrow": "arrow", "arrows": "arrow"}.get(extension, "csv")
+    summary: Dict[str, Any] = {"path": path, "format": fmt}
+    started = time.perf_counter()
+    chunks = export_bookings(fmt, summary=summary, **kwargs)
+    with open(path, "wb") as output:
+        for chunk in chunks:
+            output.write(chunk)
+    summary["seconds"] = round(time.perf_counter() - started, 3)
+    return summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export bookings with customer, room and payment details")
+    parser.add_argument("output", help="Output file (.csv, .parquet or .arrow)")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, help="Default: from the file extension")
+    parser.add_argument("--db", default=tools.DB_PATH)
+    parser.add_argument("--start-date")
+    parser.add_argument("--end-date")
+    parser.add_argument("--since-last", metavar="NAME",
+                        help="Incremental export: only bookings changed since the last export with this name")
+    parser.add_argument("--row-group-size", type=int, default=EXPORT_ROW_GROUP_SIZE)
+    args = parser.parse_args()
+
+    tools.DB_PATH = args.db
+    result = export_to_file(args.output, args.format, start_date=args.start_date, end_date=args.end_date,
+                            since_last=args.since_last, row_group_size=args.row_group_size)
+    print(json.dumps(result))
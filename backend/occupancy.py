@@ -0,0 +1,397 @@
+# occupancy.py
+
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional
+
+import tools
+from events import event_bus
+from properties import PROPERTIES, use_property
+
+# "0" reads vacancy and occupancy from the Rooms table on every request instead
+OCCUPANCY_ENGINE = os.getenv("OCCUPANCY_ENGINE", "1") == "1"
+# How often the in-memory state is compared with the Rooms table and corrected
+OCCUPANCY_VERIFY_SECONDS = float(os.getenv("OCCUPANCY_VERIFY_SECONDS", "60"))
+
+# Arrays are indexed by RoomID, so IDs must be small non-negative integers
+_MAX_ROOM_ID = 1 << 20
+_ROOM_COLUMNS = ("RoomID", "isVacant", "currentStay", "type", "price")
+
+# status[room]: no such room, isVacant = 1, isVacant = 0, or any other value,
+# which the SQL reports count in neither column
+_ABSENT, _VACANT, _OCCUPIED, _OTHER = 0, 1, 2, 3
+# stay[room] of a room whose currentStay is NULL
+_NO_STAY = -(1 << 63)
+
+# Booking and guest of each listed stay, for current_stays
+_STAY_DETAILS_QUERY = """
+SELECT b.BookingsID, b.arrivalDate, b.departureDay, b.customerID, c.FirstName, c.LastName
+FROM Bookings b
+JOIN Customers c ON b.customerID = c.CustomerID
+WHERE b.BookingsID IN (SELECT value FROM json_each(?))
+"""
+
+# Committed rows of the rooms named by change events
+_ROOM_ROWS_QUERY = "SELECT * FROM Rooms WHERE RoomID IN (SELECT value FROM json_each(?))"
+
+_round_conn = sqlite3.connect(":memory:", check_same_thread=False)
+_round_lock = threading.Lock()
+
+@lru_cache(maxsize=4096)
+def _occupancy_rate(occupied: int, total: int) -> Optional[float]:
+    """ROUND(occupied * 100.0 / total, 2) exactly as the SQL reports compute it."""
+    if not total:
+        return None
+    with _round_lock:
+        return _round_conn.execute("SELECT ROUND(? * 100.0 / ?, 2)", (occupied, total)).fetchone()[0]
+
+def _status(is_vacant: Any) -> int:
+    if is_vacant == 1:
+        return _VACANT
+    if is_vacant == 0 and is_vacant is not None:
+        return _OCCUPIED
+    return _OTHER
+
+class RoomState:
+    """Vacancy, current stay, type and price of every room of one database.
+
+    Each attribute is a compact array indexed by RoomID, and rooms per type,
+    vacant and occupied are kept as counters, so occupancy is answered without
+    touching SQLite. Change events say which rooms a commit touched; their rows
+    are re-read and applied a whole transaction under one lock, so readers never
+    see half of a group check-in.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.ready = False
+        self._lock = threading.Lock()
+        self._details_version = 0
+        self._clear()
+        self.stats = {"loads": 0, "rows_applied": 0, "bad_rows": 0, "verifications": 0, "corrections": 0,
+                      "loaded_at": None, "verified_at": None, "error": None}
+
+    def _clear(self) -> None:
+        self.status = bytearray()
+        self.type_code = bytearray()
+        self.stay = array("q")
+        self.price = array("d")
+        # Type code k (1-based) is types[k - 1]; counters are indexed by code
+        self.types: List[str] = []
+        self.total = [0]
+        self.vacant = [0]
+        self.occupied = [0]
+        # Booking and guest of current stays, (arrivalDate, departureDay, customerID,
+        # FirstName, LastName) by BookingsID; filled in as get_current_stays asks for them
+        self.details: Dict[int, tuple] = {}
+        # Changes on every booking or customer event, so details fetched meanwhile aren't kept
+        self._details_version += 1
+
+    def _grow(self, room: int) -> None:
+        if not isinstance(room, int) or not 0 <= room < _MAX_ROOM_ID:
+            raise ValueError(f"RoomID {room!r} can't index the room state (0 to {_MAX_ROOM_ID - 1})")
+        missing = room + 1 - len(self.status)
+        if missing > 0:
+            self.status.extend(bytes(missing))
+            self.type_code.extend(bytes(missing))
+            self.stay.extend([_NO_STAY] * missing)
+            self.price.extend([math.nan] * missing)
+
+    def _code(self, room_type: str) -> int:
+        try:
+            return self.types.index(room_type) + 1
+        except ValueError:
+            if len(self.types) == 255:
+                raise ValueError("More than 255 room types")
+            self.types.append(room_type)
+            for counter in (self.total, self.vacant, self.occupied):
+                counter.append(0)
+            return len(self.types)
+
+    def _count(self, room: int, step: int) -> None:
+        status, code = self.status[room], self.type_code[room]
+        if status == _ABSENT:
+            return
+        self.total[code] += step
+        if status == _VACANT:
+            self.vacant[code] += step
+        elif status == _OCCUPIED:
+            self.occupied[code] += step
+
+    def _set(self, row: Dict[str, Any]) -> None:
+        room = row["RoomID"]
+        self._grow(room)
+        self._count(room, -1)
+        stay = _NO_STAY if row["currentStay"] is None else row["currentStay"]
+        if self.stay[room] != stay:
+            # The details of the stay that ended aren't needed any more
+            self.details.pop(self.stay[room], None)
+        self.status[room] = _status(row["isVacant"])
+        self.type_code[room] = self._code(row["type"])
+        self.stay[room] = stay
+        self.price[room] = math.nan if row["price"] is None else row["price"]
+        self._count(room, 1)
+
+    def _rows(self, rooms: List[int]) -> List[Dict[str, Any]]:
+        """The rooms as SELECT * FROM Rooms returns them."""
+        status, type_code, stay, price, types = self.status, self.type_code, self.stay, self.price, self.types
+        return [{
+            "RoomID": room,
+            "isVacant": 1 if status[room] == _VACANT else 0,
+            "currentStay": None if stay[room] == _NO_STAY else stay[room],
+            "type": types[type_code[room] - 1],
+            # NaN, the stand-in for NULL, is the only price unequal to itself
+            "price": price[room] if price[room] == price[room] else None,
+        } for room in rooms]
+
+    def _snapshot(self) -> List[tuple]:
+        return [(room, self.status[room], self.types[self.type_code[room] - 1], self.stay[room],
+                 self.price[room] if not math.isnan(self.price[room]) else None)
+                for room in range(len(self.status)) if self.status[room] != _ABSENT]
+
+    def load(self) -> int:
+        """Replace the state with the Rooms table of the current database.
+
+        Returns:
+            Number of rooms whose state differed from the table (0 on first load)
+        """
+        conn = tools.acquire_read_connection()
+        try:
+            # Held across the read, so a commit's rows can't be applied and then
+            # overwritten by an older read of the table
+            with self._lock:
+                before = set(self._snapshot()) if self.ready else None
+                try:
+                    cursor = conn.execute("SELECT * FROM Rooms ORDER BY RoomID")
+                    columns = tuple(description[0] for description in cursor.description)
+                    if columns != _ROOM_COLUMNS:
+                        raise ValueError(f"Rooms has columns {', '.join(columns)}; "
+                                         f"expected {', '.join(_ROOM_COLUMNS)}")
+                    rows = cursor.fetchall()
+                    self._clear()
+                    for row in rows:
+                        self._set(dict(zip(_ROOM_COLUMNS, row)))
+                except (ValueError, TypeError) as e:
+                    self.ready = False
+                    self.stats["error"] = str(e)
+                    raise ValueError(str(e)) from e
+                self.ready = True
+                self.stats["error"] = None
+                self.stats["loads"] += 1
+                self.stats["loaded_at"] = time.time()
+                if before is None:
+                    return 0
+                return len({entry[0] for entry in before.symmetric_difference(self._snapshot())})
+        finally:
+            tools.release_read_connection(conn)
+
+    def apply(self, events: Iterable[Dict[str, Any]]) -> None:
+        """Apply the room, booking and customer changes of committed change events, all at once.
+
+        Events of racing commits can arrive out of commit order, so their rows
+        aren't trusted: changed rooms are read back from the table under the lock,
+        which always yields the latest committed rows, and changed bookings and
+        guests are dropped from the details cache.
+        """
+        with self._lock:
+            if not self.ready:
+                return
+            try:
+                rooms = set()
+                for event in events:
+                    event_type, data = event["type"], event["data"]
+                    if event_type.startswith("room."):
+                        rooms.add(data["RoomID"])
+                    elif event_type in ("booking.updated", "booking.cancelled", "customer.updated"):
+                        self._forget_stay_details(event_type, data)
+                if rooms:
+                    self._reread(sorted(rooms))
+            except (KeyError, ValueError, TypeError, sqlite3.Error):
+                # Reloaded from the table on the next read
+                self.ready = False
+                self.stats["bad_rows"] += 1
+
+    def _reread(self, rooms: List[int]) -> None:
+        conn = tools.acquire_read_connection()
+        try:
+            cursor = conn.execute(_ROOM_ROWS_QUERY, (json.dumps(rooms),))
+            columns = tuple(description[0] for description in cursor.description)
+            rows = [dict(zip(columns, row)) for row in cursor]
+        finally:
+            tools.release_read_connection(conn)
+        for row in rows:
+            self._set(row)
+        for room in set(rooms) - {row["RoomID"] for row in rows}:
+            # Deleted since the event
+            if 0 <= room < len(self.status):
+                self._count(room, -1)
+                self.details.pop(self.stay[room], None)
+                self.status[room], self.stay[room] = _ABSENT, _NO_STAY
+        self.stats["rows_applied"] += len(rows)
+
+    def _forget_stay_details(self, event_type: str, data: Dict[str, Any]) -> None:
+        self._details_version += 1
+        if event_type == "customer.updated":
+            for stay, details in list(self.details.items()):
+                if details[2] == data["CustomerID"]:
+                    del self.details[stay]
+        else:
+            self.details.pop(data["BookingsID"], None)
+
+    def vacant_rooms(self, room_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """get_vacant_rooms, in RoomID order."""
+        with self._lock:
+            if room_type is None:
+                rooms = [room for room, status in enumerate(self.status) if status == _VACANT]
+            elif room_type in self.types:
+                code, type_code = self.types.index(room_type) + 1, self.type_code
+                rooms = [room for room, status in enumerate(self.status)
+                         if status == _VACANT and type_code[room] == code]
+            else:
+                return []
+            return self._rows(rooms)
+
+    def current_stays(self) -> List[Dict[str, Any]]:
+        """get_current_stays, in RoomID order.
+
+        Booking and guest details not cached yet are read from SQLite, only for
+        those stays and outside the lock.
+        """
+        with self._lock:
+            stay = self.stay
+            rooms = [room for room, status in enumerate(self.status) if status == _OCCUPIED and stay[room] != _NO_STAY]
+            missing = [stay[room] for room in rooms if stay[room] not in self.details]
+            version = self._details_version
+        fetched = {}
+        if missing:
+            rows = tools.run_query(_STAY_DETAILS_QUERY, (json.dumps(missing),))
+            if rows and "error" in rows[0]:
+                return rows
+            fetched = {row["BookingsID"]: (row["arrivalDate"], row["departureDay"], row["customerID"],
+                                           row["FirstName"], row["LastName"]) for row in rows}
+        with self._lock:
+            if version == self._details_version:
+                self.details.update(fetched)
+            stays = []
+            for row in self._rows(rooms):
+                details = fetched.get(row["currentStay"]) or self.details.get(row["currentStay"])
+                # The inner joins drop stays whose booking or guest is gone
+                if details is not None:
+                    arrival, departure, _, first_name, last_name = details
+                    row.update(BookingsID=row["currentStay"], arrivalDate=arrival, departureDay=departure,
+                               FirstName=first_name, LastName=last_name)
+                    stays.append(row)
+            return stays
+
+    def occupancy_by_type(self) -> List[Dict[str, Any]]:
+        """get_room_occupancy_stats: one row per room type, in type order."""
+        with self._lock:
+            counts = [(name, self.total[code], self.vacant[code], self.occupied[code])
+                      for code, name in enumerate(self.types, 1) if self.total[code]]
+        return [{
+            "type": name,
+            "total_rooms": total,
+            "vacant_rooms": vacant,
+            "occupied_rooms": occupied,
+            "occupancy_rate": _occupancy_rate(occupied, total),
+        } for name, total, vacant, occupied in sorted(counts)]
+
+    def occupancy(self) -> Dict[str, Any]:
+        """The occupancy part of get_hotel_statistics."""
+        with self._lock:
+            total, vacant, occupied = sum(self.total), sum(self.vacant), sum(self.occupied)
+        return {
+            "total_rooms": total,
+            # SUM over no rows is NULL
+            "vacant_rooms": vacant if total else None,
+            "occupied_rooms": occupied if total else None,
+            "occupancy_rate": _occupancy_rate(occupied, total),
+        }
+
+_states: Dict[str, RoomState] = {}
+_states_lock = threading.Lock()
+
+def _db_path(property: Optional[str]) -> Optional[str]:
+    return PROPERTIES.get(property) if property is not None else tools.DB_PATH
+
+def _on_events(events: List[Dict[str, Any]]) -> None:
+    """Feed committed room, booking and customer rows to the state of their database."""
+    batches: Dict[Optional[str], List[Dict[str, Any]]] = {}
+    for event in events:
+        state = _states.get(_db_path(event.get("property")))
+        if state is None:
+            continue
+        if event["type"] == "resync":
+            # A bulk change without row events; reload on the next read
+            state.ready = False
+        else:
+            batches.setdefault(event.get("property"), []).append(event)
+    for property, batch in batches.items():
+        # Rooms are re-read from the event's database
+        with use_property(property):
+            _states[_db_path(property)].apply(batch)
+
+event_bus.add_listener(_on_events)
+
+def load(db_path: Optional[str] = None) -> Optional[RoomState]:
+    """Load the room state of the current database and keep it current from then on.
+
+    Called at startup for every database; until then the tools read SQLite.
+    Returns None when OCCUPANCY_ENGINE is off.
+    """
+    if not OCCUPANCY_ENGINE:
+        return None
+    db_path = db_path or tools.current_db_path()
+    with _states_lock:
+        state = _states.get(db_path)
+        if state is None:
+            state = _states[db_path] = RoomState(db_path)
+    state.load()
+    return state
+
+def get_state() -> Optional[RoomState]:
+    """Return the current database's room state, or None to read the Rooms table.
+
+    A state marked stale (after a bulk import or a bad row) is reloaded first;
+    one whose last load failed waits for the next verify().
+    """
+    state = _states.get(tools.current_db_path())
+    if state is None or state.stats["error"] is not None:
+        return None
+    if not state.ready:
+        try:
+            state.load()
+        except (sqlite3.Error, ValueError):
+            return None
+    return state
+
+def verify() -> int:
+    """Compare the current database's state with its Rooms table and correct it.
+
+    Catches writes made outside the tools, such as another process or the
+    sqlite3 shell.
+
+    Returns:
+        Number of rooms that had to be corrected
+    """
+    state = _states.get(tools.current_db_path())
+    if state is None:
+        return 0
+    corrected = state.load()
+    state.stats["verifications"] += 1
+    state.stats["corrections"] += corrected
+    state.stats["verified_at"] = time.time()
+    return corrected
+
+def get_occupancy_stats() -> Dict[str, Dict[str, Any]]:
+    """Return load, update and verification counters of every room state, by database."""
+    with _states_lock:
+        states = dict(_states)
+    return {db_path: dict(state.stats, ready=state.ready, rooms=sum(state.total))
+            for db_path, state in states.items()}
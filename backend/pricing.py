@@ -0,0 +1,265 @@
+# pricing.py
+
+import os
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import tools
+from events import publish_event
+
+# numpy is optional and only needed to recalculate rates; it is imported on
+# first use, since the API imports this module at startup
+np: Any = None
+
+# Nights ahead that a recalculation covers
+PRICING_HORIZON_DAYS = int(os.getenv("PRICING_HORIZON_DAYS", "365"))
+# Past nights whose bookings make up the booking pace (pickup) curve
+PRICING_HISTORY_DAYS = int(os.getenv("PRICING_HISTORY_DAYS", "365"))
+
+# Rules turning a forecast occupancy into a rate; each can be overridden per call
+DEFAULT_RULES: Dict[str, float] = {
+    # Forecast occupancy at which the base price is charged
+    "target_occupancy": float(os.getenv("PRICING_TARGET_OCCUPANCY", "0.75")),
+    # Change of the rate, as a fraction of the base price, per unit of occupancy above or below target
+    "sensitivity": float(os.getenv("PRICING_SENSITIVITY", "0.8")),
+    # Bounds of the rate as a multiple of the base price
+    "min_factor": float(os.getenv("PRICING_MIN_FACTOR", "0.7")),
+    "max_factor": float(os.getenv("PRICING_MAX_FACTOR", "1.6")),
+    # Extra multiple for Friday and Saturday nights
+    "weekend_factor": float(os.getenv("PRICING_WEEKEND_FACTOR", "1.1")),
+    # Rates are rounded to a multiple of this
+    "round_to": float(os.getenv("PRICING_ROUND_TO", "10")),
+    # Smallest share of a night's final bookings assumed to be on the books already,
+    # so a far-out night with a single booking doesn't forecast a full house
+    "min_pickup": float(os.getenv("PRICING_MIN_PICKUP", "0.05")),
+}
+
+_RATE_TABLE_DDL = """
+CREATE TABLE IF NOT EXISTS RoomRates (
+    type TEXT NOT NULL,
+    night DATE NOT NULL,
+    rate REAL NOT NULL,
+    base_price REAL NOT NULL,
+    rooms INTEGER NOT NULL,
+    on_books INTEGER NOT NULL,
+    forecast_occupancy REAL NOT NULL,
+    computed_at TEXT NOT NULL,
+    PRIMARY KEY (type, night)
+) WITHOUT ROWID
+"""
+
+# Stays with a room (so with a type) covering a night of the horizon, grouped by type and dates
+_ON_BOOKS_SQL = """
+SELECT r.type, CAST(julianday(b.arrivalDate) AS INTEGER), CAST(julianday(b.departureDay) AS INTEGER), COUNT(*)
+FROM Bookings b
+JOIN Rooms r ON r.RoomID = b.RoomID
+WHERE b.departureDay > :today AND b.arrivalDate < date(:today, :horizon)
+GROUP BY r.type, b.arrivalDate, b.departureDay
+"""
+
+# Stays completed within the history window, grouped by lead time and length
+_PACE_SQL = """
+SELECT CAST(julianday(arrivalDate) - julianday(bookedDate) AS INTEGER) AS lead,
+       CAST(julianday(departureDay) - julianday(arrivalDate) AS INTEGER) AS nights,
+       COUNT(*)
+FROM Bookings
+WHERE departureDay > date(:today, :history) AND departureDay <= :today
+GROUP BY lead, nights
+"""
+
+def install_rate_table(db_path: str) -> None:
+    """Create the RoomRates table if it doesn't exist yet."""
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute(_RATE_TABLE_DDL)
+        conn.commit()
+    finally:
+        conn.close()
+
+def _require_numpy() -> None:
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            raise ValueError("Rate recalculation requires numpy (pip install numpy)") from None
+        np = numpy
+
+def _coverage(row: "np.ndarray", start: "np.ndarray", end: "np.ndarray", weight: "np.ndarray",
+              rows: int, columns: int) -> "np.ndarray":
+    """Sum the weights of the ranges [start, end) covering each column, per row of the grid.
+
+    Each range adds its weight at its start and takes it away at its end of a
+    difference array; a cumulative sum along the columns turns that into totals.
+    Ranges are clipped to the grid.
+    """
+    start = np.clip(start, 0, columns)
+    end = np.clip(end, 0, columns)
+    keep = start < end
+    row, start, end, weight = row[keep], start[keep], end[keep], weight[keep]
+    width = columns + 1
+    diff = (np.bincount(row * width + start, weight, minlength=rows * width)
+            - np.bincount(row * width + end, weight, minlength=rows * width))
+    return np.cumsum(diff.reshape(rows, width), axis=1)[:, :columns]
+
+def compute_rates(on_books: Tuple["np.ndarray", ...], pace: Tuple["np.ndarray", ...], today: int, weekday: int,
+                  base_price: "np.ndarray", rooms: "np.ndarray", horizon: int,
+                  rules: Dict[str, float]) -> Dict[str, "np.ndarray"]:
+    """Recommended rate for every room type and night of the horizon, as type x night arrays.
+
+    On-the-books room-nights come from the stays covering each night. The
+    booking pace curve comes from completed stays: the share of their room-nights
+    already booked n days before the night. Dividing a night's on-the-books
+    count by that share at its lead time forecasts its final occupancy, which
+    the rules turn into a multiple of the type's base price.
+
+    Args:
+        on_books: (type_index, arrival, departure, count) of upcoming stays; dates are day numbers
+        pace: (lead, nights, count) of completed stays; lead is arrival minus booking date in days
+        today: Day number of the first night
+        weekday: Weekday of the first night, Monday = 0
+        base_price, rooms: Base price and room count of each type
+        horizon: Number of nights
+        rules: See DEFAULT_RULES
+
+    Returns:
+        {"on_books", "forecast_occupancy", "rate"}, each shaped (types, horizon)
+    """
+    types = len(base_price)
+    type_index, arrival, departure, count = on_books
+    booked_nights = np.rint(_coverage(type_index, arrival - today, departure - today, count,
+                                      types, horizon)).astype(np.int64)
+
+    # The nights of a stay have consecutive leads, from its lead to lead + nights - 1.
+    # Nights booked after arrival don't count; those booked further ahead than
+    # the horizon land in the last column, which stands for "at least horizon".
+    lead, nights, count = pace
+    lead_nights = _coverage(np.zeros(len(lead), dtype=np.int64), lead, lead + nights, count, 1, horizon + 1)[0]
+    lead_nights[horizon] += (np.maximum(lead + nights - np.maximum(lead, horizon + 1), 0) * count).sum()
+    total = lead_nights.sum()
+    if total:
+        # Share of a night's final bookings made at least n days before it
+        pickup = lead_nights[::-1].cumsum()[::-1][:horizon] / total
+    else:
+        pickup = np.ones(horizon)
+    pickup = np.maximum(pickup, rules["min_pickup"])
+
+    capacity = np.maximum(rooms, 1)[:, None].astype(np.float64)
+    forecast = np.minimum(booked_nights / capacity / pickup[None, :], 1.0)
+    factor = np.clip(1.0 + rules["sensitivity"] * (forecast - rules["target_occupancy"]),
+                     rules["min_factor"], rules["max_factor"])
+    weekend = np.isin((weekday + np.arange(horizon)) % 7, (4, 5))
+    factor = factor * np.where(weekend, rules["weekend_factor"], 1.0)[None, :]
+    step = rules["round_to"] or 1.0
+    rate = np.round(base_price[:, None] * factor / step) * step
+    return {"on_books": booked_nights, "forecast_occupancy": forecast, "rate": rate}
+
+def _demand_from_sqlite(conn: sqlite3.Connection, today: str, days: int,
+                        index: Dict[str, int]) -> Tuple[Tuple["np.ndarray", ...], Tuple["np.ndarray", ...]]:
+    """Upcoming and completed stays, aggregated by SQLite so only a few thousand rows come back."""
+    params = {"today": today, "history": f"-{PRICING_HISTORY_DAYS} days", "horizon": f"+{days} days"}
+    upcoming = [row for row in conn.execute(_ON_BOOKS_SQL, params) if None not in row]
+    completed = [row for row in conn.execute(_PACE_SQL, params) if None not in row]
+    columns = list(zip(*upcoming)) or [(), (), (), ()]
+    on_books = (np.fromiter((index[name] for name in columns[0]), dtype=np.int64, count=len(upcoming)),
+                *(np.array(column, dtype=np.int64) for column in columns[1:3]),
+                np.array(columns[3], dtype=np.float64))
+    columns = list(zip(*completed)) or [(), (), ()]
+    pace = (*(np.array(column, dtype=np.int64) for column in columns[:2]), np.array(columns[2], dtype=np.float64))
+    return on_books, pace
+
+def _demand_from_snapshot(today_day: int, days: int,
+                          index: Dict[str, int]) -> Tuple[Tuple["np.ndarray", ...], Tuple["np.ndarray", ...]]:
+    """Upcoming and completed stays from the analytics snapshot, one entry per booking."""
+    import analytics
+    snapshot = analytics.get_snapshot()
+    known = np.isfinite(snapshot.julianday)
+    day = np.where(known, snapshot.julianday, 0).astype(np.int64)
+    # Type codes of the snapshot to positions in the current list of types; -1 for a type
+    # since removed, and for the extra code given to bookings without a room (room -1)
+    remap = np.array([index.get(name, -1) for name in snapshot.room_types.values] + [-1], dtype=np.int64)
+    room_type = np.append(snapshot.room_type, len(snapshot.room_types.values))
+    upcoming: List[Tuple["np.ndarray", ...]] = []
+    completed: List[Tuple["np.ndarray", ...]] = []
+    for part in snapshot.parts(history=True):
+        arrival, departure, booked = day[part.arrival], day[part.departure], day[part.booked]
+        valid = known[part.arrival] & known[part.departure]
+        type_index = remap[room_type[part.room]]
+        selected = valid & (type_index >= 0) & (departure > today_day) & (arrival < today_day + days)
+        upcoming.append((type_index[selected], arrival[selected], departure[selected]))
+        selected = (valid & known[part.booked] & (departure > today_day - PRICING_HISTORY_DAYS)
+                    & (departure <= today_day))
+        completed.append((arrival[selected] - booked[selected], departure[selected] - arrival[selected]))
+    on_books = tuple(np.concatenate(column) for column in zip(*upcoming))
+    pace = tuple(np.concatenate(column) for column in zip(*completed))
+    return (*on_books, np.ones(len(on_books[0]))), (*pace, np.ones(len(pace[0])))
+
+def recalculate_rates(days: int = PRICING_HORIZON_DAYS, rules: Optional[Dict[str, float]] = None,
+                      store: bool = True) -> Dict[str, Any]:
+    """Recompute the recommended rates of every room type for the next days and store them.
+
+    Stays come from the analytics snapshot with ANALYTICS_BACKEND=numpy, and
+    from grouped SQLite queries otherwise.
+
+    Args:
+        days: Number of nights, starting tonight
+        rules: Overrides for DEFAULT_RULES
+        store: Replace the rates in RoomRates from tonight on; False only computes them
+
+    Returns:
+        {"start_date", "end_date", "types", "nights", "rows", "source", "load_ms", "compute_ms", "store_ms"}
+    """
+    _require_numpy()
+    days = max(1, int(days))
+    unknown = set(rules or {}) - set(DEFAULT_RULES)
+    if unknown:
+        raise ValueError(f"Unknown pricing rules: {', '.join(sorted(unknown))}; "
+                         f"expected some of: {', '.join(DEFAULT_RULES)}")
+    rules = {**DEFAULT_RULES, **(rules or {})}
+    source = "snapshot" if tools.ANALYTICS_BACKEND == "numpy" else "sqlite"
+
+    started = time.perf_counter()
+    # Inside a /batch this reads on the batch's connection, so earlier steps are visible
+    with tools.shared_connection(read_only=True) as conn:
+        today, today_day, weekday, now = conn.execute(
+            "SELECT date('now'), CAST(julianday(date('now')) AS INTEGER), "
+            "(CAST(strftime('%w', 'now') AS INTEGER) + 6) % 7, datetime('now')"
+        ).fetchone()
+        room_types = conn.execute("SELECT type, COUNT(*), AVG(price) FROM Rooms GROUP BY type ORDER BY type").fetchall()
+        index = {row[0]: i for i, row in enumerate(room_types)}
+        if source == "sqlite":
+            on_books, pace = _demand_from_sqlite(conn, today, days, index)
+    if source == "snapshot":
+        on_books, pace = _demand_from_snapshot(today_day, days, index)
+    loaded = time.perf_counter()
+
+    grid = compute_rates(on_books, pace, today_day, weekday,
+                         np.array([row[2] for row in room_types], dtype=np.float64),
+                         np.array([row[1] for row in room_types], dtype=np.int64), days, rules)
+    nights = (np.datetime64(today) + np.arange(days)).astype(str).tolist()
+    computed = time.perf_counter()
+
+    summary: Dict[str, Any] = {
+        "start_date": nights[0], "end_date": nights[-1], "types": list(index), "nights": days,
+        "rows": len(index) * days, "source": source,
+        "load_ms": round((loaded - started) * 1000, 1), "compute_ms": round((computed - loaded) * 1000, 1),
+    }
+    if store:
+        rows = [
+            (name, night, rate, base, count, on_books, round(forecast, 4), now)
+            for (name, count, base), rates, booked_nights, forecasts in zip(
+                room_types, grid["rate"].tolist(), grid["on_books"].tolist(), grid["forecast_occupancy"].tolist())
+            for night, rate, on_books, forecast in zip(nights, rates, booked_nights, forecasts)
+        ]
+        # Joins the batch's connection and transaction when called from /batch
+        with tools.shared_connection(transaction=True) as conn:
+            # Nights before tonight keep the rates they were sold at
+            conn.execute("DELETE FROM RoomRates WHERE night >= ?", (today,))
+            conn.executemany("INSERT INTO RoomRates (type, night, rate, base_price, rooms, on_books, "
+                             "forecast_occupancy, computed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            tools._commit_group(conn)
+            # Held until the transaction commits
+            publish_event("rates.updated", {key: summary[key] for key in ("start_date", "end_date", "types")})
+    summary["store_ms"] = round((time.perf_counter() - computed) * 1000, 1)
+    return summary
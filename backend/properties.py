@@ -0,0 +1,55 @@
+# properties.py
+
+import contextvars
+import os
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+def _parse_properties(spec: str) -> Dict[str, str]:
+    """Parse "name=path,name=path" into {name: path}."""
+    properties: Dict[str, str] = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        name, separator, path = entry.partition("=")
+        if not separator or not name.strip() or not path.strip():
+            raise ValueError(f"Bad HOTEL_PROPERTIES entry {entry!r}; expected name=path")
+        properties[name.strip()] = path.strip()
+    return properties
+
+# One SQLite database per hotel: "downtown=/data/downtown.db,airport=/data/airport.db".
+# Without it SQLITE_DB_PATH is the only database.
+PROPERTIES: Dict[str, str] = _parse_properties(os.getenv("HOTEL_PROPERTIES", ""))
+
+# Property the current request, job or conversation is scoped to; None uses tools.DB_PATH
+current_property: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_property", default=None)
+
+def resolved_property() -> Optional[str]:
+    """Return the property whose database the current call uses.
+
+    Calls scoped to no property use the first property's database, so they
+    resolve to its name; None only when no properties are configured.
+    """
+    name = current_property.get()
+    return name if name is not None else next(iter(PROPERTIES), None)
+
+def check_property(name: str) -> str:
+    """Return name if it is a configured property, else raise ValueError."""
+    if name not in PROPERTIES:
+        known = ", ".join(PROPERTIES) or "none configured, see HOTEL_PROPERTIES"
+        raise ValueError(f"Unknown property {name!r}; expected one of: {known}")
+    return name
+
+@contextmanager
+def use_property(name: Optional[str]) -> Iterator[None]:
+    """Route every database call made inside the block to one property's database.
+
+    Args:
+        name: Property from PROPERTIES; None keeps the current routing
+    """
+    if name is None:
+        yield
+        return
+    token = current_property.set(check_property(name))
+    try:
+        yield
+    finally:
+        current_property.reset(token)
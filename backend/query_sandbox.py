@@ -0,0 +1,210 @@
+# query_sandbox.py
+
+import contextvars
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+import tracing
+
+SANDBOX_TIMEOUT_MS = int(os.getenv("SANDBOX_TIMEOUT_MS", "2000"))
+SANDBOX_MAX_ROWS = int(os.getenv("SANDBOX_MAX_ROWS", "200"))
+SANDBOX_MAX_BYTES = int(os.getenv("SANDBOX_MAX_BYTES", str(256 * 1024)))
+# A full scan of a table this large is rejected when it runs inside another loop (a join)
+SANDBOX_MAX_JOIN_SCAN_ROWS = int(os.getenv("SANDBOX_MAX_JOIN_SCAN_ROWS", "10000"))
+# A full scan of a table this large is rejected outright
+SANDBOX_MAX_SCAN_ROWS = int(os.getenv("SANDBOX_MAX_SCAN_ROWS", "5000000"))
+SANDBOX_MAX_CONCURRENT_PER_SESSION = int(os.getenv("SANDBOX_MAX_CONCURRENT_PER_SESSION", "2"))
+
+# Number of SQLite VM instructions between deadline checks
+_PROGRESS_STEPS = 10000
+
+_ALLOWED_ACTIONS = {
+    sqlite3.SQLITE_SELECT,
+    sqlite3.SQLITE_READ,
+    sqlite3.SQLITE_FUNCTION,
+    sqlite3.SQLITE_RECURSIVE,
+}
+
+_TABLE_REF = re.compile(r"\b(?:FROM|JOIN)\s+([A-Za-z_]\w*)(?:\s+(?:AS\s+)?([A-Za-z_]\w*))?", re.IGNORECASE)
+_COMMA_TABLE_REF = re.compile(r",\s*([A-Za-z_]\w*)(?:\s+(?:AS\s+)?([A-Za-z_]\w*))?", re.IGNORECASE)
+_SQL_KEYWORDS = {
+    "on", "where", "join", "left", "right", "inner", "outer", "cross", "natural", "full",
+    "group", "order", "limit", "having", "union", "except", "intersect", "using", "window", "as",
+}
+
+session_id: contextvars.ContextVar[str] = contextvars.ContextVar("sandbox_session_id", default="default")
+
+_active_queries: Dict[str, int] = {}
+_active_lock = threading.Lock()
+
+class SandboxRejected(Exception):
+    """Raised when a query is refused before or during sandboxed execution."""
+
+@contextmanager
+def session(sid: Optional[str]):
+    """Attribute sandboxed queries run inside the block to a session."""
+    token = session_id.set(sid or "default")
+    try:
+        yield
+    finally:
+        session_id.reset(token)
+
+@contextmanager
+def _session_slot():
+    """Hold one of the current session's concurrent query slots."""
+    sid = session_id.get()
+    with _active_lock:
+        if _active_queries.get(sid, 0) >= SANDBOX_MAX_CONCURRENT_PER_SESSION:
+            raise SandboxRejected(
+                f"Too many concurrent queries for this session (limit {SANDBOX_MAX_CONCURRENT_PER_SESSION})")
+        _active_queries[sid] = _active_queries.get(sid, 0) + 1
+    try:
+        yield
+    finally:
+        with _active_lock:
+            _active_queries[sid] -= 1
+            if not _active_queries[sid]:
+                del _active_queries[sid]
+
+def _authorize(action, arg1, arg2, db_name, trigger):
+    return sqlite3.SQLITE_OK if action in _ALLOWED_ACTIONS else sqlite3.SQLITE_DENY
+
+def open_sandbox_connection(db_path: str) -> sqlite3.Connection:
+    """Open a read-only connection that can only run SELECT statements."""
+    uri = "file:" + os.path.abspath(db_path) + "?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    conn.set_authorizer(_authorize)
+    return conn
+
+def _table_aliases(query: str, tables: Dict[str, str]) -> Dict[str, str]:
+    """Map every name a table is referred to by in the query to the table itself."""
+    aliases = dict(tables)
+    for pattern in (_TABLE_REF, _COMMA_TABLE_REF):
+        for name, alias in pattern.findall(query):
+            table = tables.get(name.lower())
+            if table and alias and alias.lower() not in _SQL_KEYWORDS:
+                aliases[alias.lower()] = table
+    return aliases
+
+def _estimate_rows(conn: sqlite3.Connection, table: str) -> int:
+    """Cheap row-count estimate from the largest rowid."""
+    try:
+        return conn.execute(f'SELECT MAX(rowid) FROM "{table}"').fetchone()[0] or 0
+    except sqlite3.Error:
+        return 0
+
+def check_query_plan(conn: sqlite3.Connection, query: str, params: tuple = ()) -> None:
+    """Reject queries whose plan fully scans large tables.
+
+    Raises:
+        SandboxRejected: If the plan scans a large table without an index inside a join,
+            or scans a table above SANDBOX_MAX_SCAN_ROWS.
+    """
+    plan = conn.execute("EXPLAIN QUERY PLAN " + query, params).fetchall()
+    tables = {name.lower(): name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    aliases = _table_aliases(query, tables)
+
+    loops_by_parent: Dict[int, int] = {}
+    for node_id, parent, _, detail in plan:
+        words = detail.split()
+        if not words or words[0] not in ("SCAN", "SEARCH"):
+            continue
+        nested = loops_by_parent.get(parent, 0) > 0
+        loops_by_parent[parent] = loops_by_parent.get(parent, 0) + 1
+        if words[0] != "SCAN" or len(words) < 2 or "USING" in words:
+            continue
+        table = aliases.get(words[1].lower())
+        if table is None:
+            continue
+        rows = _estimate_rows(conn, table)
+        if nested and rows > SANDBOX_MAX_JOIN_SCAN_ROWS:
+            raise SandboxRejected(
+                f"Query joins against a full scan of {table} (~{rows} rows) without an index; "
+                f"join on an indexed column or add a more selective condition")
+        if rows > SANDBOX_MAX_SCAN_ROWS:
+            raise SandboxRejected(f"Query scans all of {table} (~{rows} rows); add a selective condition")
+
+def _row_size(row: tuple) -> int:
+    return sum(len(str(value)) for value in row) + 8 * len(row)
+
+def execute_sandboxed(db_path: str, query: str, params: tuple = (),
+                      timeout_ms: int = SANDBOX_TIMEOUT_MS, max_rows: int = SANDBOX_MAX_ROWS,
+                      max_bytes: int = SANDBOX_MAX_BYTES) -> Tuple[List[str], List[tuple], Optional[str]]:
+    """Run a read-only query under time, row and byte limits.
+
+    Args:
+        db_path: Database file to query
+        query: SELECT statement with parameter placeholders
+        params: Parameter values to substitute in the query
+        timeout_ms: Statement time budget in milliseconds
+        max_rows: Maximum number of rows to return
+        max_bytes: Approximate maximum size of the returned data
+
+    Returns:
+        Tuple of (column names, rows, truncation reason or None)
+
+    Raises:
+        SandboxRejected: If the query is refused by the plan check, the session limit or the time budget
+        sqlite3.Error: For any other database error
+    """
+    with _session_slot():
+        conn = open_sandbox_connection(db_path)
+        try:
+            check_query_plan(conn, query, params)
+
+            deadline = time.monotonic() + timeout_ms / 1000.0
+            conn.set_progress_handler(lambda: 1 if time.monotonic() > deadline else 0, _PROGRESS_STEPS)
+            try:
+                cursor = conn.execute(query, params)
+                columns = [description[0] for description in cursor.description or ()]
+                rows: List[tuple] = []
+                size = 0
+                truncated = None
+                for row in cursor:
+                    if len(rows) >= max_rows:
+                        truncated = f"row limit of {max_rows} reached"
+                        break
+                    size += _row_size(row)
+                    if size > max_bytes:
+                        truncated = f"size limit of {max_bytes} bytes reached"
+                        break
+                    rows.append(row)
+            except sqlite3.OperationalError as e:
+                if time.monotonic() > deadline and "interrupt" in str(e):
+                    raise SandboxRejected(f"Query exceeded the {timeout_ms} ms time budget") from e
+                raise
+            return columns, rows, truncated
+        finally:
+            conn.close()
+
+def run_sandboxed_query(db_path: str, query: str, params: tuple = ()) -> List[Dict[str, Any]]:
+    """Run a read-only query in the sandbox and return rows in the tool result format.
+
+    When the result is cut short a final {"truncated": True, ...} entry is appended.
+    """
+    if not db_path:
+        return [{"error": "Database path not set. Please check SQLITE_DB_PATH in your .env file."}]
+    statement = tracing.sql_span(query)
+    if statement is None:
+        return _run_sandboxed_query(db_path, query, params)
+    statement.set("db.sandboxed", True)
+    result = _run_sandboxed_query(db_path, query, params)
+    tracing.end_sql_span(statement, result)
+    return result
+
+def _run_sandboxed_query(db_path: str, query: str, params: tuple) -> List[Dict[str, Any]]:
+    try:
+        columns, rows, truncated = execute_sandboxed(db_path, query, params)
+    except SandboxRejected as e:
+        return [{"error": f"Query rejected: {str(e)}"}]
+    except sqlite3.Error as e:
+        return [{"error": f"Database error: {str(e)}"}]
+    result = [dict(zip(columns, row)) for row in rows]
+    if truncated:
+        result.append({"truncated": True, "returned_rows": len(rows), "reason": truncated})
+    return result
@@ -0,0 +1,46 @@
+# responses.py
+
+import json
+from typing import Any, Iterable, Iterator, List
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to compact stdlib JSON
+    orjson = None
+
+class FastJSONResponse(JSONResponse):
+    """JSON response encoded with orjson when it is installed.
+
+    orjson serializes tuples as arrays, so cursor rows can be sent as they are.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def dumps(content: Any) -> bytes:
+    """Encode content the way FastJSONResponse does."""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":"),
+                      default=str).encode("utf-8")
+
+def json_rows(columns: List[str], batches: Iterable[List[tuple]], columnar: bool = False) -> Iterator[bytes]:
+    """Encode batches of rows as the bytes of one JSON document, one chunk per batch.
+
+    The result is what FastJSONResponse would send for the whole list of row
+    dicts, or for {"columns": columns, "rows": rows} with columnar, without
+    ever holding more than one batch.
+    """
+    yield b'{"columns":' + dumps(columns) + b',"rows":[' if columnar else b"["
+    first = True
+    for rows in batches:
+        if not rows:
+            continue
+        if not columnar:
+            rows = [dict(zip(columns, row)) for row in rows]
+        chunk = dumps(rows)[1:-1]
+        yield chunk if first else b"," + chunk
+        first = False
+    yield b"]}" if columnar else b"]"
@@ -0,0 +1,130 @@
+# revenue.py
+
+import os
+from bisect import bisect_right
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+
+import tools
+
+# Rows fetched per cursor batch; memory stays at one batch plus the buckets
+REVENUE_FETCH_ROWS = int(os.getenv("REVENUE_FETCH_ROWS", "5000"))
+
+GRANULARITIES = ("day", "week", "month")
+
+# Paid stays with a night in [start, end], as (type, arrival, departure, net price);
+# dates come back as date.toordinal() numbers, NULL if malformed
+_STAYS_QUERY = """
+SELECT r.type,
+       CAST(julianday(b.arrivalDate) AS INTEGER) - 1721424,
+       CAST(julianday(b.departureDay) AS INTEGER) - 1721424,
+       b.price * (1 - b.discount/100.0)
+FROM AllBookingPayments b
+JOIN Rooms r ON r.RoomID = b.RoomID
+WHERE b.departureDay >= :start AND b.arrivalDate <= :end
+    AND b.price IS NOT NULL AND b.discount IS NOT NULL
+    AND (:room_type IS NULL OR r.type = :room_type)
+"""
+
+def _bucket_starts(first: date, last: date, granularity: str) -> List[int]:
+    """Ordinals of the day, Monday or first of the month starting each bucket that overlaps [first, last]."""
+    if granularity == "day":
+        return list(range(first.toordinal(), last.toordinal() + 1))
+    if granularity == "week":
+        monday = first - timedelta(days=first.weekday())
+        return list(range(monday.toordinal(), last.toordinal() + 1, 7))
+    starts = []
+    month = first.replace(day=1)
+    while month <= last:
+        starts.append(month.toordinal())
+        month = (month + timedelta(days=31)).replace(day=1)
+    return starts
+
+def revenue_time_series(start_date: str = "", end_date: str = "", granularity: str = "month",
+                        room_type: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Revenue, ADR and RevPAR per room type and period, with each stay's price spread over its nights.
+
+    A stay's net price (price less discount) is divided evenly among its nights
+    and each night counts in the period it falls in, so a stay across a month
+    end is split between both months and nights outside the range don't count.
+    A stay that departs on its arrival day counts as one night. Bookings are
+    read in one pass in batches, accumulating into one slot per period and type.
+
+    Args:
+        start_date: First night 'YYYY-MM-DD' (default: 364 days before end_date)
+        end_date: Last night 'YYYY-MM-DD' (default: today in UTC, as SQLite's date('now'))
+        granularity: "day", "week" (starting Monday) or "month"
+        room_type: Only this room type
+
+    Returns:
+        One row per period and room type: period (its first day), type, revenue,
+        room_nights, available_room_nights, occupancy_rate, adr and revpar.
+        Availability uses the current room inventory.
+
+    Raises:
+        ValueError: Unknown granularity or a malformed date
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity {granularity!r}; expected one of: {', '.join(GRANULARITIES)}")
+    revenue: Dict[str, List[float]] = {}
+    nights: Dict[str, List[int]] = {}
+
+    conn = tools.acquire_read_connection()
+    try:
+        # Today as the SQL reports see it (UTC), not the server's local date
+        last = date.fromisoformat(end_date or conn.execute("SELECT date('now')").fetchone()[0])
+        first = date.fromisoformat(start_date) if start_date else last - timedelta(days=364)
+        if first > last:
+            raise ValueError(f"start_date {first} is after end_date {last}")
+        starts = _bucket_starts(first, last, granularity)
+        # Bucket i covers nights [bounds[i], bounds[i + 1]) clipped to the range
+        bounds = [max(start, first.toordinal()) for start in starts] + [last.toordinal() + 1]
+        # departureDay >= start keeps same-day stays arriving on the first day, which count one night
+        cursor = conn.execute(_STAYS_QUERY, {"start": first.isoformat(), "end": last.isoformat(),
+                                             "room_type": room_type})
+        while True:
+            rows = cursor.fetchmany(REVENUE_FETCH_ROWS)
+            if not rows:
+                break
+            for stay_type, arrival, departure, net in rows:
+                if arrival is None or departure is None:
+                    continue
+                departure = max(departure, arrival + 1)
+                per_night = net / (departure - arrival)
+                if stay_type not in revenue:
+                    revenue[stay_type] = [0.0] * len(starts)
+                    nights[stay_type] = [0] * len(starts)
+                type_revenue, type_nights = revenue[stay_type], nights[stay_type]
+                night, stop = max(arrival, bounds[0]), min(departure, bounds[-1])
+                bucket = bisect_right(bounds, night) - 1
+                while night < stop:
+                    end = min(stop, bounds[bucket + 1])
+                    type_revenue[bucket] += per_night * (end - night)
+                    type_nights[bucket] += end - night
+                    night = end
+                    bucket += 1
+        rooms = dict(conn.execute(
+            "SELECT type, COUNT(*) FROM Rooms WHERE (:room_type IS NULL OR type = :room_type) GROUP BY type",
+            {"room_type": room_type}).fetchall())
+    finally:
+        tools.release_read_connection(conn)
+
+    rows = []
+    for bucket, start in enumerate(starts):
+        days = bounds[bucket + 1] - bounds[bucket]
+        period = date.fromordinal(start).isoformat()
+        for stay_type in sorted(set(rooms) | set(revenue)):
+            sold = nights[stay_type][bucket] if stay_type in nights else 0
+            earned = revenue[stay_type][bucket] if stay_type in revenue else 0.0
+            available = rooms.get(stay_type, 0) * days
+            rows.append({
+                "period": period,
+                "type": stay_type,
+                "revenue": round(earned, 2),
+                "room_nights": sold,
+                "available_room_nights": available,
+                "occupancy_rate": round(sold * 100.0 / available, 2) if available else None,
+                "adr": round(earned / sold, 2) if sold else None,
+                "revpar": round(earned / available, 2) if available else None,
+            })
+    return rows
@@ -0,0 +1,106 @@
+# schema_catalog.py
+
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+
+# Bookkeeping tables of sync.py and pricing.py, left out of the schema the agent is shown
+INTERNAL_TABLES = frozenset({"ChangeLog", "ChangeLogMeta", "RoomRates"})
+
+class SchemaCatalog:
+    """In-memory description of the database schema.
+
+    Built from PRAGMA table_info, foreign_key_list and index_list, and rebuilt only
+    when SQLite's schema_version changes. INTERNAL_TABLES are not included.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Per database, since each property has its own file
+        self._conns: Dict[str, sqlite3.Connection] = {}
+        self._versions: Dict[str, int] = {}
+        self._tables: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._prompt_blocks: Dict[str, str] = {}
+
+    def _connection(self, db_path: str) -> sqlite3.Connection:
+        conn = self._conns.get(db_path)
+        if conn is None:
+            conn = self._conns[db_path] = sqlite3.connect(db_path, check_same_thread=False)
+        return conn
+
+    def _load_table(self, conn: sqlite3.Connection, table: str) -> Dict[str, Any]:
+        foreign_keys = [
+            {"column": fk[3], "references": f"{fk[2]}.{fk[4]}"}
+            for fk in conn.execute(f'PRAGMA foreign_key_list("{table}")')
+        ]
+        references = {fk["column"]: fk["references"] for fk in foreign_keys}
+        columns = [
+            {
+                "column": name,
+                "type": col_type,
+                "not_null": bool(not_null),
+                "default": default,
+                "primary_key": bool(pk),
+                "references": references.get(name),
+            }
+            for _, name, col_type, not_null, default, pk in conn.execute(f'PRAGMA table_info("{table}")')
+        ]
+        indexes = []
+        for index in conn.execute(f'PRAGMA index_list("{table}")'):
+            index_name, unique = index[1], index[2]
+            index_columns = [info[2] for info in conn.execute(f'PRAGMA index_info("{index_name}")')]
+            indexes.append({"name": index_name, "unique": bool(unique), "columns": index_columns})
+        return {"table": table, "columns": columns, "foreign_keys": foreign_keys, "indexes": indexes}
+
+    @staticmethod
+    def _format_table(info: Dict[str, Any]) -> str:
+        parts = []
+        for col in info["columns"]:
+            text = f"{col['column']} {col['type']}"
+            if col["primary_key"]:
+                text += " PK"
+            elif col["not_null"]:
+                text += " NOT NULL"
+            if col["references"]:
+                text += f" FK→{col['references']}"
+            parts.append(text)
+        line = f"- {info['table']}({', '.join(parts)})"
+        if info["indexes"]:
+            line += " indexes: " + ", ".join(f"{idx['name']}({', '.join(idx['columns'])})" for idx in info["indexes"])
+        return line
+
+    def refresh(self, db_path: str) -> None:
+        """Rebuild the catalog if the database path or its schema version changed."""
+        if not db_path:
+            raise ValueError("Database path not set. Please check SQLITE_DB_PATH in your .env file.")
+        with self._lock:
+            conn = self._connection(db_path)
+            version = conn.execute("PRAGMA schema_version").fetchone()[0]
+            if version == self._versions.get(db_path):
+                return
+            names = [row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name")
+                if row[0] not in INTERNAL_TABLES]
+            tables = {name.lower(): self._load_table(conn, name) for name in names}
+            self._tables[db_path] = tables
+            self._prompt_blocks[db_path] = "\n".join(self._format_table(info) for info in tables.values())
+            self._versions[db_path] = version
+
+    def table_names(self, db_path: str) -> List[str]:
+        self.refresh(db_path)
+        return [info["table"] for info in self._tables[db_path].values()]
+
+    def describe(self, db_path: str, table: str) -> Optional[Dict[str, Any]]:
+        """Return the columns, foreign keys and indexes of a table, or None if it doesn't exist."""
+        self.refresh(db_path)
+        return self._tables[db_path].get(table.lower())
+
+    def prompt_block(self, db_path: str) -> str:
+        """Compact one-line-per-table schema summary for the agent prompt."""
+        try:
+            self.refresh(db_path)
+        except (sqlite3.Error, ValueError) as e:
+            return f"(schema unavailable: {e})"
+        return self._prompt_blocks[db_path]
+
+catalog = SchemaCatalog()
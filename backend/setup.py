@@ -11,6 +11,8 @@ def setup_database(db_path="hotel.db"):
     DROP TABLE IF EXISTS Rooms;
     DROP TABLE IF EXISTS Pricing;
     DROP TABLE IF EXISTS Customers;
+    DROP TABLE IF EXISTS ChangeLog;
+    DROP TABLE IF EXISTS ChangeLogMeta;
     """)
 
     cursor.execute("""
@@ -0,0 +1,215 @@
+# sync.py
+
+import argparse
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import tools
+
+# Tables clients can sync, with their primary key columns
+SYNC_TABLES = {
+    "Customers": "CustomerID",
+    "Rooms": "RoomID",
+    "Bookings": "BookingsID",
+    "Pricing": "PaymentID",
+}
+SYNC_PAGE_SIZE = int(os.getenv("SYNC_PAGE_SIZE", "5000"))
+# Tombstones older than this are dropped; clients further behind must do a full resync
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.getenv("SYNC_TOMBSTONE_RETENTION_DAYS", "30"))
+
+# Parameters per IN (...) list, well below SQLite's variable limit
+_ID_CHUNK = 500
+
+def _change_log_ddl() -> str:
+    statements = ["""
+    CREATE TABLE IF NOT EXISTS ChangeLog (
+        version INTEGER PRIMARY KEY AUTOINCREMENT,
+        tbl TEXT NOT NULL,
+        row_id INTEGER NOT NULL,
+        op TEXT CHECK(op IN ('I', 'U', 'D')) NOT NULL,
+        changed_at TEXT NOT NULL DEFAULT (datetime('now'))
+    );
+    CREATE INDEX IF NOT EXISTS idx_changelog_row ON ChangeLog(tbl, row_id);
+    CREATE TABLE IF NOT EXISTS ChangeLogMeta (
+        key TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    );
+    INSERT OR IGNORE INTO ChangeLogMeta (key, value) VALUES ('horizon', 0);
+    INSERT OR IGNORE INTO ChangeLogMeta (key, value) VALUES ('suspended', 0);
+    """]
+    for table, pk in SYNC_TABLES.items():
+        for event, op, ref in (("INSERT", "I", "NEW"), ("UPDATE", "U", "NEW"), ("DELETE", "D", "OLD")):
+            statements.append(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_{table.lower()}_{event.lower()}_changelog
+    AFTER {event} ON {table}
+    WHEN (SELECT value FROM ChangeLogMeta WHERE key = 'suspended') = 0
+    BEGIN
+        INSERT INTO ChangeLog (tbl, row_id, op) VALUES ('{table}', {ref}.{pk}, '{op}');
+    END;
+    """)
+    return "".join(statements)
+
+def install_change_log(db_path: str) -> None:
+    """Create the ChangeLog table and its triggers if they don't exist yet."""
+    conn = sqlite3.connect(db_path)
+    try:
+        # Replace triggers created before they could be suspended
+        outdated = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_%_changelog' "
+            "AND sql NOT LIKE '%suspended%'")]
+        for name in outdated:
+            conn.execute(f'DROP TRIGGER "{name}"')
+        conn.executescript(_change_log_ddl())
+        conn.commit()
+    finally:
+        conn.close()
+
+@contextmanager
+def change_log_suspended(conn: sqlite3.Connection) -> Iterator[None]:
+    """Turn the change log triggers off inside the caller's open write transaction.
+
+    For bulk writers that record their changes with log_changes instead. The flag
+    is reset before the transaction commits, so other connections never see it set.
+    """
+    conn.execute("UPDATE ChangeLogMeta SET value = 1 WHERE key = 'suspended'")
+    try:
+        yield
+    finally:
+        conn.execute("UPDATE ChangeLogMeta SET value = 0 WHERE key = 'suspended'")
+
+def log_changes(conn: sqlite3.Connection, table: str, row_ids: Iterable[int], op: str = "I") -> None:
+    """Append change log entries for rows written while the triggers were suspended."""
+    # One statement for all rows: AUTOINCREMENT updates sqlite_sequence once per statement
+    conn.execute(
+        "INSERT INTO ChangeLog (tbl, row_id, op, changed_at) "
+        "SELECT ?, value, ?, (SELECT datetime('now')) FROM json_each(?)",
+        (table, op, json.dumps(list(row_ids))))
+
+def restart_sync(conn: sqlite3.Connection) -> None:
+    """Send every sync client and incremental export behind the current version back to a full snapshot.
+
+    For bulk moves such as archiving, where rows leave the live tables without
+    being deleted, so they must not show up as tombstones. Runs inside the
+    caller's write transaction. A placeholder entry takes the next version and
+    becomes the horizon, so the version a full snapshot returns is not behind it.
+    """
+    version = conn.execute("INSERT INTO ChangeLog (tbl, row_id, op) VALUES ('ChangeLogMeta', 0, 'U')").lastrowid
+    conn.execute("DELETE FROM ChangeLog WHERE version = ?", (version,))
+    conn.execute("UPDATE ChangeLogMeta SET value = MAX(value, ?) WHERE key = 'horizon'", (version,))
+
+def compact_change_log(db_path: str, retention_days: int = SYNC_TOMBSTONE_RETENTION_DAYS) -> Dict[str, int]:
+    """Shrink the change log.
+
+    Only the latest entry per row is needed to answer any "since" query, so older
+    entries are deleted. Tombstones past the retention window are dropped as well;
+    the horizon records the newest dropped version so clients behind it do a full resync.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            superseded = conn.execute("""
+                DELETE FROM ChangeLog
+                WHERE version NOT IN (SELECT MAX(version) FROM ChangeLog GROUP BY tbl, row_id)
+            """).rowcount
+            cutoff = f"{-int(retention_days)} days"
+            horizon = conn.execute(
+                "SELECT MAX(version) FROM ChangeLog WHERE op = 'D' AND changed_at < datetime('now', ?)",
+                (cutoff,)).fetchone()[0]
+            expired = 0
+            if horizon is not None:
+                expired = conn.execute(
+                    "DELETE FROM ChangeLog WHERE op = 'D' AND version <= ?", (horizon,)).rowcount
+                conn.execute("UPDATE ChangeLogMeta SET value = MAX(value, ?) WHERE key = 'horizon'", (horizon,))
+        return {"superseded_removed": superseded, "tombstones_removed": expired}
+    finally:
+        conn.close()
+
+def _fetch_rows(conn: sqlite3.Connection, table: str, ids: List[int]) -> List[Dict[str, Any]]:
+    pk = SYNC_TABLES[table]
+    rows: List[Dict[str, Any]] = []
+    for start in range(0, len(ids), _ID_CHUNK):
+        chunk = ids[start:start + _ID_CHUNK]
+        placeholders = ", ".join("?" * len(chunk))
+        cursor = conn.execute(f"SELECT * FROM {table} WHERE {pk} IN ({placeholders})", chunk)
+        columns = [description[0] for description in cursor.description]
+        rows.extend(dict(zip(columns, row)) for row in cursor)
+    return rows
+
+def _full_snapshot(conn: sqlite3.Connection, tables: List[str]) -> Dict[str, Dict[str, Any]]:
+    changes = {}
+    for table in tables:
+        cursor = conn.execute(f"SELECT * FROM {table}")
+        columns = [description[0] for description in cursor.description]
+        changes[table] = {"upserts": [dict(zip(columns, row)) for row in cursor], "deletes": []}
+    return changes
+
+def change_log_versions(conn: sqlite3.Connection) -> Tuple[int, int]:
+    """Return (current version, horizon). Versions below the horizon can't be answered incrementally."""
+    # AUTOINCREMENT's sequence survives compaction of the newest entries
+    current = conn.execute(
+        "SELECT COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'ChangeLog'), 0)").fetchone()[0]
+    horizon = conn.execute("SELECT value FROM ChangeLogMeta WHERE key = 'horizon'").fetchone()[0]
+    return current, horizon
+
+def get_changes(since: Optional[int] = None, tables: Optional[List[str]] = None,
+                limit: int = SYNC_PAGE_SIZE) -> Dict[str, Any]:
+    """Return rows inserted, updated or deleted after version `since`.
+
+    Args:
+        since: Version token from the client's previous sync (None for a first sync)
+        tables: Subset of SYNC_TABLES to include (default: all)
+        limit: Maximum number of change log entries to consume in one page
+
+    Returns:
+        {"version", "full", "has_more", "changes": {table: {"upserts": [...], "deletes": [ids]}}}.
+        When "full" is true the client must replace its copy of each table with the upserts.
+        When "has_more" is true the client should call again with since=version.
+    """
+    tables = [t for t in (tables or SYNC_TABLES) if t in SYNC_TABLES]
+    conn = tools.acquire_read_connection()
+    try:
+        # One read transaction so the version and the rows are consistent
+        conn.execute("BEGIN")
+        current, horizon = change_log_versions(conn)
+
+        if since is None or since < horizon or since > current:
+            return {"version": current, "full": True, "has_more": False,
+                    "changes": _full_snapshot(conn, tables)}
+
+        placeholders = ", ".join("?" * len(tables))
+        entries = conn.execute(
+            f"SELECT version, tbl, row_id, op FROM ChangeLog "
+            f"WHERE version > ? AND tbl IN ({placeholders}) ORDER BY version LIMIT ?",
+            (since, *tables, limit)).fetchall()
+        has_more = len(entries) == limit
+        version = entries[-1][0] if has_more else current
+
+        latest_op: Dict[str, Dict[int, str]] = {table: {} for table in tables}
+        for _, table, row_id, op in entries:
+            latest_op[table][row_id] = op
+
+        changes = {}
+        for table, ops in latest_op.items():
+            live_ids = [row_id for row_id, op in ops.items() if op != "D"]
+            upserts = _fetch_rows(conn, table, live_ids)
+            found = {row[SYNC_TABLES[table]] for row in upserts}
+            # Rows deleted later in the log (beyond this page) also surface as tombstones
+            deletes = [row_id for row_id, op in ops.items() if op == "D" or row_id not in found]
+            changes[table] = {"upserts": upserts, "deletes": deletes}
+        return {"version": version, "full": False, "has_more": has_more, "changes": changes}
+    finally:
+        tools.release_read_connection(conn)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Change log maintenance")
+    parser.add_argument("command", choices=["install", "compact"])
+    parser.add_argument("--db", default=tools.DB_PATH)
+    args = parser.parse_args()
+    if args.command == "install":
+        install_change_log(args.db)
+        print("Change log installed")
+    else:
+        print(compact_change_log(args.db))
@@ -0,0 +1,199 @@
+# tool_executor.py
+
+import asyncio
+import functools
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Sequence
+
+from langchain_core.messages import ToolMessage
+from langgraph.prebuilt import ToolNode
+import query_sandbox
+from properties import use_property
+from tools import WRITE_TOOL_NAMES, get_write_generation
+
+TOOL_WORKERS = int(os.getenv("AGENT_TOOL_WORKERS", "4"))
+TOOL_CACHE_MAX_THREADS = int(os.getenv("AGENT_TOOL_CACHE_MAX_THREADS", "256"))
+TOOL_CACHE_MAX_ENTRIES = int(os.getenv("AGENT_TOOL_CACHE_MAX_ENTRIES", "128"))
+# Repeated results at least this long are replaced by a reference to the earlier call
+TOOL_CACHE_REFERENCE_MIN_CHARS = int(os.getenv("AGENT_TOOL_CACHE_REFERENCE_MIN_CHARS", "400"))
+
+# Result rows with these keys mark a failed or cut-short call, which is never cached
+_PARTIAL_KEYS = frozenset(("error", "truncated"))
+
+# Read-only tools from one agent step run side by side on a bounded pool.
+# Writes go through a single worker so they never overlap each other.
+_read_executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="agent-read")
+_write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="agent-write")
+
+class ToolCallCache:
+    """Per-thread memo of read tool results, dropped whenever the database changes."""
+
+    def __init__(self, max_threads: int = TOOL_CACHE_MAX_THREADS, max_entries: int = TOOL_CACHE_MAX_ENTRIES):
+        self.max_threads = max_threads
+        self.max_entries = max_entries
+        self._threads: "OrderedDict[str, OrderedDict[str, tuple]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0, "chars_saved": 0}
+
+    @staticmethod
+    def make_key(tool_name: str, args: Dict[str, Any]) -> str:
+        return tool_name + ":" + json.dumps(args, sort_keys=True, default=str)
+
+    def get(self, thread_id: str, key: str) -> Optional[tuple]:
+        """Return (tool_call_id, content) of an earlier identical call, if still valid."""
+        with self._lock:
+            entries = self._threads.get(thread_id)
+            entry = entries.get(key) if entries else None
+            if entry is None or entry[0] != get_write_generation():
+                self.stats["misses"] += 1
+                return None
+            self._threads.move_to_end(thread_id)
+            self.stats["hits"] += 1
+            self.stats["chars_saved"] += len(entry[2])
+            return entry[1], entry[2]
+
+    def put(self, thread_id: str, key: str, tool_call_id: str, content: str, generation: int) -> None:
+        with self._lock:
+            entries = self._threads.setdefault(thread_id, OrderedDict())
+            self._threads.move_to_end(thread_id)
+            entries[key] = (generation, tool_call_id, content)
+            if len(entries) > self.max_entries:
+                entries.popitem(last=False)
+            if len(self._threads) > self.max_threads:
+                self._threads.popitem(last=False)
+
+    def invalidate(self, thread_id: str) -> None:
+        with self._lock:
+            if self._threads.pop(thread_id, None):
+                self.stats["invalidations"] += 1
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.stats, threads=len(self._threads))
+
+tool_cache = ToolCallCache()
+
+def _executor_for(tool_name: str) -> ThreadPoolExecutor:
+    """Pick the executor a tool call should run on."""
+    return _write_executor if tool_name in WRITE_TOOL_NAMES else _read_executor
+
+def _thread_id(request) -> Optional[str]:
+    """Return the conversation thread a tool call belongs to."""
+    configurable = (request.runtime.config or {}).get("configurable", {})
+    thread_id = configurable.get("thread_id")
+    return str(thread_id) if thread_id is not None else None
+
+def _property(request) -> Optional[str]:
+    """Return the property the conversation is scoped to (config "property"), if any."""
+    return (request.runtime.config or {}).get("configurable", {}).get("property")
+
+def _cached_result(request) -> Optional[ToolMessage]:
+    """Answer a repeated read call from the cache, or clear the cache before a write."""
+    thread_id = _thread_id(request)
+    if thread_id is None:
+        return None
+    call = request.tool_call
+    if call["name"] in WRITE_TOOL_NAMES:
+        tool_cache.invalidate(thread_id)
+        return None
+    hit = tool_cache.get(thread_id, ToolCallCache.make_key(call["name"], call["args"]))
+    if hit is None:
+        return None
+    earlier_id, content = hit
+    if len(content) >= TOOL_CACHE_REFERENCE_MIN_CHARS:
+        content = (f"Same as earlier result of tool call {earlier_id} ({call['name']} with the same "
+                   f"arguments); the data has not changed since.")
+    return ToolMessage(content=content, name=call["name"], tool_call_id=call["id"])
+
+def _is_partial(content: str) -> bool:
+    """Whether a tool result carries an "error" or "truncated" entry.
+
+    Tools report failures as rows rather than raising, e.g.
+    [{"error": "Database error: database is locked"}], and the sandbox marks
+    cut-short results with a final {"truncated": True, ...} row, so such
+    results still have status "success".
+    """
+    if not any(f"{quote}{key}{quote}" in content for key in _PARTIAL_KEYS for quote in "\"'"):
+        return False
+    try:
+        data = json.loads(content)
+    except ValueError:
+        # Not JSON (e.g. a repr) but the key is in there somewhere, so don't risk it
+        return True
+    rows = data if isinstance(data, list) else [data]
+    return any(isinstance(row, dict) and not row.keys().isdisjoint(_PARTIAL_KEYS) for row in rows)
+
+def _remember_result(request, result: Any, generation: int) -> None:
+    """Store a successful read result for later identical calls in the same thread.
+
+    Failures (locked database, sandbox time budget, ...) and truncated results are never stored.
+    """
+    thread_id = _thread_id(request)
+    call = request.tool_call
+    if thread_id is None or call["name"] in WRITE_TOOL_NAMES:
+        return
+    if (isinstance(result, ToolMessage) and result.status == "success" and isinstance(result.content, str)
+            and not _is_partial(result.content)):
+        key = ToolCallCache.make_key(call["name"], call["args"])
+        tool_cache.put(thread_id, key, call["id"], result.content, generation)
+
+# One event loop per executor thread, for running ToolNode's async execute there
+_thread_loops = threading.local()
+
+def _run_to_completion(execute: Callable, request) -> Any:
+    """Run ToolNode's async execute callable on this executor thread's own event loop."""
+    loop = getattr(_thread_loops, "loop", None)
+    if loop is None:
+        loop = _thread_loops.loop = asyncio.new_event_loop()
+    return loop.run_until_complete(execute(request))
+
+def _execute_in_session(execute: Callable, request) -> Any:
+    """Run ToolNode's execute callable in the thread's session and property."""
+    with query_sandbox.session(_thread_id(request)), use_property(_property(request)):
+        return execute(request)
+
+def run_tool_call(request, execute: Callable) -> Any:
+    """Sync ToolNode wrapper: serve repeats from the cache, otherwise dispatch to an executor."""
+    if request.tool is None:
+        return execute(request)
+    cached = _cached_result(request)
+    if cached is not None:
+        return cached
+    generation = get_write_generation()
+    result = _executor_for(request.tool.name).submit(_execute_in_session, execute, request).result()
+    _remember_result(request, result, generation)
+    return result
+
+async def arun_tool_call(request, execute: Callable) -> Any:
+    """Async ToolNode wrapper: serve repeats from the cache, otherwise dispatch to an executor."""
+    if request.tool is None:
+        return await execute(request)
+    cached = _cached_result(request)
+    if cached is not None:
+        return cached
+    generation = get_write_generation()
+    loop = asyncio.get_running_loop()
+    # ToolNode's own execute, so argument injection and error handling match the sync path
+    result = await loop.run_in_executor(_executor_for(request.tool.name), _execute_in_session,
+                                        functools.partial(_run_to_completion, execute), request)
+    _remember_result(request, result, generation)
+    return result
+
+def get_tool_cache_stats() -> Dict[str, int]:
+    """Return how many tool calls the per-thread cache has answered and skipped."""
+    return tool_cache.get_stats()
+
+def build_tool_node(tools: Sequence) -> ToolNode:
+    """Create the agent's tool node with concurrent reads and serialized writes.
+
+    Args:
+        tools: Tools to register on the node.
+
+    Returns:
+        A ToolNode that can be passed to create_react_agent
+    """
+    return ToolNode(tools, wrap_tool_call=run_tool_call, awrap_tool_call=arun_tool_call)
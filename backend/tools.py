@@ -1,21 +1,262 @@
 # tools.py
 
+import contextvars
+import json
+import operator
 import os
+import queue
 import sqlite3
-from typing import List, Dict, Any, Optional, Union
+import threading
+import uuid
+from array import array
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Dict, Any, NamedTuple, Optional, Tuple, Union
 from langchain_core.tools import tool
 from dotenv import load_dotenv
+from query_sandbox import run_sandboxed_query
+from schema_catalog import INTERNAL_TABLES, catalog
+from events import hold_events, publish_event
+from properties import PROPERTIES, current_property, use_property
+from writer import writer_for
+from assignment import ASSIGNMENT_HORIZON_DAYS, plan_assignments
+import tracing
 
 load_dotenv()
-DB_PATH = os.getenv("SQLITE_DB_PATH")
+# Database of calls not scoped to a property; with HOTEL_PROPERTIES, the first property's
+DB_PATH = next(iter(PROPERTIES.values()), None) or os.getenv("SQLITE_DB_PATH")
+READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", "8"))
+# "numpy" answers the report tools from a columnar snapshot (analytics.py) instead of SQLite
+ANALYTICS_BACKEND = os.getenv("ANALYTICS_BACKEND", "sqlite")
+# Writes outside a shared connection go through one writer thread per database that
+# commits them in groups (writer.py); "0" gives each write its own connection and commit
+WRITE_GROUP_COMMIT = os.getenv("WRITE_GROUP_COMMIT", "1") == "1"
+# Bookings moved out by archive.py; defaults to "<db>_archive.db" next to the database
+ARCHIVE_DB_PATH = os.getenv("ARCHIVE_DB_PATH")
+
+# Column lists shared by the live tables, their archive copies and the views over both
+BOOKINGS_COLUMNS = "BookingsID, customerID, bookedDate, arrivalDate, departureDay, paymentID, RoomID"
+PRICING_COLUMNS = "PaymentID, PaymentType, isDone, price, discount"
+
+# Tools that modify the database. Everything else is safe to run concurrently.
+WRITE_TOOL_NAMES = frozenset({
+    "add_customer",
+    "add_payment",
+    "book_room",
+    "check_in_guest",
+    "checkout_guest",
+    "group_check_in",
+    "group_checkout",
+    "assign_rooms",
+    "recalculate_room_rates",
+    "update_customer_info",
+    "cancel_booking",
+    "apply_discount",
+    "update_room_info",
+    "update_booking_details",
+    "add_new_room",
+})
+
+_write_generation = 0
+_write_generation_lock = threading.Lock()
+
+# Distinguishes generation tokens of different processes
+_INSTANCE_ID = uuid.uuid4().hex[:8]
+_data_version_conns: Dict[str, sqlite3.Connection] = {}
+_data_version_lock = threading.Lock()
+
+_read_pools: Dict[str, "queue.LifoQueue[sqlite3.Connection]"] = {}
+_read_pools_lock = threading.Lock()
+
+class _SharedConnection(NamedTuple):
+    conn: sqlite3.Connection
+    transactional: bool
+
+# Set inside shared_connection(); run_query then uses it instead of opening its own
+_shared_connection: contextvars.ContextVar[Optional[_SharedConnection]] = \
+    contextvars.ContextVar("shared_connection", default=None)
+
+def current_db_path() -> Optional[str]:
+    """Return the database of the property the current call is scoped to, or DB_PATH."""
+    name = current_property.get()
+    return PROPERTIES[name] if name is not None else DB_PATH
+
+def database_paths() -> Dict[Optional[str], str]:
+    """Return {property: database} for every property, or {None: DB_PATH} without properties."""
+    if PROPERTIES:
+        return dict(PROPERTIES)
+    return {None: DB_PATH} if DB_PATH else {}
+
+def archive_db_path(db_path: Optional[str] = None) -> str:
+    """Return the archive database file that belongs to a database."""
+    # A single ARCHIVE_DB_PATH can't serve several properties
+    if ARCHIVE_DB_PATH and not PROPERTIES:
+        return ARCHIVE_DB_PATH
+    root, ext = os.path.splitext(db_path or current_db_path())
+    return f"{root}_archive{ext or '.db'}"
+
+# Views over the live tables and their archive copies. Each is the same SELECT
+# over the main and archive schemas, joined with UNION ALL.
+_ARCHIVE_VIEWS = {
+    "AllBookings": f"SELECT {BOOKINGS_COLUMNS} FROM {{schema}}.Bookings",
+    "AllPricing": f"SELECT {PRICING_COLUMNS} FROM {{schema}}.Pricing",
+    # A booking and its payment are archived together, so each half joins within
+    # its own schema; SQLite can't push a join into a UNION ALL view
+    "AllBookingPayments": """
+        SELECT b.BookingsID, b.customerID, b.bookedDate, b.arrivalDate, b.departureDay, b.paymentID, b.RoomID,
+               p.PaymentType, p.isDone, p.price, p.discount
+        FROM {schema}.Bookings b JOIN {schema}.Pricing p ON p.PaymentID = b.paymentID""",
+}
+
+def _attach_archive(conn: sqlite3.Connection) -> None:
+    """Attach the archive database and create the views over live and archived rows.
+
+    The views are TEMP views, created on every pooled read connection and shared
+    write connection whether or not anything has been archived yet; historical
+    tools query them instead of Bookings and Pricing.
+    """
+    path = archive_db_path()
+    schemas = ["main"]
+    if os.path.exists(path):
+        conn.execute("ATTACH DATABASE ? AS archive", (path,))
+        if conn.execute(
+            "SELECT COUNT(*) FROM archive.sqlite_master WHERE type = 'table' AND name IN ('Bookings', 'Pricing')"
+        ).fetchone()[0] == 2:
+            schemas.append("archive")
+    for view, select in _ARCHIVE_VIEWS.items():
+        union = " UNION ALL ".join(select.format(schema=schema) for schema in schemas)
+        conn.execute(f"CREATE TEMP VIEW {view} AS {union}")
+
+def booking_schemas(conn: sqlite3.Connection) -> List[str]:
+    """Schemas whose Bookings and Pricing tables make up the All* views on this connection."""
+    row = conn.execute("SELECT sql FROM sqlite_temp_master WHERE type = 'view' AND name = 'AllBookings'").fetchone()
+    return ["archive", "main"] if row and "archive.Bookings" in row[0] else ["main"]
 
 def get_db_connection():
-    """Create and return a database connection."""
-    if not DB_PATH:
+    """Create and return a connection to the current property's database."""
+    db_path = current_db_path()
+    if not db_path:
         raise ValueError("Database path not set. Please check SQLITE_DB_PATH in your .env file.")
-    return sqlite3.connect(DB_PATH)
+    return sqlite3.connect(db_path)
+
+def get_write_generation() -> int:
+    """Return a counter that increases every time run_query commits a write."""
+    return _write_generation
+
+def bump_write_generation() -> int:
+    """Record that the database changed and return the new generation."""
+    global _write_generation
+    with _write_generation_lock:
+        _write_generation += 1
+        return _write_generation
+
+def get_db_generation() -> str:
+    """Return a token that changes whenever anything commits to the database.
+
+    Combines this process's write generation with PRAGMA data_version on a
+    connection that never writes, so commits from other connections and
+    processes change the token too.
+    """
+    db_path = current_db_path()
+    if not db_path:
+        raise ValueError("Database path not set. Please check SQLITE_DB_PATH in your .env file.")
+    with _data_version_lock:
+        conn = _data_version_conns.get(db_path)
+        if conn is None:
+            conn = _data_version_conns[db_path] = sqlite3.connect(db_path, check_same_thread=False)
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+    return f"{_INSTANCE_ID}.{data_version}.{_write_generation}"
+
+def _get_read_pool() -> "queue.LifoQueue[sqlite3.Connection]":
+    """Return the idle read connection pool for the current property's database."""
+    db_path = current_db_path()
+    with _read_pools_lock:
+        pool = _read_pools.get(db_path)
+        if pool is None:
+            pool = _read_pools[db_path] = queue.LifoQueue(maxsize=READ_POOL_SIZE)
+        return pool
+
+def acquire_read_connection() -> sqlite3.Connection:
+    """Take an idle read-only connection from the pool, opening one if none is free."""
+    db_path = current_db_path()
+    if not db_path:
+        raise ValueError("Database path not set. Please check SQLITE_DB_PATH in your .env file.")
+    try:
+        return _get_read_pool().get_nowait()
+    except queue.Empty:
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        # The views live in the temp schema, which query_only also protects
+        _attach_archive(conn)
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+def release_read_connection(conn: sqlite3.Connection) -> None:
+    """Return a read connection to the pool, closing it if the pool is full."""
+    if conn.in_transaction:
+        conn.rollback()
+    try:
+        _get_read_pool().put_nowait(conn)
+    except queue.Full:
+        conn.close()
+
+def close_read_connections() -> None:
+    """Close every pooled read connection."""
+    with _read_pools_lock:
+        pools = list(_read_pools.values())
+        _read_pools.clear()
+    for pool in pools:
+        while True:
+            try:
+                pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+@contextmanager
+def shared_connection(transaction: bool = False, read_only: bool = False) -> Iterator[sqlite3.Connection]:
+    """Run every run_query call made inside the block on one connection.
+
+    Args:
+        transaction: Keep all writes in one transaction that commits when the block
+            exits and rolls back if it raises. Change events are held until the commit.
+        read_only: Use a pooled read-only connection and read from one snapshot.
+            The block must not write.
+    """
+    if _shared_connection.get() is not None:
+        # Already inside a shared connection; keep using it
+        yield _shared_connection.get().conn
+        return
+    if read_only:
+        conn = acquire_read_connection()
+    else:
+        # Batches can mix writes with historical reads, which need the archive views
+        conn = get_db_connection()
+        _attach_archive(conn)
+    transactional = transaction and not read_only
+    token = _shared_connection.set(_SharedConnection(conn, transactional))
+    try:
+        if read_only:
+            conn.execute("BEGIN")
+            yield conn
+        elif transactional:
+            # Take the write lock up front so a later write can't fail to upgrade
+            conn.execute("BEGIN IMMEDIATE")
+            with hold_events():
+                yield conn
+                conn.commit()
+                bump_write_generation()
+        else:
+            yield conn
+    except BaseException:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    finally:
+        _shared_connection.reset(token)
+        if read_only:
+            release_read_connection(conn)
+        else:
+            conn.close()
 
-def run_query(query: str, params: tuple = ()) -> List[Dict[str, Any]]:
+def run_query(query: str, params: Union[tuple, Dict[str, Any]] = ()) -> List[Dict[str, Any]]:
     """
     Execute a SQL query with parameterized inputs and return the results.
     
@@ -26,42 +267,492 @@ def run_query(query: str, params: tuple = ()) -> List[Dict[str, Any]]:
     Returns:
         List of dictionaries representing the query results
     """
+    statement = tracing.sql_span(query)
+    if statement is None:
+        return _execute_query(query, params)
+    result = _execute_query(query, params)
+    tracing.end_sql_span(statement, result)
+    return result
+
+def _execute_query(query: str, params: Union[tuple, Dict[str, Any]]) -> List[Dict[str, Any]]:
     conn = None
+    is_read = query.strip().lower().startswith(("select", "pragma"))
+    shared = _shared_connection.get()
+    if not is_read and shared is None and WRITE_GROUP_COMMIT:
+        return _run_grouped_write(query, params)
     try:
-        conn = get_db_connection()
+        # Reads share pooled connections; writes get their own connection
+        if shared is not None:
+            conn = shared.conn
+        else:
+            conn = acquire_read_connection() if is_read else get_db_connection()
         cursor = conn.cursor()
         cursor.execute(query, params)
         
-        # For SELECT queries, fetch and return results
-        if query.strip().lower().startswith("select") or query.strip().lower().startswith("pragma"):
-            rows = cursor.fetchall()
+        # For SELECT queries, fetch and return results; iterating the cursor
+        # drops each tuple once its dict is built instead of holding them all
+        if is_read:
             if cursor.description:  # Check if there are any results to process
                 columns = [description[0] for description in cursor.description]
-                return [dict(zip(columns, row)) for row in rows]
+                return [dict(zip(columns, row)) for row in cursor]
+            cursor.fetchall()
             return []
         
         # For other queries, commit changes and return affected row count
-        conn.commit()
-        # For other queries, commit changes and return useful information
-        if query.strip().lower().startswith("insert"):
-            last_id = cursor.lastrowid
-            table_name = query.split("INTO")[1].split("(")[0].strip() if "INTO" in query else "unknown"
-            id_field = f"{table_name[:-1] if table_name.endswith('s') else table_name}ID"
-            return [{"success": True, "affected_rows": cursor.rowcount, id_field: last_id}]
-        else:
-            return [{"success": True, "affected_rows": cursor.rowcount}]
+        # (a shared transaction commits once, when it ends)
+        if shared is None or not shared.transactional:
+            conn.commit()
+            bump_write_generation()
+        return _write_result(query, cursor.lastrowid, cursor.rowcount)
         
     except sqlite3.Error as e:
-        if conn:
+        if conn and shared is None:
             conn.rollback()
         return [{"error": f"Database error: {str(e)}"}]
     except Exception as e:
-        if conn:
+        if conn and shared is None:
             conn.rollback()
         return [{"error": f"Unexpected error: {str(e)}"}]
     finally:
-        if conn:
-            conn.close()
+        if conn and shared is None:
+            if is_read:
+                release_read_connection(conn)
+            else:
+                conn.close()
+
+def _write_result(query: str, last_id: Optional[int], rowcount: int) -> List[Dict[str, Any]]:
+    """Describe a committed write the way run_query reports it."""
+    if query.strip().lower().startswith("insert"):
+        table_name = query.split("INTO")[1].split("(")[0].strip() if "INTO" in query else "unknown"
+        id_field = f"{table_name[:-1] if table_name.endswith('s') else table_name}ID"
+        return [{"success": True, "affected_rows": rowcount, id_field: last_id}]
+    return [{"success": True, "affected_rows": rowcount}]
+
+def _run_grouped_write(query: str, params: Union[tuple, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Run a write on the database's writer thread and wait for its group to commit."""
+    db_path = current_db_path()
+    if not db_path:
+        return [{"error": "Unexpected error: Database path not set. Please check SQLITE_DB_PATH in your .env file."}]
+
+    def write(conn: sqlite3.Connection):
+        cursor = conn.execute(query, params)
+        return cursor.lastrowid, cursor.rowcount
+
+    try:
+        last_id, rowcount = writer_for(db_path, bump_write_generation).execute(write)
+    except sqlite3.Error as e:
+        return [{"error": f"Database error: {str(e)}"}]
+    except Exception as e:
+        return [{"error": f"Unexpected error: {str(e)}"}]
+    return _write_result(query, last_id, rowcount)
+
+def run_query_columnar(query: str, params: Union[tuple, Dict[str, Any]] = ()) -> Dict[str, Any]:
+    """
+    Execute a read query and return the result as {"columns": [...], "rows": [[...], ...]}.
+
+    Rows are the cursor's tuples, so no per-row dict is built and column names
+    appear once. When a column name repeats (e.g. b.* plus r.RoomID), the last
+    one wins, as in run_query.
+
+    Args:
+        query: SELECT query with parameter placeholders
+        params: Parameter values to substitute in the query
+
+    Returns:
+        Columns and rows, or {"error": ...}
+    """
+    shared = _shared_connection.get()
+    conn = shared.conn if shared is not None else acquire_read_connection()
+    try:
+        cursor = conn.execute(query, params)
+        columns, project = _unique_columns([description[0] for description in cursor.description or ()])
+        rows = cursor.fetchall() if project is None else [project(row) for row in cursor]
+    except sqlite3.Error as e:
+        return {"error": f"Database error: {str(e)}"}
+    finally:
+        if shared is None:
+            release_read_connection(conn)
+    return {"columns": columns, "rows": rows}
+
+def _unique_columns(columns: List[str]) -> Tuple[List[str], Optional[Callable[[tuple], tuple]]]:
+    """Keep the last of each repeated column name; returns the names and a row projection, or None if none repeat."""
+    last = {name: index for index, name in enumerate(columns)}
+    if len(last) == len(columns):
+        return columns, None
+    keep = sorted(last.values())
+    if len(keep) == 1:
+        return [columns[keep[0]]], lambda row: (row[keep[0]],)
+    return [columns[index] for index in keep], operator.itemgetter(*keep)
+
+# Rows fetched per batch by iter_query
+QUERY_FETCH_ROWS = int(os.getenv("QUERY_FETCH_ROWS", "1000"))
+
+class RowIterator:
+    """Rows of a read query as tuples, fetched QUERY_FETCH_ROWS at a time.
+
+    Only the current batch is held in memory and every row shares the column
+    names in `columns`. The read connection is returned to the pool when the
+    rows run out or on close(), so callers that may stop early should use it
+    as a context manager.
+    """
+
+    __slots__ = ("columns", "batch_size", "_cursor", "_conn", "_shared", "_span", "_count")
+
+    def __init__(self, query: str, params: Union[tuple, Dict[str, Any]], batch_size: int):
+        shared = _shared_connection.get()
+        self._shared = shared is not None
+        self._conn = shared.conn if shared is not None else acquire_read_connection()
+        self._span = tracing.sql_span(query)
+        self._count = 0
+        self.batch_size = batch_size
+        try:
+            self._cursor = self._conn.execute(query, params)
+        except BaseException:
+            self._cursor = None
+            self.close()
+            raise
+        self.columns = [description[0] for description in self._cursor.description or ()]
+
+    def batches(self, unique_columns: bool = False) -> Iterator[List[tuple]]:
+        """Yield the rows in lists of up to batch_size, closing when done.
+
+        With unique_columns, rows are cut to unique_column_names(), as in run_query_columnar.
+        """
+        project = _unique_columns(self.columns)[1] if unique_columns else None
+        try:
+            while self._cursor is not None:
+                rows = self._cursor.fetchmany(self.batch_size)
+                if not rows:
+                    break
+                self._count += len(rows)
+                yield rows if project is None else [project(row) for row in rows]
+        except sqlite3.Error as e:
+            if self._span is not None:
+                self._span.fail(f"Database error: {str(e)}")
+            raise
+        finally:
+            self.close()
+
+    def unique_column_names(self) -> List[str]:
+        return _unique_columns(self.columns)[0]
+
+    def __iter__(self) -> Iterator[tuple]:
+        for rows in self.batches():
+            yield from rows
+
+    def dicts(self) -> Iterator[Dict[str, Any]]:
+        """Yield each row as a dict, the way run_query returns it."""
+        columns = self.columns
+        for row in self:
+            yield dict(zip(columns, row))
+
+    def records(self, record_class: Callable[..., Any]) -> Iterator[Any]:
+        """Yield record_class(*row) for each row; its fields must follow the SELECT order."""
+        for row in self:
+            yield record_class(*row)
+
+    def close(self) -> None:
+        if self._conn is None:
+            return
+        conn, self._conn, self._cursor = self._conn, None, None
+        if not self._shared:
+            release_read_connection(conn)
+        if self._span is not None:
+            self._span.set("db.response.returned_rows", self._count)
+            self._span.end()
+
+    def __enter__(self) -> "RowIterator":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+def iter_query(query: str, params: Union[tuple, Dict[str, Any]] = (),
+               batch_size: int = QUERY_FETCH_ROWS) -> RowIterator:
+    """
+    Execute a read query and return its rows lazily, for results too large to hold as dicts.
+
+    Args:
+        query: SELECT query with parameter placeholders
+        params: Parameter values to substitute in the query
+        batch_size: Rows fetched from SQLite at a time
+
+    Returns:
+        A RowIterator over the rows as tuples
+
+    Raises:
+        sqlite3.Error: If the query fails to start; later fetch errors raise while iterating
+        ValueError: If no database path is set
+    """
+    return RowIterator(query, params, batch_size)
+
+class PagedQuery(NamedTuple):
+    """A bulk read split into short reads, for iter_pages.
+
+    Keyset form: query gets :limit and one :keyN parameter per key column,
+    holding the keys of the last row of the previous page (start for the first
+    page), and returns the rows after them in key order, key columns included.
+
+    Id-list form, for filters no index can seek: ids_query returns the ids of
+    every matching row in result order, read in one pass, and query returns
+    the rows whose id_column is in :ids (a JSON list), in any order.
+    """
+    query: str
+    key_columns: Tuple[str, ...] = ()
+    start: Tuple[Any, ...] = ()
+    ids_query: Optional[str] = None
+    id_column: str = ""
+
+class PagedRowIterator(RowIterator):
+    """Rows of a PagedQuery, read one complete page at a time.
+
+    The databases use a rollback journal, where an open cursor holds a shared
+    lock that blocks every writer. Each page is therefore fetched whole and its
+    connection returned before the page is yielded, so a slow consumer (a client
+    downloading a stream) holds no lock. Each page reads its own snapshot.
+    """
+
+    __slots__ = ("_paged", "_params", "_property", "_after", "_ids", "_position", "_page")
+
+    def __init__(self, paged: PagedQuery, params: Dict[str, Any], batch_size: int):
+        self._paged, self._params = paged, dict(params)
+        # Later pages are read from the generator's thread, outside the request's property scope
+        self._property = current_property.get()
+        self._after, self._ids, self._position = paged.start, None, 0
+        self._shared, self._conn, self._cursor = False, None, None
+        self._span = tracing.sql_span(paged.query)
+        self._count = 0
+        self.batch_size = batch_size
+        self.columns: List[str] = []
+        try:
+            if paged.ids_query is not None:
+                self._ids = array("q", (row[0] for row in self._read(paged.ids_query, self._params)))
+            self._page = self._read_page()
+        except BaseException:
+            self.close()
+            raise
+
+    def _read(self, query: str, params: Dict[str, Any]) -> List[tuple]:
+        with use_property(self._property):
+            conn = acquire_read_connection()
+            try:
+                cursor = conn.execute(query, params)
+                self.columns = [description[0] for description in cursor.description]
+                return cursor.fetchall()
+            finally:
+                release_read_connection(conn)
+
+    def _read_page(self) -> Optional[List[tuple]]:
+        """Return the next page, or None after the last one."""
+        paged = self._paged
+        if self._ids is None:
+            if self._after is None:
+                return None
+            rows = self._read(paged.query, {**self._params, "limit": self.batch_size,
+                                            **{f"key{index}": value for index, value in enumerate(self._after)}})
+            if len(rows) < self.batch_size:
+                self._after = None
+            elif rows:
+                key_index = [self.columns.index(column) for column in paged.key_columns]
+                self._after = tuple(rows[-1][index] for index in key_index)
+            return rows or None
+        if self._position >= len(self._ids):
+            return None
+        ids = self._ids[self._position:self._position + self.batch_size]
+        self._position += len(ids)
+        rows = self._read(paged.query, {**self._params, "ids": json.dumps(ids.tolist())})
+        order = {row_id: index for index, row_id in enumerate(ids)}
+        id_index = self.columns.index(paged.id_column)
+        # Rows deleted since the ids were read are skipped
+        rows.sort(key=lambda row: order[row[id_index]])
+        return rows
+
+    def batches(self, unique_columns: bool = False) -> Iterator[List[tuple]]:
+        """Yield the rows a page at a time, closing when done.
+
+        With unique_columns, rows are cut to unique_column_names(), as in run_query_columnar.
+        """
+        try:
+            page, self._page = self._page, None
+            project = _unique_columns(self.columns)[1] if unique_columns else None
+            while page is not None:
+                if page:
+                    self._count += len(page)
+                    yield page if project is None else [project(row) for row in page]
+                page = self._read_page()
+        except sqlite3.Error as e:
+            if self._span is not None:
+                self._span.fail(f"Database error: {str(e)}")
+            raise
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        span, self._span, self._page, self._ids = self._span, None, None, None
+        if span is not None:
+            span.set("db.response.returned_rows", self._count)
+            span.end()
+
+# Start key below every INTEGER PRIMARY KEY
+_FIRST_ID = -(1 << 63)
+
+# Paged forms of the bulk reads, returning the same rows in the same order
+ALL_CUSTOMERS_PAGES = PagedQuery(
+    "SELECT * FROM Customers WHERE CustomerID > :key0 ORDER BY CustomerID LIMIT :limit", ("CustomerID",), (_FIRST_ID,))
+ALL_ROOMS_PAGES = PagedQuery(
+    "SELECT * FROM Rooms WHERE RoomID > :key0 ORDER BY RoomID LIMIT :limit", ("RoomID",), (_FIRST_ID,))
+ALL_PAYMENTS_PAGES = PagedQuery(
+    "SELECT * FROM Pricing WHERE PaymentID > :key0 ORDER BY PaymentID LIMIT :limit", ("PaymentID",), (_FIRST_ID,))
+ALL_BOOKINGS_PAGES = PagedQuery("""
+SELECT 
+    b.*, 
+    r.RoomID, r.type as room_type, r.price as room_price
+FROM Bookings b
+LEFT JOIN Rooms r ON r.RoomID = b.RoomID
+WHERE b.BookingsID > :key0
+ORDER BY b.BookingsID
+LIMIT :limit
+""", ("BookingsID",), (_FIRST_ID,))
+# The date filter can't use an index, so the matching ids are read once, in order
+BOOKINGS_BY_DATE_RANGE_PAGES = PagedQuery(
+    """
+SELECT 
+    b.BookingsID, b.arrivalDate, b.departureDay,
+    c.FirstName, c.LastName,
+    r.RoomID, r.type as room_type,
+    b.price, b.discount, b.PaymentType, b.isDone as payment_completed,
+    JULIANDAY(b.departureDay) - JULIANDAY(b.arrivalDate) as stay_duration
+FROM AllBookingPayments b
+JOIN Customers c ON b.customerID = c.CustomerID
+LEFT JOIN Rooms r ON r.RoomID = b.RoomID
+WHERE b.BookingsID IN (SELECT value FROM json_each(:ids))
+""",
+    ids_query="""
+SELECT b.BookingsID
+FROM AllBookingPayments b
+JOIN Customers c ON b.customerID = c.CustomerID
+WHERE 
+    (b.arrivalDate BETWEEN :start AND :end) OR
+    (b.departureDay BETWEEN :start AND :end) OR
+    (b.arrivalDate <= :start AND b.departureDay >= :end)
+ORDER BY b.arrivalDate
+""", id_column="BookingsID")
+
+def iter_pages(paged: PagedQuery, params: Optional[Dict[str, Any]] = None,
+               batch_size: int = QUERY_FETCH_ROWS) -> PagedRowIterator:
+    """
+    Read a large result in short reads, holding no lock between pages.
+
+    For streams to clients, where iter_query's open cursor would block writers
+    for the whole download.
+
+    Args:
+        paged: The paged form of the read, e.g. ALL_BOOKINGS_PAGES
+        params: Parameter values for the query besides the keys, ids and :limit
+        batch_size: Rows per page
+
+    Returns:
+        A PagedRowIterator over the rows as tuples
+
+    Raises:
+        sqlite3.Error: If the first read fails; later pages raise while iterating
+        ValueError: If no database path is set
+    """
+    return PagedRowIterator(paged, params or {}, batch_size)
+
+def _fetch_row(query: str, params: tuple) -> Optional[Dict[str, Any]]:
+    """Return the first row of a query, or None if there is none or it failed."""
+    rows = run_query(query, params)
+    return rows[0] if rows and "error" not in rows[0] else None
+
+# Row shapes sent with change events, matching the /all-* endpoints
+_BOOKING_ROW_QUERY = """
+SELECT 
+    b.*, 
+    r.RoomID, r.type as room_type, r.price as room_price
+FROM Bookings b
+LEFT JOIN Rooms r ON r.RoomID = b.RoomID
+WHERE b.BookingsID = ?
+"""
+_ROOM_ROW_QUERY = "SELECT * FROM Rooms WHERE RoomID = ?"
+_CUSTOMER_ROW_QUERY = "SELECT * FROM Customers WHERE CustomerID = ?"
+_PAYMENT_ROW_QUERY = "SELECT * FROM Pricing WHERE PaymentID = ?"
+
+def _publish_row(event_type: str, query: str, row_id: Any) -> None:
+    """Publish a change event carrying the current version of a row."""
+    row = _fetch_row(query, (row_id,))
+    if row is not None:
+        publish_event(event_type, row)
+
+# Queries behind the bulk listing tools, shared with the columnar API responses
+ALL_CUSTOMERS_QUERY = "SELECT * FROM Customers"
+ALL_ROOMS_QUERY = "SELECT * FROM Rooms"
+ALL_PAYMENTS_QUERY = "SELECT * FROM Pricing"
+ALL_BOOKINGS_QUERY = """
+SELECT 
+    b.*, 
+    r.RoomID, r.type as room_type, r.price as room_price
+FROM Bookings b
+LEFT JOIN Rooms r ON r.RoomID = b.RoomID
+"""
+BOOKINGS_BY_DATE_RANGE_QUERY = """
+SELECT 
+    b.BookingsID, b.arrivalDate, b.departureDay,
+    c.FirstName, c.LastName,
+    r.RoomID, r.type as room_type,
+    b.price, b.discount, b.PaymentType, b.isDone as payment_completed,
+    JULIANDAY(b.departureDay) - JULIANDAY(b.arrivalDate) as stay_duration
+FROM AllBookingPayments b
+JOIN Customers c ON b.customerID = c.CustomerID
+LEFT JOIN Rooms r ON r.RoomID = b.RoomID
+WHERE 
+    (b.arrivalDate BETWEEN :start AND :end) OR
+    (b.departureDay BETWEEN :start AND :end) OR
+    (b.arrivalDate <= :start AND b.departureDay >= :end)
+ORDER BY b.arrivalDate
+"""
+
+def _analytics_report(name: str, *args: Any) -> Any:
+    """Run a report on the analytics snapshot, or return None to run the SQL version.
+
+    Inside a shared connection the SQL version runs, so the report sees the
+    batch's uncommitted writes.
+    """
+    if ANALYTICS_BACKEND != "numpy" or _shared_connection.get() is not None:
+        return None
+    import analytics  # only loaded, with numpy, when the backend is enabled
+    try:
+        return getattr(analytics, name)(*args)
+    except (ValueError, sqlite3.Error) as e:
+        return {"error": f"Analytics error: {str(e)}"}
+
+# Set by workers.start_pool in the API process; the heavy reports then run in worker processes
+report_pool: Optional[Any] = None
+
+def _pooled_report(tool_name: str, args: Dict[str, Any]) -> Any:
+    """Run a report tool on the worker pool, or return None to run it in this process.
+
+    Inside a shared connection it runs here, so the report sees the batch's
+    uncommitted writes.
+    """
+    pool = report_pool
+    if pool is None or _shared_connection.get() is not None:
+        return None
+    try:
+        return pool.run(tool_name, args)
+    except RuntimeError as e:
+        return [{"error": f"Report worker error: {str(e)}"}]
+
+def _room_state() -> Any:
+    """Return the in-memory room state (occupancy.py), or None to read the Rooms table.
+
+    Inside a shared connection the table is read, so the batch's uncommitted
+    writes are seen.
+    """
+    if _shared_connection.get() is not None:
+        return None
+    import occupancy  # imports tools
+    return occupancy.get_state()
 
 def validate_table_name(table_name: str) -> bool:
     """
@@ -95,16 +786,15 @@ def read_records(table: str, condition: str = "", limit: int = 5) -> List[Dict[s
     # Use parameterized query for the limit
     query = f"SELECT * FROM {table}"
     if condition:
-        # Note: Conditions are still vulnerable to SQL injection
-        # In a production environment, you should parse and validate conditions
+        # The condition is raw SQL, so it only ever runs on a read-only sandbox connection
         query += f" WHERE {condition}"
     
     query += " LIMIT ?"
-    return run_query(query, (limit,))
+    return run_sandboxed_query(current_db_path(), query, (limit,))
 
 @tool
 def describe_table(table: str) -> List[Dict[str, Any]]:
-    """Get table structure and columns.
+    """Get table structure: columns, types, primary key, foreign keys and indexes.
 
     Args:
         table: Table name to describe.
@@ -114,9 +804,16 @@ def describe_table(table: str) -> List[Dict[str, Any]]:
     """
     if not validate_table_name(table):
         return [{"error": "Invalid table name"}]
-        
-    query = "desc table " + table
-    return run_query(query, (table,))
+    
+    try:
+        info = catalog.describe(current_db_path(), table)
+        if info is None:
+            return [{"error": f"Table {table} does not exist. Available tables: {', '.join(catalog.table_names(current_db_path()))}"}]
+    except sqlite3.Error as e:
+        return [{"error": f"Database error: {str(e)}"}]
+    except ValueError as e:
+        return [{"error": str(e)}]
+    return [info]
 
 @tool
 def custom_query(query: str) -> List[Dict[str, Any]]:
@@ -134,7 +831,8 @@ def custom_query(query: str) -> List[Dict[str, Any]]:
     if not query.lower().startswith("select"):
         return [{"error": "Only SELECT queries are allowed for security reasons"}]
     
-    return run_query(query, ())
+    # Read-only connection with time, row and size limits
+    return run_sandboxed_query(current_db_path(), query, ())
 
 # Specialized hotel management tools
 
@@ -148,6 +846,9 @@ def get_vacant_rooms(room_type: Optional[str] = None) -> List[Dict[str, Any]]:
     Returns:
         List of vacant rooms
     """
+    state = _room_state()
+    if state is not None:
+        return state.vacant_rooms(room_type or None)
     if room_type:
         query = "SELECT * FROM Rooms WHERE isVacant = 1 AND type = ?"
         return run_query(query, (room_type,))
@@ -219,7 +920,7 @@ def get_frequent_customers(min_bookings: int = 2) -> List[Dict[str, Any]]:
     query = """
     SELECT c.CustomerID, c.FirstName, c.LastName, COUNT(b.BookingsID) as booking_count
     FROM Customers c
-    JOIN Bookings b ON c.CustomerID = b.customerID
+    JOIN AllBookings b ON c.CustomerID = b.customerID
     GROUP BY c.CustomerID
     HAVING booking_count >= ?
     ORDER BY booking_count DESC
@@ -233,6 +934,9 @@ def get_room_occupancy_stats() -> List[Dict[str, Any]]:
     Returns:
         Room occupancy statistics grouped by room type
     """
+    state = _room_state()
+    if state is not None:
+        return state.occupancy_by_type()
     query = """
     SELECT 
         type, 
@@ -252,6 +956,9 @@ def get_current_stays() -> List[Dict[str, Any]]:
     Returns:
         List of current stays with detailed information
     """
+    state = _room_state()
+    if state is not None:
+        return state.current_stays()
     query = """
     SELECT
         r.*, 
@@ -275,17 +982,23 @@ def get_revenue_by_room_type(start_date: str = "", end_date: str = "") -> List[D
     Returns:
         Revenue statistics grouped by room type
     """
+    # The in-process snapshot answers faster than a worker could, and workers would each load their own
+    report = _analytics_report("revenue_by_room_type", start_date, end_date)
+    if report is not None:
+        return report if isinstance(report, list) else [report]
+    pooled = _pooled_report("get_revenue_by_room_type", {"start_date": start_date, "end_date": end_date})
+    if pooled is not None:
+        return pooled
     # Validate date format
     params = []
     query = """
     SELECT 
         r.type, 
         COUNT(DISTINCT b.BookingsID) as booking_count,
-        SUM(p.price * (1 - p.discount/100.0)) as total_revenue,
-        AVG(p.price * (1 - p.discount/100.0)) as avg_revenue_per_booking
-    FROM Bookings b
+        SUM(b.price * (1 - b.discount/100.0)) as total_revenue,
+        AVG(b.price * (1 - b.discount/100.0)) as avg_revenue_per_booking
+    FROM AllBookingPayments b
     JOIN Rooms r ON r.RoomID = b.RoomID
-    JOIN Pricing p ON b.paymentID = p.PaymentID
     WHERE 1=1
     """
     
@@ -300,6 +1013,31 @@ def get_revenue_by_room_type(start_date: str = "", end_date: str = "") -> List[D
     query += " GROUP BY r.type"
     return run_query(query, tuple(params))
 
+@tool
+def get_revenue_time_series(start_date: str = "", end_date: str = "", granularity: str = "month",
+                            room_type: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Get revenue, ADR and RevPAR per room type by day, week or month, splitting each stay's price over its nights.
+
+    Args:
+        start_date: First night in format 'YYYY-MM-DD' (default: 364 days before end_date)
+        end_date: Last night in format 'YYYY-MM-DD' (default: today)
+        granularity: "day", "week" or "month"
+        room_type: Only this room type ('2BHK' or '3BHK')
+
+    Returns:
+        One row per period and room type with revenue, room_nights,
+        available_room_nights, occupancy_rate, adr and revpar
+    """
+    args = {"start_date": start_date, "end_date": end_date, "granularity": granularity, "room_type": room_type}
+    pooled = _pooled_report("get_revenue_time_series", args)
+    if pooled is not None:
+        return pooled
+    import revenue  # imports this module, so it can't be imported at the top
+    try:
+        return revenue.revenue_time_series(**args)
+    except (ValueError, sqlite3.Error) as e:
+        return [{"error": f"Revenue report error: {str(e)}"}]
+
 @tool
 def get_customer_bookings(customer_id: int = 0, name: str = "") -> List[Dict[str, Any]]:
     """Get all bookings for a specific customer by ID or name.
@@ -319,16 +1057,16 @@ def get_customer_bookings(customer_id: int = 0, name: str = "") -> List[Dict[str
         c.CustomerID, c.FirstName, c.LastName,
         b.BookingsID, b.bookedDate, b.arrivalDate, b.departureDay,
         r.RoomID, r.type,
-        p.price, p.discount, p.PaymentType, p.isDone
+        b.price, b.discount, b.PaymentType, b.isDone
     FROM Customers c
-    JOIN Bookings b ON c.CustomerID = b.customerID
+    JOIN AllBookingPayments b ON c.CustomerID = b.customerID
     LEFT JOIN Rooms r ON r.RoomID = b.RoomID
-    JOIN Pricing p ON b.paymentID = p.PaymentID
     """
     
     params = []
     if customer_id:
-        query += " WHERE c.CustomerID = ?"
+        # Filter on the bookings side so it reaches both halves of the view
+        query += " WHERE b.customerID = ?"
         params.append(customer_id)
     else:
         query += " WHERE c.FirstName LIKE ? OR c.LastName LIKE ?"
@@ -347,7 +1085,10 @@ def add_customer(first_name: str, last_name: str, dob: str, identity_type: str,
     INSERT INTO Customers (FirstName, LastName, DOB, IdentityType, IdentityString)
     VALUES (?, ?, ?, ?, ?)
     """
-    return run_query(query, (first_name, last_name, dob, identity_type, identity_string))
+    result = run_query(query, (first_name, last_name, dob, identity_type, identity_string))
+    if "error" not in result[0]:
+        _publish_row("customer.created", _CUSTOMER_ROW_QUERY, result[0]["CustomerID"])
+    return result
 
 @tool
 def add_payment(payment_type: str, price: float, discount: float = 0.0, is_done: bool = False) -> List[Dict[str, Any]]:
@@ -356,7 +1097,10 @@ def add_payment(payment_type: str, price: float, discount: float = 0.0, is_done:
     INSERT INTO Pricing (PaymentType, isDone, price, discount)
     VALUES (?, ?, ?, ?)
     """
-    return run_query(query, (payment_type, int(is_done), price, discount))
+    result = run_query(query, (payment_type, int(is_done), price, discount))
+    if "error" not in result[0]:
+        _publish_row("payment.created", _PAYMENT_ROW_QUERY, result[0]["PricingID"])
+    return result
 
 @tool
 def book_room(customer_id: int, room_id: int, arrival_date: str, departure_day: str, payment_id: int) -> List[Dict[str, Any]]:
@@ -384,6 +1128,7 @@ def book_room(customer_id: int, room_id: int, arrival_date: str, departure_day:
     if "error" in result[0]:
         return result
     booking_id = result[0].get("BookingID", None)
+    _publish_row("booking.created", _BOOKING_ROW_QUERY, booking_id)
     return [{"booking_id": booking_id}]
 
 @tool
@@ -418,13 +1163,374 @@ def check_in_guest(room_id: int, booking_id: int) -> List[Dict[str, Any]]:
     # All checks passed, perform check-in
     update_room = run_query("UPDATE Rooms SET isVacant = 0, currentStay = ? WHERE RoomID = ?", (booking_id, room_id))
     update_booking = run_query("UPDATE Bookings SET RoomID = ? WHERE BookingsID = ?", (room_id, booking_id))
+    if update_room[0].get("affected_rows"):
+        _publish_row("room.occupied", _ROOM_ROW_QUERY, room_id)
+    if update_booking[0].get("affected_rows"):
+        _publish_row("booking.updated", _BOOKING_ROW_QUERY, booking_id)
     return [{"room_update": update_room[0], "booking_update": update_booking[0]}]
 
 @tool
 def checkout_guest(room_id: int) -> List[Dict[str, Any]]:
     """Check out a guest by marking room as vacant and clearing currentStay."""
     query = "UPDATE Rooms SET isVacant = 1, currentStay = NULL WHERE RoomID = ?"
-    return run_query(query, (room_id,))
+    result = run_query(query, (room_id,))
+    if result[0].get("affected_rows"):
+        _publish_row("room.vacated", _ROOM_ROW_QUERY, room_id)
+    return result
+
+# Rooms are numbered floor first (101, 102, ..., 2101), so a room's floor is RoomID / 100
+_GROUP_FILTERS = "(:floor IS NULL OR r.RoomID / 100 = :floor) AND (:room_type IS NULL OR r.type = :room_type)"
+
+# Bookings arriving on a date whose room doesn't hold them yet
+_GROUP_ARRIVALS_QUERY = f"""
+SELECT b.RoomID AS room_id, b.BookingsID AS booking_id
+FROM Bookings b
+JOIN Rooms r ON r.RoomID = b.RoomID
+WHERE b.arrivalDate = :date AND r.currentStay IS NOT b.BookingsID AND {_GROUP_FILTERS}
+ORDER BY b.RoomID, b.BookingsID
+"""
+
+# Occupied rooms whose current stay departs on a date
+_GROUP_DEPARTURES_QUERY = f"""
+SELECT r.RoomID AS room_id
+FROM Rooms r
+JOIN Bookings b ON b.BookingsID = r.currentStay
+WHERE r.isVacant = 0 AND b.departureDay = :date AND {_GROUP_FILTERS}
+ORDER BY r.RoomID
+"""
+
+# Everything check_in_guest checks, for every (room, booking) pair at once
+_GROUP_CHECK_IN_QUERY = """
+SELECT
+    i.room_id, i.booking_id,
+    r.RoomID IS NOT NULL AS room_found, r.isVacant,
+    b.BookingsID IS NOT NULL AS booking_found, b.arrivalDate, b.departureDay,
+    s.RoomID AS assigned_room,
+    date('now') AS today
+FROM (
+    SELECT key AS position, json_extract(value, '$[0]') AS room_id, json_extract(value, '$[1]') AS booking_id
+    FROM json_each(?)
+) i
+LEFT JOIN Rooms r ON r.RoomID = i.room_id
+LEFT JOIN Bookings b ON b.BookingsID = i.booking_id
+-- Rooms.currentStay has no index; one pass over Rooms beats a lookup per pair
+LEFT JOIN (
+    SELECT currentStay, MIN(RoomID) AS RoomID FROM Rooms WHERE currentStay IS NOT NULL GROUP BY currentStay
+) s ON s.currentStay = i.booking_id
+ORDER BY i.position
+"""
+
+_GROUP_CHECKOUT_QUERY = """
+SELECT i.value AS room_id, r.RoomID IS NOT NULL AS room_found, r.isVacant, r.currentStay
+FROM json_each(?) i
+LEFT JOIN Rooms r ON r.RoomID = i.value
+ORDER BY i.key
+"""
+
+_GROUP_ROOM_ROWS_QUERY = "SELECT * FROM Rooms WHERE RoomID IN (SELECT value FROM json_each(?))"
+_GROUP_BOOKING_ROWS_QUERY = """
+SELECT
+    b.*,
+    r.RoomID, r.type as room_type, r.price as room_price
+FROM Bookings b
+LEFT JOIN Rooms r ON r.RoomID = b.RoomID
+WHERE b.BookingsID IN (SELECT value FROM json_each(?))
+"""
+
+def _group_check_in_errors(rows: List[Dict[str, Any]]) -> List[Optional[str]]:
+    """Apply check_in_guest's rules to each validated pair, plus no room or booking twice."""
+    errors: List[Optional[str]] = []
+    rooms_taken, bookings_taken = set(), set()
+    for row in rows:
+        room_id, booking_id = row["room_id"], row["booking_id"]
+        if not row["room_found"]:
+            error = "Room not found"
+        elif row["isVacant"] == 0:
+            error = "Room is already occupied"
+        elif room_id in rooms_taken:
+            error = "Room is already taken by another booking in this group"
+        elif not row["booking_found"]:
+            error = "Booking not found"
+        elif row["assigned_room"] is not None:
+            error = "Booking is already assigned to another room (RoomID: %s)" % row["assigned_room"]
+        elif booking_id in bookings_taken:
+            error = "Booking appears more than once in this group"
+        elif not (row["arrivalDate"] <= row["today"] <= row["departureDay"]):
+            error = (f"Booking is not valid for today (today: {row['today']}, "
+                     f"arrival: {row['arrivalDate']}, departure: {row['departureDay']})")
+        else:
+            error = None
+            rooms_taken.add(room_id)
+            bookings_taken.add(booking_id)
+        errors.append(error)
+    return errors
+
+def _commit_group(conn: sqlite3.Connection) -> None:
+    """Commit updates made directly on the shared connection unless an enclosing transaction will."""
+    shared = _shared_connection.get()
+    if not shared.transactional:
+        conn.commit()
+        bump_write_generation()
+
+@tool
+def group_check_in(pairs: Optional[List[List[int]]] = None, arrival_date: str = "",
+                   floor: Optional[int] = None, room_type: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Check in a whole group at once, e.g. a tour or a wedding party.
+
+    Either pass the pairs to check in, or leave them out to check in every booking
+    arriving on a date (optionally only on one floor or of one room type) into
+    the room it was booked for. Each pair is checked like check_in_guest; the
+    valid ones are applied together in one transaction.
+
+    Args:
+        pairs: [[room_id, booking_id], ...] to check in
+        arrival_date: Arrival date in format 'YYYY-MM-DD' when no pairs are given (default: today)
+        floor: Only rooms on this floor (room 305 is on floor 3) when no pairs are given
+        room_type: Only rooms of this type ('2BHK' or '3BHK') when no pairs are given
+
+    Returns:
+        One result per pair, in order: room_id, booking_id and either success or error
+    """
+    try:
+        with shared_connection(transaction=True) as conn:
+            if pairs is None:
+                pairs = [[row["room_id"], row["booking_id"]] for row in run_query(_GROUP_ARRIVALS_QUERY, {
+                    "date": arrival_date or run_query("SELECT date('now') AS today")[0]["today"],
+                    "floor": floor, "room_type": room_type,
+                })]
+            if not pairs:
+                return []
+            if any(len(pair) != 2 for pair in pairs):
+                return [{"error": "Each pair must be [room_id, booking_id]"}]
+            rows = run_query(_GROUP_CHECK_IN_QUERY, (json.dumps(pairs),))
+            if rows and "error" in rows[0]:
+                return rows
+            errors = _group_check_in_errors(rows)
+            valid = [(row["room_id"], row["booking_id"]) for row, error in zip(rows, errors) if error is None]
+            if valid:
+                conn.executemany("UPDATE Rooms SET isVacant = 0, currentStay = ? WHERE RoomID = ?",
+                                 [(booking_id, room_id) for room_id, booking_id in valid])
+                conn.executemany("UPDATE Bookings SET RoomID = ? WHERE BookingsID = ?", valid)
+                _commit_group(conn)
+                # Inside a transaction the events are held and sent once it commits
+                for row in run_query(_GROUP_ROOM_ROWS_QUERY, (json.dumps([room for room, _ in valid]),)):
+                    publish_event("room.occupied", row)
+                for row in run_query(_GROUP_BOOKING_ROWS_QUERY, (json.dumps([booking for _, booking in valid]),)):
+                    publish_event("booking.updated", row)
+    except sqlite3.Error as e:
+        return [{"error": f"Database error: {str(e)}"}]
+    except ValueError as e:
+        return [{"error": f"Unexpected error: {str(e)}"}]
+    return [
+        {"room_id": row["room_id"], "booking_id": row["booking_id"], "error": error} if error else
+        {"room_id": row["room_id"], "booking_id": row["booking_id"], "success": True}
+        for row, error in zip(rows, errors)
+    ]
+
+@tool
+def group_checkout(room_ids: Optional[List[int]] = None, departure_date: str = "",
+                   floor: Optional[int] = None, room_type: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Check out a whole group at once, marking their rooms vacant.
+
+    Either pass the rooms, or leave them out to check out every occupied room
+    whose guest departs on a date (optionally only on one floor or of one room
+    type). All rooms are vacated together in one transaction.
+
+    Args:
+        room_ids: Rooms to check out
+        departure_date: Departure date in format 'YYYY-MM-DD' when no rooms are given (default: today)
+        floor: Only rooms on this floor (room 305 is on floor 3) when no rooms are given
+        room_type: Only rooms of this type ('2BHK' or '3BHK') when no rooms are given
+
+    Returns:
+        One result per room, in order: room_id, the booking_id it held and either success or error
+    """
+    try:
+        with shared_connection(transaction=True) as conn:
+            if room_ids is None:
+                room_ids = [row["room_id"] for row in run_query(_GROUP_DEPARTURES_QUERY, {
+                    "date": departure_date or run_query("SELECT date('now') AS today")[0]["today"],
+                    "floor": floor, "room_type": room_type,
+                })]
+            if not room_ids:
+                return []
+            rows = run_query(_GROUP_CHECKOUT_QUERY, (json.dumps(room_ids),))
+            if rows and "error" in rows[0]:
+                return rows
+            errors: List[Optional[str]] = []
+            vacated = set()
+            for row in rows:
+                if not row["room_found"]:
+                    errors.append("Room not found")
+                elif row["room_id"] in vacated:
+                    errors.append("Room appears more than once in this group")
+                elif row["isVacant"]:
+                    errors.append("Room is already vacant")
+                else:
+                    errors.append(None)
+                    vacated.add(row["room_id"])
+            if vacated:
+                conn.executemany("UPDATE Rooms SET isVacant = 1, currentStay = NULL WHERE RoomID = ?",
+                                 [(room_id,) for room_id in vacated])
+                _commit_group(conn)
+                for row in run_query(_GROUP_ROOM_ROWS_QUERY, (json.dumps(sorted(vacated)),)):
+                    publish_event("room.vacated", row)
+    except sqlite3.Error as e:
+        return [{"error": f"Database error: {str(e)}"}]
+    except ValueError as e:
+        return [{"error": f"Unexpected error: {str(e)}"}]
+    return [
+        {"room_id": row["room_id"], "booking_id": row["currentStay"], "error": error} if error else
+        {"room_id": row["room_id"], "booking_id": row["currentStay"], "success": True}
+        for row, error in zip(rows, errors)
+    ]
+
+@tool
+def recalculate_room_rates(days: int = 0) -> List[Dict[str, Any]]:
+    """Recompute the recommended nightly rate of every room type from occupancy and booking pace.
+
+    Args:
+        days: Number of nights to price, starting tonight (default: PRICING_HORIZON_DAYS, 365)
+
+    Returns:
+        A summary of the recalculation; the rates are stored for get_room_rates
+    """
+    import pricing  # loads numpy, which only this tool needs
+    try:
+        return [pricing.recalculate_rates(days or pricing.PRICING_HORIZON_DAYS)]
+    except (ValueError, sqlite3.Error) as e:
+        return [{"error": f"Pricing error: {str(e)}"}]
+
+@tool
+def get_room_rates(start_date: str = "", end_date: str = "", room_type: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Get the recommended nightly rates per room type from the last recalculation.
+
+    Args:
+        start_date: First night in format 'YYYY-MM-DD' (default: today)
+        end_date: Last night in format 'YYYY-MM-DD' (default: a week after start_date)
+        room_type: Only this room type ('2BHK' or '3BHK')
+
+    Returns:
+        One row per room type and night: rate, base_price, rooms, on_books,
+        forecast_occupancy and computed_at
+    """
+    query = """
+    SELECT type, night, rate, base_price, rooms, on_books, forecast_occupancy, computed_at
+    FROM RoomRates
+    WHERE night >= :start AND night <= IFNULL(:end, date(:start, '+6 days'))
+        AND (:room_type IS NULL OR type = :room_type)
+    ORDER BY night, type
+    """
+    start = start_date or run_query("SELECT date('now') AS today")[0]["today"]
+    return run_query(query, {"start": start, "end": end_date or None, "room_type": room_type})
+
+# Stay dates as day numbers for the assignment planner
+_STAY_DAYS = "CAST(julianday(arrivalDate) AS INTEGER) AS arrival, CAST(julianday(departureDay) AS INTEGER) AS departure"
+
+_UNASSIGNED_BOOKINGS_QUERY = f"""
+SELECT BookingsID AS booking_id, arrivalDate, departureDay, {_STAY_DAYS}
+FROM Bookings
+WHERE RoomID IS NULL AND {{condition}}
+ORDER BY BookingsID
+"""
+
+class _UnassignedBooking:
+    """A row of _UNASSIGNED_BOOKINGS_QUERY, in its column order."""
+
+    __slots__ = ("booking_id", "arrivalDate", "departureDay", "arrival", "departure")
+
+    def __init__(self, booking_id: int, arrivalDate: Optional[str], departureDay: Optional[str],
+                 arrival: Optional[int], departure: Optional[int]):
+        self.booking_id = booking_id
+        self.arrivalDate = arrivalDate
+        self.departureDay = departureDay
+        self.arrival = arrival
+        self.departure = departure
+
+# Stays already in rooms that overlap [first, last)
+_ASSIGNED_STAYS_QUERY = f"""
+SELECT RoomID AS room_id, {_STAY_DAYS}
+FROM Bookings
+WHERE RoomID IS NOT NULL AND arrivalDate < :last AND departureDay > :first
+"""
+
+@tool
+def assign_rooms(start_date: str = "", days: int = ASSIGNMENT_HORIZON_DAYS, room_type: Optional[str] = None,
+                 booking_ids: Optional[List[int]] = None, dry_run: bool = False) -> List[Dict[str, Any]]:
+    """Assign rooms to bookings that don't have one yet.
+
+    Takes every unassigned booking arriving within the horizon (or the given
+    bookings) and places each in one room for its whole stay without overlapping
+    any other stay, packing stays tightly so free nights aren't scattered across
+    rooms. All assignments are written together in one transaction.
+
+    Args:
+        start_date: First arrival date in format 'YYYY-MM-DD' (default: today)
+        days: Number of arrival days to cover, starting at start_date
+        room_type: Only use rooms of this type ('2BHK' or '3BHK'); bookings don't record a type
+        booking_ids: Assign exactly these bookings instead of the horizon
+        dry_run: Only return the plan, without writing it
+
+    Returns:
+        A summary with "assignments" (booking_id, room_id) and "unassigned"
+        (booking_id, error) for the bookings no room could take
+    """
+    try:
+        with shared_connection(transaction=not dry_run, read_only=dry_run) as conn:
+            summary: Dict[str, Any] = {"start_date": None, "end_date": None}
+            if booking_ids is not None:
+                condition, params = "BookingsID IN (SELECT value FROM json_each(:ids))", {"ids": json.dumps(booking_ids)}
+            else:
+                start = start_date or run_query("SELECT date('now') AS today")[0]["today"]
+                end = run_query("SELECT date(?, ?) AS end", (start, f"+{int(days)} days"))[0]["end"]
+                if end is None:
+                    return [{"error": f"Invalid start_date {start_date!r}; expected 'YYYY-MM-DD'"}]
+                condition, params = "arrivalDate >= :start AND arrivalDate < :end", {"start": start, "end": end}
+                summary.update(start_date=start, end_date=end)
+            # Slotted records and plain tuples rather than dicts; a long horizon reads many rows
+            bookings = list(iter_query(_UNASSIGNED_BOOKINGS_QUERY.format(condition=condition), params)
+                            .records(_UnassignedBooking))
+            summary.update(bookings=len(bookings), assigned=0, dry_run=dry_run, assignments=[], unassigned=[])
+            valid = []
+            for booking in bookings:
+                if booking.arrival is not None and booking.departure is not None \
+                        and booking.arrival < booking.departure:
+                    valid.append(booking)
+                else:
+                    summary["unassigned"].append(
+                        {"booking_id": booking.booking_id, "error": "Booking has no valid stay dates"})
+            if not valid:
+                return [summary]
+
+            rooms = [room_id for room_id, in iter_query(
+                "SELECT RoomID FROM Rooms WHERE (:room_type IS NULL OR type = :room_type) ORDER BY RoomID",
+                {"room_type": room_type})]
+            busy: Dict[int, List[tuple]] = {}
+            for room_id, arrival, departure in iter_query(_ASSIGNED_STAYS_QUERY, {
+                "first": min(b.arrivalDate for b in valid), "last": max(b.departureDay for b in valid),
+            }):
+                if arrival is not None and departure is not None and arrival < departure:
+                    busy.setdefault(room_id, []).append((arrival, departure))
+
+            assigned, unplaced = plan_assignments(
+                ((b.booking_id, b.arrival, b.departure) for b in valid), rooms, busy)
+            no_room = f"No free {room_type} room for the whole stay" if room_type else "No free room for the whole stay"
+            summary["unassigned"] += [{"booking_id": booking_id, "error": no_room} for booking_id in unplaced]
+            summary["assignments"] = [{"booking_id": booking_id, "room_id": room_id}
+                                      for booking_id, room_id in sorted(assigned.items())]
+            summary["assigned"] = len(assigned)
+            if assigned and not dry_run:
+                conn.executemany("UPDATE Bookings SET RoomID = ? WHERE BookingsID = ? AND RoomID IS NULL",
+                                 [(room_id, booking_id) for booking_id, room_id in assigned.items()])
+                _commit_group(conn)
+                # Inside a transaction the events are held and sent once it commits
+                for row in run_query(_GROUP_BOOKING_ROWS_QUERY, (json.dumps(sorted(assigned)),)):
+                    publish_event("booking.updated", row)
+    except sqlite3.Error as e:
+        return [{"error": f"Database error: {str(e)}"}]
+    except ValueError as e:
+        return [{"error": f"Unexpected error: {str(e)}"}]
+    return [summary]
 
 @tool
 def update_customer_info(customer_id: int, first_name: Optional[str] = None,
@@ -454,17 +1560,28 @@ def update_customer_info(customer_id: int, first_name: Optional[str] = None,
 
     query = f"UPDATE Customers SET {', '.join(fields)} WHERE CustomerID = ?"
     values.append(customer_id)
-    return run_query(query, tuple(values))
+    result = run_query(query, tuple(values))
+    if result[0].get("affected_rows"):
+        _publish_row("customer.updated", _CUSTOMER_ROW_QUERY, customer_id)
+    return result
 
 @tool
 def cancel_booking(booking_id: int) -> List[Dict[str, Any]]:
     """Cancel a booking and free the room."""
+    occupied_rooms = run_query("SELECT RoomID FROM Rooms WHERE currentStay = ?", (booking_id,))
     free_room_query = "UPDATE Rooms SET isVacant = 1, currentStay = NULL WHERE currentStay = ?"
     result1 = run_query(free_room_query, (booking_id,))
 
     delete_booking_query = "DELETE FROM Bookings WHERE BookingsID = ?"
     result2 = run_query(delete_booking_query, (booking_id,))
 
+    if result1[0].get("affected_rows"):
+        for room in occupied_rooms:
+            if "RoomID" in room:
+                _publish_row("room.vacated", _ROOM_ROW_QUERY, room["RoomID"])
+    if result2[0].get("affected_rows"):
+        publish_event("booking.cancelled", {"BookingsID": booking_id})
+
     return [{"freed_room_rows": result1[0].get("affected_rows", 0),
              "deleted_booking_rows": result2[0].get("affected_rows", 0)}]
 
@@ -475,7 +1592,10 @@ def apply_discount(payment_id: int, discount: float) -> List[Dict[str, Any]]:
         return [{"error": "Discount must be between 0 and 100"}]
 
     query = "UPDATE Pricing SET discount = ? WHERE PaymentID = ?"
-    return run_query(query, (discount, payment_id))
+    result = run_query(query, (discount, payment_id))
+    if result[0].get("affected_rows"):
+        _publish_row("payment.updated", _PAYMENT_ROW_QUERY, payment_id)
+    return result
 
 # NEW TOOLS
 
@@ -515,11 +1635,13 @@ def get_customer_by_id(customer_id: int) -> List[Dict[str, Any]]:
            COUNT(b.BookingsID) as total_bookings,
            MAX(b.arrivalDate) as last_stay
     FROM Customers c
-    LEFT JOIN Bookings b ON c.CustomerID = b.customerID
+    LEFT JOIN (SELECT BookingsID, arrivalDate, customerID FROM AllBookings WHERE customerID = ?) b
+        ON c.CustomerID = b.customerID
     WHERE c.CustomerID = ?
     GROUP BY c.CustomerID
     """
-    return run_query(query, (customer_id,))
+    # SQLite only pushes WHERE terms, not join terms, into a UNION ALL view
+    return run_query(query, (customer_id, customer_id))
 
 @tool
 def get_booking_details(booking_id: int) -> List[Dict[str, Any]]:
@@ -539,10 +1661,10 @@ def get_booking_details(booking_id: int) -> List[Dict[str, Any]]:
         p.PaymentType, p.price as payment_amount, p.discount, p.isDone as payment_completed,
         JULIANDAY(b.departureDay) - JULIANDAY(b.arrivalDate) as stay_duration,
         p.price * (1 - p.discount/100.0) as final_amount
-    FROM Bookings b
+    FROM AllBookings b
     JOIN Customers c ON b.customerID = c.CustomerID
     LEFT JOIN Rooms r ON r.RoomID = b.RoomID
-    JOIN Pricing p ON b.paymentID = p.PaymentID
+    JOIN AllPricing p ON b.paymentID = p.PaymentID
     WHERE b.BookingsID = ?
     """
     return run_query(query, (booking_id,))
@@ -619,25 +1741,10 @@ def list_bookings_by_date_range(start_date: str, end_date: str) -> List[Dict[str
     Returns:
         List of bookings within the specified date range
     """
-    query = """
-    SELECT 
-        b.BookingsID, b.arrivalDate, b.departureDay,
-        c.FirstName, c.LastName,
-        r.RoomID, r.type as room_type,
-        p.price, p.discount, p.PaymentType, p.isDone as payment_completed,
-        JULIANDAY(b.departureDay) - JULIANDAY(b.arrivalDate) as stay_duration
-    FROM Bookings b
-    JOIN Customers c ON b.customerID = c.CustomerID
-    LEFT JOIN Rooms r ON r.RoomID = b.RoomID
-    JOIN Pricing p ON b.paymentID = p.PaymentID
-    WHERE 
-        (b.arrivalDate BETWEEN ? AND ?) OR
-        (b.departureDay BETWEEN ? AND ?) OR
-        (b.arrivalDate <= ? AND b.departureDay >= ?)
-    ORDER BY b.arrivalDate
-    """
-    params = (start_date, end_date, start_date, end_date, start_date, end_date)
-    return run_query(query, params)
+    report = _analytics_report("bookings_by_date_range", start_date, end_date)
+    if report is not None:
+        return report if isinstance(report, list) else [report]
+    return run_query(BOOKINGS_BY_DATE_RANGE_QUERY, {"start": start_date, "end": end_date})
 
 @tool
 def get_payment_details(payment_id: int) -> List[Dict[str, Any]]:
@@ -656,13 +1763,13 @@ def get_payment_details(payment_id: int) -> List[Dict[str, Any]]:
         b.BookingsID, b.arrivalDate, b.departureDay,
         c.FirstName, c.LastName,
         r.RoomID, r.type as room_type
-    FROM Pricing p
-    LEFT JOIN Bookings b ON p.PaymentID = b.paymentID
+    FROM AllPricing p
+    LEFT JOIN (SELECT * FROM AllBookings WHERE paymentID = ?) b ON p.PaymentID = b.paymentID
     LEFT JOIN Customers c ON b.customerID = c.CustomerID
     LEFT JOIN Rooms r ON r.RoomID = b.RoomID
     WHERE p.PaymentID = ?
     """
-    return run_query(query, (payment_id,))
+    return run_query(query, (payment_id, payment_id))
 
 @tool
 def update_room_info(room_id: int, is_vacant: Optional[bool] = None, 
@@ -703,7 +1810,10 @@ def update_room_info(room_id: int, is_vacant: Optional[bool] = None,
     query = f"UPDATE Rooms SET {', '.join(fields)} WHERE RoomID = ?"
     values.append(room_id)
     
-    return run_query(query, tuple(values))
+    result = run_query(query, tuple(values))
+    if result[0].get("affected_rows"):
+        _publish_row("room.updated", _ROOM_ROW_QUERY, room_id)
+    return result
 
 @tool
 def update_booking_details(booking_id: int, arrival_date: Optional[str] = None, 
@@ -740,7 +1850,17 @@ def update_booking_details(booking_id: int, arrival_date: Optional[str] = None,
     query = f"UPDATE Bookings SET {', '.join(fields)} WHERE BookingsID = ?"
     values.append(booking_id)
     
-    return run_query(query, tuple(values))
+    result = run_query(query, tuple(values))
+    if result[0].get("affected_rows"):
+        _publish_row("booking.updated", _BOOKING_ROW_QUERY, booking_id)
+    return result
+
+def _with_live_occupancy(result: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Replace the occupancy part of a statistics report with the room state's, when there is one."""
+    state = _room_state()
+    if state is not None and result and "occupancy" in result[0]:
+        result[0]["occupancy"] = state.occupancy()
+    return result
 
 @tool
 def get_hotel_statistics() -> List[Dict[str, Any]]:
@@ -749,6 +1869,14 @@ def get_hotel_statistics() -> List[Dict[str, Any]]:
     Returns:
         Statistical overview of hotel performance
     """
+    # Snapshot first, as in get_revenue_by_room_type
+    report = _analytics_report("hotel_statistics")
+    if report is not None:
+        return _with_live_occupancy([report])
+    pooled = _pooled_report("get_hotel_statistics", {})
+    if pooled is not None:
+        return _with_live_occupancy(pooled)
+    state = _room_state()
     queries = [
         # Overall occupancy
         """
@@ -767,8 +1895,7 @@ def get_hotel_statistics() -> List[Dict[str, Any]]:
             AVG(p.price * (1 - p.discount/100.0)) as avg_revenue_per_booking,
             SUM(CASE WHEN p.isDone = 1 THEN p.price * (1 - p.discount/100.0) ELSE 0 END) as realized_revenue,
             SUM(CASE WHEN p.isDone = 0 THEN p.price * (1 - p.discount/100.0) ELSE 0 END) as pending_revenue
-        FROM Pricing p
-        JOIN Bookings b ON p.PaymentID = b.paymentID
+        FROM AllBookingPayments p
         """,
         
         # Booking statistics
@@ -781,7 +1908,7 @@ def get_hotel_statistics() -> List[Dict[str, Any]]:
             (SELECT COUNT(*) FROM Bookings 
              JOIN Rooms ON Rooms.currentStay = Bookings.BookingsID
              WHERE Rooms.isVacant = 0) as active_bookings
-        FROM Bookings
+        FROM AllBookings
         """,
         
         # Room type popularity
@@ -789,9 +1916,9 @@ def get_hotel_statistics() -> List[Dict[str, Any]]:
         SELECT 
             r.type, 
             COUNT(b.BookingsID) as booking_count,
-            ROUND(COUNT(b.BookingsID) * 100.0 / (SELECT COUNT(*) FROM Bookings), 2) as booking_percentage
+            ROUND(COUNT(b.BookingsID) * 100.0 / (SELECT COUNT(*) FROM AllBookings), 2) as booking_percentage
         FROM Rooms r
-        JOIN Bookings b ON r.RoomID = b.RoomID OR 
+        JOIN AllBookings b ON r.RoomID = b.RoomID OR 
                           (r.RoomID IN (SELECT RoomID FROM Rooms WHERE currentStay = b.BookingsID))
         GROUP BY r.type
         """
@@ -799,6 +1926,9 @@ def get_hotel_statistics() -> List[Dict[str, Any]]:
     
     results = {}
     for i, query in enumerate(queries):
+        if i == 0 and state is not None:
+            results["occupancy"] = state.occupancy()
+            continue
         result = run_query(query)
         if result and not "error" in result[0]:
             category = ["occupancy", "revenue", "bookings", "popularity"][i]
@@ -829,7 +1959,10 @@ def add_new_room(room_id: int, room_type: str, price: float) -> List[Dict[str, A
     VALUES (?, 1, ?, ?)
     """
     
-    return run_query(query, (room_id, room_type, price))
+    result = run_query(query, (room_id, room_type, price))
+    if "error" not in result[0]:
+        _publish_row("room.created", _ROOM_ROW_QUERY, room_id)
+    return result
 
 @tool
 def search_customers(search_term: str) -> List[Dict[str, Any]]:
@@ -868,8 +2001,9 @@ def get_all_tables() -> List[Dict[str, Any]]:
     Returns:
         List of all database tables
     """
-    query = "SELECT name FROM sqlite_master WHERE type='table'"
-    return run_query(query)
+    query = ("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' "
+             "AND name NOT IN (SELECT value FROM json_each(?))")
+    return run_query(query, (json.dumps(sorted(INTERNAL_TABLES)),))
 
 @tool
 def get_all_customers() -> List[Dict[str, Any]]:
@@ -878,8 +2012,7 @@ def get_all_customers() -> List[Dict[str, Any]]:
     Returns:
         List of all customers
     """
-    query = "SELECT * FROM Customers"
-    return run_query(query)
+    return run_query(ALL_CUSTOMERS_QUERY)
 
 @tool
 def get_all_bookings() -> List[Dict[str, Any]]:
@@ -888,14 +2021,7 @@ def get_all_bookings() -> List[Dict[str, Any]]:
     Returns:
         List of all bookings with room details
     """
-    query = """
-    SELECT 
-        b.*, 
-        r.RoomID, r.type as room_type, r.price as room_price
-    FROM Bookings b
-    LEFT JOIN Rooms r ON r.RoomID = b.RoomID
-    """
-    return run_query(query)
+    return run_query(ALL_BOOKINGS_QUERY)
 
 @tool
 def get_all_rooms() -> List[Dict[str, Any]]:
@@ -904,8 +2030,7 @@ def get_all_rooms() -> List[Dict[str, Any]]:
     Returns:
         List of all rooms
     """
-    query = "SELECT * FROM Rooms"
-    return run_query(query)
+    return run_query(ALL_ROOMS_QUERY)
 
 @tool
 def get_all_payments() -> List[Dict[str, Any]]:
@@ -914,5 +2039,4 @@ def get_all_payments() -> List[Dict[str, Any]]:
     Returns:
         List of all payments
     """
-    query = "SELECT * FROM Pricing"
-    return run_query(query)
\ No newline at end of file
+    return run_query(ALL_PAYMENTS_QUERY)
\ No newline at end of file
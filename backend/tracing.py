@@ -0,0 +1,499 @@
+# tracing.py
+
+import contextvars
+import html
+import json
+import logging
+import logging.handlers
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from starlette.datastructures import Headers
+
+# Share of requests to TRACE_PATHS that are traced (0 to 1). Off by default: spans
+# carry raw tool inputs and SQL, which can hold guest data. Once it is above 0, a
+# W3C traceparent header from the caller overrides it with its own sampled flag.
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+# Paths whose requests are traced
+TRACE_PATHS = frozenset(filter(None, os.getenv("TRACE_PATHS", "/chat-ai").split(",")))
+# Finished traces, one OTLP/JSON document per line; rotated at TRACE_FILE_MAX_BYTES
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_BYTES", str(10 * 1024 * 1024)))
+# Rotated files kept as traces.jsonl.1, .2, ...
+TRACE_FILE_BACKUPS = int(os.getenv("TRACE_FILE_BACKUPS", "3"))
+# Finished traces kept in memory for /debug/traces
+TRACE_HISTORY_SIZE = int(os.getenv("TRACE_HISTORY_SIZE", "100"))
+# Longer attribute values (SQL, tool input and output) are cut to this many characters
+TRACE_MAX_ATTRIBUTE_CHARS = int(os.getenv("TRACE_MAX_ATTRIBUTE_CHARS", "2000"))
+
+SERVICE_NAME = "hotel-management-api"
+
+# OTLP SpanKind and StatusCode values
+KIND_INTERNAL, KIND_SERVER, KIND_CLIENT = 1, 2, 3
+STATUS_UNSET, STATUS_OK, STATUS_ERROR = 0, 1, 2
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+class Trace:
+    """Spans of one traced request, exported together when its root span ends."""
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.spans: List["Span"] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: "Span") -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def finished_spans(self) -> List["Span"]:
+        with self._lock:
+            return [span for span in self.spans if span.end_ns is not None]
+
+class Span:
+    """One timed operation; children point at it through parent_id."""
+
+    def __init__(self, trace: Trace, name: str, parent_id: Optional[str] = None, kind: int = KIND_INTERNAL,
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.trace = trace
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.status = STATUS_UNSET
+        self.status_message = ""
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        trace.add(self)
+
+    def child(self, name: str, kind: int = KIND_INTERNAL, attributes: Optional[Dict[str, Any]] = None) -> "Span":
+        return Span(self.trace, name, self.span_id, kind, attributes)
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def fail(self, message: str) -> None:
+        self.status = STATUS_ERROR
+        self.status_message = _clip(message)
+
+    def end(self) -> None:
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": self.status, "message": self.status_message} if self.status_message
+                      else {"code": self.status},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+def _clip(value: str) -> str:
+    if len(value) <= TRACE_MAX_ATTRIBUTE_CHARS:
+        return value
+    return value[:TRACE_MAX_ATTRIBUTE_CHARS] + f"... ({len(value)} chars)"
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": _clip(str(value))}
+
+def _plain_value(value: Dict[str, Any]) -> Any:
+    kind, plain = next(iter(value.items()))
+    return int(plain) if kind == "intValue" else plain
+
+# Span that new spans in this context are children of; None when not tracing
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+@contextmanager
+def span(name: str, kind: int = KIND_INTERNAL, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Time the block as a child of the current span; yields None when the request isn't traced."""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = parent.child(name, kind, attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.fail(repr(e))
+        raise
+    finally:
+        _current_span.reset(token)
+        child.end()
+
+def start_span(name: str, kind: int = KIND_INTERNAL, **attributes: Any) -> Optional[Span]:
+    """Start a child of the current span without making it current; None when not tracing.
+
+    For hot paths such as run_query, where a context manager per call costs too much.
+    """
+    parent = _current_span.get()
+    return parent.child(name, kind, attributes) if parent is not None else None
+
+def sql_span(query: str) -> Optional[Span]:
+    """Start the span of one SQL statement, or return None when not tracing."""
+    parent = _current_span.get()
+    if parent is None:
+        return None
+    statement = " ".join(query.split())
+    return parent.child(f"sqlite {statement.split(' ', 1)[0].upper()}", KIND_CLIENT,
+                        {"db.system": "sqlite", "db.statement": statement})
+
+def end_sql_span(statement: Span, result: List[Dict[str, Any]]) -> None:
+    """End a SQL span, recording the row count or the error of a tool-format result."""
+    statement.end()
+    if result and "error" in result[0]:
+        statement.fail(result[0]["error"])
+    elif result and "affected_rows" in result[0]:
+        statement.set("db.response.affected_rows", result[0]["affected_rows"])
+    else:
+        statement.set("db.response.returned_rows", len(result))
+
+class _Exporter:
+    """Writes finished traces to the rotating file and keeps the latest in memory."""
+
+    def __init__(self):
+        self._recent: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._logger: Optional[logging.Logger] = None
+
+    def _file_logger(self) -> Optional[logging.Logger]:
+        if self._logger is None and TRACE_FILE:
+            logger = logging.getLogger("hotel.traces")
+            logger.propagate = False
+            logger.setLevel(logging.INFO)
+            if not logger.handlers:
+                handler = logging.handlers.RotatingFileHandler(
+                    TRACE_FILE, maxBytes=TRACE_FILE_MAX_BYTES, backupCount=TRACE_FILE_BACKUPS, encoding="utf-8")
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                logger.addHandler(handler)
+            self._logger = logger
+        return self._logger
+
+    def export(self, trace: Trace) -> Dict[str, Any]:
+        document = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "hotel.tracing"},
+                            "spans": [span.to_otlp() for span in trace.finished_spans()]}],
+        }]}
+        with self._lock:
+            self._recent[trace.trace_id] = document
+            while len(self._recent) > TRACE_HISTORY_SIZE:
+                self._recent.popitem(last=False)
+            logger = self._file_logger()
+        if logger is not None:
+            try:
+                logger.info(json.dumps(document, separators=(",", ":"), default=str))
+            except (OSError, ValueError) as e:
+                print(f"Trace not written to {TRACE_FILE}: {e}")
+        return document
+
+    def recent(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._recent.values())
+
+    def find(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        """Return a trace from memory, or else from the trace file and its rotated copies."""
+        with self._lock:
+            document = self._recent.get(trace_id)
+        if document is not None or not TRACE_FILE:
+            return document
+        needle = f'"traceId":"{trace_id}"'
+        for index in range(TRACE_FILE_BACKUPS + 1):
+            path = TRACE_FILE if index == 0 else f"{TRACE_FILE}.{index}"
+            try:
+                with open(path, encoding="utf-8") as f:
+                    for line in f:
+                        if needle in line:
+                            return json.loads(line)
+            except OSError:
+                continue
+        return None
+
+exporter = _Exporter()
+
+def _sampled(headers: Headers) -> Optional[tuple]:
+    """Decide whether to trace a request: (trace_id, parent span id or None), or None."""
+    # Callers can't switch tracing on with a traceparent header
+    if TRACE_SAMPLE_RATE <= 0:
+        return None
+    match = _TRACEPARENT.match(headers.get("traceparent", "").strip().lower())
+    if match:
+        trace_id, parent_id, flags = match.groups()
+        return (trace_id, parent_id) if int(flags, 16) & 1 else None
+    if random.random() >= TRACE_SAMPLE_RATE:
+        return None
+    return f"{random.getrandbits(128):032x}", None
+
+class TracingMiddleware:
+    """Trace sampled requests to TRACE_PATHS, with the request as the root span.
+
+    The trace id is returned in the X-Trace-Id header; /debug/traces/{id}
+    shows the trace once the response is complete.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in TRACE_PATHS or _current_span.get() is not None:
+            return await self.app(scope, receive, send)
+        headers = Headers(scope=scope)
+        sampled = _sampled(headers)
+        if sampled is None:
+            return await self.app(scope, receive, send)
+        trace_id, parent_id = sampled
+        root = Span(Trace(trace_id), f"{scope['method']} {scope['path']}", parent_id, KIND_SERVER, {
+            "http.request.method": scope["method"],
+            "url.path": scope["path"],
+            "url.query": scope["query_string"].decode("latin-1"),
+            "client.address": scope["client"][0] if scope.get("client") else "",
+        })
+
+        async def send_with_trace_id(message):
+            if message["type"] == "http.response.start":
+                root.set("http.response.status_code", message["status"])
+                if message["status"] >= 500:
+                    root.fail(f"HTTP {message['status']}")
+                message = dict(message, headers=list(message.get("headers", [])) + [
+                    (b"x-trace-id", trace_id.encode("ascii"))])
+            await send(message)
+
+        token = _current_span.set(root)
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        except BaseException as e:
+            root.fail(repr(e))
+            raise
+        finally:
+            _current_span.reset(token)
+            root.end()
+            exporter.export(root.trace)
+
+class AgentTraceHandler(BaseCallbackHandler):
+    """Records the agent's steps, LLM calls and tool calls as spans of one trace.
+
+    LangChain runs are matched to spans by run id. Runs that aren't worth a span
+    (the runnables inside a graph node) pass their children on to the nearest
+    recorded ancestor. A tool's span is made current in the thread running the
+    tool, so run_query's SQL spans nest under it.
+    """
+
+    run_inline = True
+
+    def __init__(self, parent: Span):
+        self.parent = parent
+        self._spans: Dict[UUID, Span] = {}
+        self._ancestors: Dict[UUID, Span] = {}
+        self._tokens: Dict[UUID, contextvars.Token] = {}
+        self._lock = threading.Lock()
+
+    def _parent_of(self, parent_run_id: Optional[UUID]) -> Span:
+        if parent_run_id is None:
+            return self.parent
+        return self._ancestors.get(parent_run_id, self.parent)
+
+    def _start(self, run_id: UUID, parent_run_id: Optional[UUID], name: str, kind: int = KIND_INTERNAL,
+               attributes: Optional[Dict[str, Any]] = None) -> Span:
+        with self._lock:
+            child = self._parent_of(parent_run_id).child(name, kind, attributes)
+            self._spans[run_id] = self._ancestors[run_id] = child
+        return child
+
+    def _pass_through(self, run_id: UUID, parent_run_id: Optional[UUID]) -> None:
+        with self._lock:
+            self._ancestors[run_id] = self._parent_of(parent_run_id)
+
+    def _finish(self, run_id: UUID, error: Optional[BaseException] = None) -> Optional[Span]:
+        with self._lock:
+            finished = self._spans.pop(run_id, None)
+            self._ancestors.pop(run_id, None)
+        if finished is not None:
+            if error is not None:
+                finished.fail(repr(error))
+            finished.end()
+        return finished
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        metadata = metadata or {}
+        name = kwargs.get("name") or (serialized or {}).get("name", "")
+        if parent_run_id is None:
+            self._start(run_id, None, "agent", attributes={"langgraph.graph": name})
+        elif metadata.get("langgraph_node") == name and "langgraph_step" in metadata:
+            self._start(run_id, parent_run_id, f"step {metadata['langgraph_step']} {name}", attributes={
+                "langgraph.step": metadata["langgraph_step"], "langgraph.node": name})
+        else:
+            self._pass_through(run_id, parent_run_id)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, error)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model") or params.get("model_name") or (metadata or {}).get("ls_model_name", "")
+        self._start(run_id, parent_run_id, f"llm {model}".strip(), KIND_CLIENT, {
+            "gen_ai.operation.name": "chat",
+            "gen_ai.request.model": model,
+            "gen_ai.request.message_count": sum(len(batch) for batch in messages),
+        })
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model") or params.get("model_name") or (metadata or {}).get("ls_model_name", "")
+        self._start(run_id, parent_run_id, f"llm {model}".strip(), KIND_CLIENT, {
+            "gen_ai.operation.name": "text_completion", "gen_ai.request.model": model})
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        finished = self._finish(run_id)
+        if finished is None:
+            return
+        usage = {}
+        for generations in response.generations:
+            for generation in generations:
+                metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if metadata:
+                    usage = metadata
+        if not usage:
+            token_usage = (response.llm_output or {}).get("token_usage") or {}
+            usage = {"input_tokens": token_usage.get("prompt_tokens"),
+                     "output_tokens": token_usage.get("completion_tokens"),
+                     "total_tokens": token_usage.get("total_tokens")}
+        for key in ("input_tokens", "output_tokens", "total_tokens"):
+            if usage.get(key) is not None:
+                finished.set(f"gen_ai.usage.{key}", int(usage[key]))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name", "tool")
+        tool_span = self._start(run_id, parent_run_id, f"tool {name}", attributes={
+            "tool.name": name, "tool.input": input_str})
+        # Tools run synchronously in one executor thread, which this callback runs on
+        self._tokens[run_id] = _current_span.set(tool_span)
+
+    def _end_tool(self, run_id: UUID, error: Optional[BaseException] = None, output: Any = None) -> None:
+        token = self._tokens.pop(run_id, None)
+        if token is not None:
+            try:
+                _current_span.reset(token)
+            except ValueError:
+                # Ended from another context; the thread's next tool sets its own span
+                pass
+        finished = self._finish(run_id, error)
+        if finished is not None and output is not None:
+            content = getattr(output, "content", output)
+            finished.set("tool.output_chars", len(content) if isinstance(content, str) else len(str(content)))
+            # Tools report failures as [{"error": ...}] rather than raising
+            if getattr(output, "status", None) == "error" or str(content).startswith(("[{'error'", '[{"error"')):
+                finished.fail(str(content))
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end_tool(run_id, output=output)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end_tool(run_id, error)
+
+def agent_callbacks() -> List[BaseCallbackHandler]:
+    """Callbacks that trace an agent run into the current trace; empty when not tracing."""
+    parent = _current_span.get()
+    return [AgentTraceHandler(parent)] if parent is not None else []
+
+def _summary(document: Dict[str, Any]) -> Dict[str, Any]:
+    spans = document["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    ids = {span["spanId"] for span in spans}
+    root = next((span for span in spans if span.get("parentSpanId") not in ids), spans[0]) if spans else None
+    return {
+        "trace_id": root["traceId"] if root else None,
+        "name": root["name"] if root else None,
+        "start": root and time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(int(root["startTimeUnixNano"]) / 1e9)),
+        "duration_ms": root and round((int(root["endTimeUnixNano"]) - int(root["startTimeUnixNano"])) / 1e6, 3),
+        "spans": len(spans),
+        "error": any(span["status"]["code"] == STATUS_ERROR for span in spans),
+    }
+
+def list_traces() -> List[Dict[str, Any]]:
+    """Summaries of the traces kept in memory, newest first."""
+    return [_summary(document) for document in reversed(exporter.recent())]
+
+def trace_tree(document: Dict[str, Any]) -> Dict[str, Any]:
+    """Turn an OTLP trace into a nested tree of spans with durations and start offsets."""
+    spans = document["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    ids = {span["spanId"] for span in spans}
+    start = min((int(span["startTimeUnixNano"]) for span in spans), default=0)
+    nodes = {}
+    for item in sorted(spans, key=lambda span: int(span["startTimeUnixNano"])):
+        nodes[item["spanId"]] = {
+            "name": item["name"],
+            "span_id": item["spanId"],
+            "start_ms": round((int(item["startTimeUnixNano"]) - start) / 1e6, 3),
+            "duration_ms": round((int(item["endTimeUnixNano"]) - int(item["startTimeUnixNano"])) / 1e6, 3),
+            "status": {STATUS_UNSET: "unset", STATUS_OK: "ok", STATUS_ERROR: "error"}[item["status"]["code"]],
+            "attributes": {attribute["key"]: _plain_value(attribute["value"]) for attribute in item["attributes"]},
+            "children": [],
+        }
+        if item["status"].get("message"):
+            nodes[item["spanId"]]["error"] = item["status"]["message"]
+    roots = []
+    for item in sorted(spans, key=lambda span: int(span["startTimeUnixNano"])):
+        parent = item.get("parentSpanId")
+        (nodes[parent]["children"] if parent in ids else roots).append(nodes[item["spanId"]])
+    return {**_summary(document), "tree": roots}
+
+def trace_html(document: Dict[str, Any]) -> str:
+    """Render a trace as an indented waterfall table."""
+    tree = trace_tree(document)
+    total = tree["duration_ms"] or 1
+    rows = []
+
+    def walk(node: Dict[str, Any], depth: int) -> None:
+        left = node["start_ms"] / total * 100
+        width = max(node["duration_ms"] / total * 100, 0.2)
+        detail = node["attributes"].get("db.statement") or node["attributes"].get("tool.input") or ""
+        tokens = node["attributes"].get("gen_ai.usage.total_tokens")
+        if tokens is not None:
+            detail = f"{tokens} tokens"
+        color = "#d9534f" if node["status"] == "error" else "#5b9bd5"
+        rows.append(
+            f"<tr><td style='padding-left:{depth * 16}px'>{html.escape(node['name'])}</td>"
+            f"<td style='text-align:right'>{node['duration_ms']:.1f} ms</td>"
+            f"<td style='width:40%'><div style='margin-left:{left:.2f}%;width:{width:.2f}%;"
+            f"background:{color};height:10px'></div></td>"
+            f"<td><code>{html.escape(str(detail)[:200])}</code></td></tr>")
+        for child in node["children"]:
+            walk(child, depth + 1)
+
+    for root in tree["tree"]:
+        walk(root, 0)
+    return (f"<html><head><title>Trace {tree['trace_id']}</title></head><body style='font-family:sans-serif'>"
+            f"<h3>{html.escape(tree['name'] or '')} &middot; {tree['duration_ms']} ms &middot; {tree['spans']} spans"
+            f"</h3><table style='width:100%;border-collapse:collapse;font-size:13px'>{''.join(rows)}</table>"
+            f"</body></html>")
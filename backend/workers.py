@@ -0,0 +1,358 @@
+# workers.py
+
+import multiprocessing
+import os
+import queue
+import signal
+import tempfile
+import threading
+import time
+import uuid
+from multiprocessing.connection import wait as wait_for_ready
+from typing import Any, Callable, Dict, List, Optional
+
+import tools
+from export import EXPORT_FORMATS, export_to_file
+from properties import current_property
+
+# Worker processes for heavy reports; 0 runs them in the API process as before
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "2"))
+# Jobs allowed to wait for a worker; further submissions are rejected
+WORKER_MAX_QUEUE = int(os.getenv("WORKER_MAX_QUEUE", "16"))
+# Running time after which a job's worker is killed
+WORKER_JOB_TIMEOUT_SECONDS = float(os.getenv("WORKER_JOB_TIMEOUT_SECONDS", "120"))
+# Finished jobs (and their export files) are forgotten after this long
+WORKER_JOB_RETENTION_SECONDS = float(os.getenv("WORKER_JOB_RETENTION_SECONDS", "600"))
+# Scheduling priority of the workers, so request handling wins the CPU over reports
+WORKER_NICE = int(os.getenv("WORKER_NICE", "10"))
+WORKER_EXPORT_DIR = os.getenv("WORKER_EXPORT_DIR", os.path.join(tempfile.gettempdir(), "hotel-exports"))
+
+# How often a waiting slot checks for cancellation
+_CANCEL_POLL_SECONDS = 0.1
+
+def _run_tool(name: str) -> Callable[..., Any]:
+    return lambda **args: getattr(tools, name).run(args)
+
+def _export(path: str, format: str = "csv", start_date: Optional[str] = None,
+            end_date: Optional[str] = None) -> Dict[str, Any]:
+    # Incremental exports record their mark with a write, so only plain exports run here
+    return export_to_file(path, format, start_date=start_date, end_date=end_date)
+
+# Work that may be sent to the pool, by name. Reports are the tools themselves,
+# run inline in the worker since no pool is set there.
+TASKS: Dict[str, Callable[..., Any]] = {
+    "get_hotel_statistics": _run_tool("get_hotel_statistics"),
+    "get_revenue_by_room_type": _run_tool("get_revenue_by_room_type"),
+    "get_revenue_time_series": _run_tool("get_revenue_time_series"),
+    "list_bookings_by_date_range": _run_tool("list_bookings_by_date_range"),
+    "export_bookings": _export,
+}
+
+class WorkerError(RuntimeError):
+    """Raised when a job can't be queued or doesn't finish."""
+
+def _worker_main(conn) -> None:
+    """Worker process loop: run (job id, task, args, db path) messages until told to stop."""
+    # Ctrl+C reaches the whole process group; the API process shuts the workers down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if WORKER_NICE:
+        os.nice(WORKER_NICE)
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+        job_id, task, args, db_path = message
+        # Read pools are kept per database, so switching between properties is cheap
+        tools.DB_PATH = db_path
+        try:
+            conn.send((job_id, True, TASKS[task](**args)))
+        except Exception as e:
+            conn.send((job_id, False, f"{type(e).__name__}: {e}"))
+
+class Job:
+    """A unit of work sent to the pool. States: queued, running, done, failed, cancelled, timeout."""
+
+    def __init__(self, task: str, args: Dict[str, Any], timeout: float):
+        self.id = uuid.uuid4().hex
+        self.task = task
+        self.args = args
+        self.timeout = timeout
+        # Jobs run against the database of the property they were submitted for
+        self.property = current_property.get()
+        self.db_path = tools.current_db_path()
+        self.state = "queued"
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.cancel_requested = False
+        self._done = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self._done.is_set()
+
+    def finish(self, state: str, result: Any = None, error: Optional[str] = None) -> None:
+        self.state, self.result, self.error = state, result, error
+        self.finished_at = time.time()
+        self._done.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def to_dict(self, include_result: bool = True) -> Dict[str, Any]:
+        info = {"job_id": self.id, "task": self.task, "property": self.property, "state": self.state,
+                "error": self.error,
+                "submitted_at": self.submitted_at, "started_at": self.started_at,
+                "finished_at": self.finished_at}
+        if include_result and self.state == "done":
+            info["result"] = self.result
+        return info
+
+class _Worker:
+    """One worker process and the pipe to it."""
+
+    def __init__(self, context, name: str):
+        self._context = context
+        self._name = name
+        self._spawn()
+
+    def _spawn(self) -> None:
+        self.conn, child = self._context.Pipe()
+        self.process = self._context.Process(target=_worker_main, args=(child,), name=self._name, daemon=True)
+        self.process.start()
+        child.close()
+
+    def restart(self, respawn: bool = True) -> Optional[int]:
+        """Kill the process, abandoning whatever it is running, and start a fresh one.
+
+        Returns:
+            Exit code of the old process
+        """
+        self.kill()
+        exitcode = self.process.exitcode
+        if respawn:
+            self._spawn()
+        return exitcode
+
+    def kill(self) -> None:
+        self.process.terminate()
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(2)
+        if self.process.is_alive():
+            self.kill()
+
+class WorkerPool:
+    """Runs report and export jobs in long-lived worker processes.
+
+    Each worker opens its own read-only pooled connections (tools.acquire_read_connection),
+    so a report neither shares the API's GIL nor its connections. Jobs wait in
+    a bounded queue; a cancelled or timed out job's worker is killed and replaced.
+    """
+
+    def __init__(self, processes: int = WORKER_PROCESSES, max_queue: int = WORKER_MAX_QUEUE,
+                 timeout: float = WORKER_JOB_TIMEOUT_SECONDS):
+        self.processes = processes
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._queue: "queue.Queue[Optional[Job]]" = queue.Queue()
+        self._jobs: Dict[str, Job] = {}
+        self._queued = 0
+        self._lock = threading.Lock()
+        self._workers: List[_Worker] = []
+        self._threads: List[threading.Thread] = []
+        self._stopping = False
+        self.stats = {"submitted": 0, "rejected": 0, "done": 0, "failed": 0, "cancelled": 0, "timeout": 0}
+
+    def start(self) -> "WorkerPool":
+        # Spawned rather than forked: the API process has threads and open connections
+        context = multiprocessing.get_context("spawn")
+        for number in range(self.processes):
+            worker = _Worker(context, f"report-worker-{number}")
+            thread = threading.Thread(target=self._serve, args=(worker,), name=f"report-slot-{number}", daemon=True)
+            thread.start()
+            self._workers.append(worker)
+            self._threads.append(thread)
+        return self
+
+    def stop(self) -> None:
+        """Cancel outstanding jobs and shut the workers down."""
+        with self._lock:
+            self._stopping = True
+            for job in self._jobs.values():
+                self._cancel_locked(job)
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(5)
+        for worker in self._workers:
+            worker.stop()
+        self._workers.clear()
+        self._threads.clear()
+
+    def submit(self, task: str, args: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None) -> Job:
+        """Queue a job.
+
+        Args:
+            task: Name from TASKS
+            args: Keyword arguments of the task
+            timeout: Seconds the job may run once started (default: the pool's timeout)
+
+        Returns:
+            The queued Job
+
+        Raises:
+            ValueError: Unknown task or bad export arguments
+            WorkerError: The queue is full
+        """
+        if task not in TASKS:
+            raise ValueError(f"Unknown task {task!r}; expected one of {', '.join(sorted(TASKS))}")
+        job = Job(task, dict(args or {}), timeout or self.timeout)
+        if task == "export_bookings":
+            fmt = job.args.get("format", "csv")
+            if fmt not in EXPORT_FORMATS:
+                raise ValueError(f"Unknown export format {fmt!r}; expected one of {', '.join(EXPORT_FORMATS)}")
+            os.makedirs(WORKER_EXPORT_DIR, exist_ok=True)
+            extension = {"arrow": "arrows"}.get(fmt, fmt)
+            job.args["path"] = os.path.join(WORKER_EXPORT_DIR, f"{job.id}.{extension}")
+        with self._lock:
+            self._prune_locked()
+            if self._queued >= self.max_queue:
+                self.stats["rejected"] += 1
+                raise WorkerError(f"Job queue is full ({self.max_queue} waiting); try again later")
+            self._queued += 1
+            self._jobs[job.id] = job
+            self.stats["submitted"] += 1
+        self._queue.put(job)
+        return job
+
+    def run(self, task: str, args: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None) -> Any:
+        """Submit a job and block until it finishes.
+
+        Returns:
+            The task's result
+
+        Raises:
+            WorkerError: The queue is full, or the job failed, timed out or was cancelled
+        """
+        job = self.submit(task, args, timeout)
+        job.wait()
+        with self._lock:
+            # Nobody else looks this job up
+            self._jobs.pop(job.id, None)
+        if job.state != "done":
+            raise WorkerError(job.error or f"Job {job.state}")
+        return job.result
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancel a queued or running job. Running jobs stop once their worker is killed."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                self._cancel_locked(job)
+            return job
+
+    def _cancel_locked(self, job: Job) -> None:
+        if job.state == "queued":
+            self._queued -= 1
+            self.stats["cancelled"] += 1
+            job.finish("cancelled", error="Cancelled before it started")
+        elif job.state == "running":
+            job.cancel_requested = True
+
+    def _prune_locked(self) -> None:
+        horizon = time.time() - WORKER_JOB_RETENTION_SECONDS
+        for job_id in [job.id for job in self._jobs.values() if job.finished and job.finished_at < horizon]:
+            job = self._jobs.pop(job_id)
+            path = job.args.get("path")
+            if path and os.path.exists(path):
+                os.remove(path)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if job.state == "running")
+            return dict(self.stats, workers=len(self._workers), queued=self._queued, running=running,
+                        max_queue=self.max_queue)
+
+    def _serve(self, worker: _Worker) -> None:
+        """Slot thread: feed queued jobs to one worker process."""
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            with self._lock:
+                if job.state != "queued":
+                    continue
+                self._queued -= 1
+                job.state = "running"
+                job.started_at = time.time()
+            state, result, error = self._execute(worker, job)
+            with self._lock:
+                self.stats[state] += 1
+                job.finish(state, result, error)
+
+    def _execute(self, worker: _Worker, job: Job):
+        try:
+            worker.conn.send((job.id, job.task, job.args, job.db_path))
+        except OSError:
+            worker.restart()
+            worker.conn.send((job.id, job.task, job.args, job.db_path))
+        deadline = job.started_at + job.timeout
+        while True:
+            remaining = deadline - time.time()
+            ready = wait_for_ready([worker.conn, worker.process.sentinel],
+                                   timeout=max(0.0, min(_CANCEL_POLL_SECONDS, remaining)))
+            if worker.conn in ready:
+                try:
+                    job_id, ok, payload = worker.conn.recv()
+                except EOFError:
+                    worker.restart()
+                    return "failed", None, "Worker process exited"
+                if job_id == job.id:
+                    return ("done", payload, None) if ok else ("failed", None, payload)
+            elif ready:
+                exitcode = worker.restart()
+                return "failed", None, f"Worker process exited with code {exitcode}"
+            elif job.cancel_requested:
+                worker.restart(respawn=not self._stopping)
+                return "cancelled", None, "Cancelled while running"
+            elif remaining <= 0:
+                worker.restart()
+                return "timeout", None, f"Job ran longer than {job.timeout:g}s"
+
+pool: Optional[WorkerPool] = None
+
+def start_pool(processes: int = WORKER_PROCESSES) -> Optional[WorkerPool]:
+    """Start the process pool and route the heavy report tools through it."""
+    global pool
+    if processes <= 0 or pool is not None:
+        return pool
+    pool = WorkerPool(processes).start()
+    tools.report_pool = pool
+    return pool
+
+def stop_pool() -> None:
+    global pool
+    if pool is None:
+        return
+    tools.report_pool = None
+    pool.stop()
+    pool = None
@@ -0,0 +1,170 @@
+# writer.py
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Longest time the first write of a group waits for others to join it
+WRITER_COMMIT_WINDOW_MS = float(os.getenv("WRITER_COMMIT_WINDOW_MS", "2"))
+# Most writes committed together
+WRITER_MAX_GROUP = int(os.getenv("WRITER_MAX_GROUP", "256"))
+
+WriteOp = Callable[[sqlite3.Connection], Any]
+
+class GroupCommitWriter:
+    """Single writer thread for one database that commits queued writes in groups.
+
+    Callers submit operations (functions of the write connection) and wait on
+    futures. The thread takes everything queued, waiting at most the commit
+    window for more, and runs the group in one transaction: one lock acquisition
+    and one fsync instead of one per write. Each operation runs in its own
+    savepoint, so a failing one is rolled back alone and the rest still commit.
+    Futures are resolved only after the commit, so a caller never sees a write
+    that could still be lost.
+    """
+
+    def __init__(self, db_path: str, on_commit: Optional[Callable[[], Any]] = None,
+                 window_ms: float = WRITER_COMMIT_WINDOW_MS, max_group: int = WRITER_MAX_GROUP):
+        self.db_path = db_path
+        self.window = window_ms / 1000.0
+        self.max_group = max_group
+        self._on_commit = on_commit
+        self._queue: "queue.Queue[Tuple[WriteOp, Future]]" = queue.Queue()
+        self._lock = threading.Lock()
+        # Set when the thread couldn't open the database; new writes fail with it at once
+        self._error: Optional[BaseException] = None
+        self.stats = {"writes": 0, "commits": 0, "failed_commits": 0, "largest_group": 0}
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, op: WriteOp) -> Future:
+        """Queue op(conn) for the next group commit; the future holds its return value."""
+        future: Future = Future()
+        with self._lock:
+            if self._error is not None:
+                future.set_exception(self._error)
+            else:
+                self._queue.put((op, future))
+        return future
+
+    def is_alive(self) -> bool:
+        """Whether the writer thread is still serving writes."""
+        return self._thread.is_alive() and self._error is None
+
+    def execute(self, op: WriteOp) -> Any:
+        """Run op(conn) in the next group commit and return its result once committed."""
+        return self.submit(op).result()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        stats["avg_group"] = round(stats["writes"] / stats["commits"], 2) if stats["commits"] else 0
+        stats["queued"] = self._queue.qsize()
+        return stats
+
+    def _collect(self) -> List[Tuple[WriteOp, Future]]:
+        group = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(group) < self.max_group:
+            try:
+                group.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                group.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return group
+
+    def _run(self) -> None:
+        try:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            # Transactions and savepoints are managed explicitly
+            conn.isolation_level = None
+        except Exception as e:
+            # Fail what is queued and everything submitted later; writer_for replaces this writer
+            with self._lock:
+                self._error = e
+            while True:
+                try:
+                    _, future = self._queue.get_nowait()
+                except queue.Empty:
+                    return
+                future.set_exception(e)
+        while True:
+            group = self._collect()
+            try:
+                self._commit(conn, group)
+            except Exception as e:
+                # Anything unexpected fails this group only; the thread keeps serving
+                try:
+                    if conn.in_transaction:
+                        conn.execute("ROLLBACK")
+                except sqlite3.Error:
+                    pass
+                for _, future in group:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _commit(self, conn: sqlite3.Connection, group: List[Tuple[WriteOp, Future]]) -> None:
+        outcomes: List[Tuple[bool, Any]] = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for op, _ in group:
+                conn.execute("SAVEPOINT write_op")
+                try:
+                    outcomes.append((True, op(conn)))
+                    conn.execute("RELEASE write_op")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO write_op")
+                    conn.execute("RELEASE write_op")
+                    outcomes.append((False, e))
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            # The lock couldn't be taken or the commit failed: nothing in the group was written
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            with self._lock:
+                self.stats["failed_commits"] += 1
+            for _, future in group:
+                future.set_exception(e)
+            return
+        with self._lock:
+            self.stats["writes"] += len(group)
+            self.stats["commits"] += 1
+            self.stats["largest_group"] = max(self.stats["largest_group"], len(group))
+        try:
+            if self._on_commit is not None:
+                self._on_commit()
+        finally:
+            # Committed either way, so the callers get their results
+            for (_, future), (ok, value) in zip(group, outcomes):
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+_writers: Dict[str, GroupCommitWriter] = {}
+_writers_lock = threading.Lock()
+
+def writer_for(db_path: str, on_commit: Optional[Callable[[], Any]] = None) -> GroupCommitWriter:
+    """Return the writer of a database, starting its thread on first use or after it died."""
+    with _writers_lock:
+        writer = _writers.get(db_path)
+        if writer is None or not writer.is_alive():
+            writer = _writers[db_path] = GroupCommitWriter(db_path, on_commit)
+        return writer
+
+def get_writer_stats() -> Dict[str, Dict[str, Any]]:
+    """Return the counters of every writer, by database."""
+    with _writers_lock:
+        writers = dict(_writers)
+    return {db_path: writer.get_stats() for db_path, writer in writers.items()}
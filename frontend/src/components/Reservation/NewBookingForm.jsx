@@ -23,8 +23,7 @@ const NewBookingForm = ({ onClose }) => {
   };
 
   useEffect(() => {
-    getAllRooms();
-    getUsers();
+    getRoomsAndCustomers();
   }, []);
 
   const handleChange = (e) => {
@@ -78,18 +77,18 @@ const NewBookingForm = ({ onClose }) => {
     }
   };
 
-  const getAllRooms = () => {
+  // Load rooms and customers in one round trip
+  const getRoomsAndCustomers = () => {
     axios
-      .get(`${API_BASE}/all-rooms`)
-      .then((res) => setRooms(res.data))
-      .catch((err) => console.error("Error fetching rooms:", err));
-  };
-
-  const getUsers = () => {
-    axios
-      .get(`${API_BASE}/all-customers`)
-      .then((res) => setCustomers(res.data))
-      .catch((err) => console.log(err));
+      .post(`${API_BASE}/batch`, {
+        steps: [{ tool: "get_all_rooms" }, { tool: "get_all_customers" }],
+      })
+      .then((res) => {
+        const [rooms, customers] = res.data.results;
+        setRooms(rooms.result);
+        setCustomers(customers.result);
+      })
+      .catch((err) => console.error("Error fetching rooms and customers:", err));
   };
 
   return (
@@ -32,6 +32,27 @@ const Reservations = () => {
 
   useEffect(() => {
     getBookedRooms();
+
+    // Apply booking changes pushed by the server instead of refetching the list
+    const events = new EventSource(`${API_BASE}/events`);
+    const upsertBooking = (e) => {
+      const booking = JSON.parse(e.data).data;
+      setBookingList((list) => {
+        const exists = list.some((b) => b.BookingsID === booking.BookingsID);
+        return exists
+          ? list.map((b) => (b.BookingsID === booking.BookingsID ? booking : b))
+          : [...list, booking];
+      });
+    };
+    const removeBooking = (e) => {
+      const { BookingsID } = JSON.parse(e.data).data;
+      setBookingList((list) => list.filter((b) => b.BookingsID !== BookingsID));
+    };
+    events.addEventListener("booking.created", upsertBooking);
+    events.addEventListener("booking.updated", upsertBooking);
+    events.addEventListener("booking.cancelled", removeBooking);
+    events.addEventListener("resync", getBookedRooms);
+    return () => events.close();
   }, []);
 
   function getBookedRooms() {
@@ -52,7 +73,6 @@ const Reservations = () => {
       )
       .then(() => {
         alert("Checked in successfully!");
-        getBookedRooms();
       })
       .catch((err) => {
         console.error("Check-in failed:", err);
@@ -65,7 +85,6 @@ const Reservations = () => {
       .post(`${API_BASE}/check-out?room_id=${roomId}`)
       .then(() => {
         alert("Checked out successfully!");
-        getBookedRooms();
       })
       .catch((err) => {
         console.error("Check-out failed:", err);
@@ -81,7 +100,6 @@ const Reservations = () => {
       .delete(`${API_BASE}/cancel-booking?booking_id=${bookingId}`)
       .then(() => {
         alert("Booking cancelled.");
-        getBookedRooms();
       })
       .catch((err) => {
         console.error("Cancellation failed:", err);
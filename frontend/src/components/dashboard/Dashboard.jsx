@@ -21,45 +21,21 @@ const Dashboard = () => {
   const [arrivalList, setArrivalList] = useState([]);
 
   useEffect(() => {
-    getDashboardStats();
-    getBookedRooms();
-    getArrivals();
+    getDashboard();
   }, []);
 
-  function getDashboardStats() {
+  function getDashboard() {
     axios
-      .get(API_BASE + `/hotel-statistics`)
+      .get(API_BASE + `/dashboard`)
       .then((res) => {
-        if (res.data && res.data.length > 0) {
-          const stats = res.data[0];
-          setOccupancyDataState(stats.occupancy || {});
-          setRevenueData(stats.revenue || {});
-          setBookingsStats(stats.bookings || {});
-          setPopularityStats(stats.popularity || {});
-          setVacantRoomCount(stats.occupancy?.vacant_rooms || 0);
-        }
-      })
-      .catch((err) => {
-        console.log(err);
-      });
-  }
-
-  function getBookedRooms() {
-    axios
-      .get(API_BASE + `/current-stays`)
-      .then((res) => {
-        setBookingList(res.data);
-      })
-      .catch((err) => {
-        console.log(err);
-      });
-  }
-
-  function getArrivals() {
-    axios
-      .get(API_BASE + `/arrivals`)
-      .then((res) => {
-        setArrivalList(res.data);
+        const stats = res.data.statistics || {};
+        setOccupancyDataState(stats.occupancy || {});
+        setRevenueData(stats.revenue || {});
+        setBookingsStats(stats.bookings || {});
+        setPopularityStats(stats.popularity || {});
+        setVacantRoomCount(stats.occupancy?.vacant_rooms || 0);
+        setBookingList(res.data.current_stays || []);
+        setArrivalList(res.data.arrivals || []);
       })
       .catch((err) => {
         console.log(err);